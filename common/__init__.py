@@ -0,0 +1,2 @@
+# Helpers shared by the service implementations and the stress tests.
+# Scripts add the project root to sys.path before importing from here.
@@ -0,0 +1,39 @@
+# broadcast_payload.py
+import json
+import os
+import time
+
+# When enabled, broadcasters send {"insult": ..., "sent_at": <epoch seconds>} instead of the
+# bare insult string, so subscribers (e.g. the fan-out benchmark) can measure delivery latency.
+BROADCAST_TIMESTAMPS = os.environ.get("BROADCAST_TIMESTAMPS", "0") == "1"
+
+def encode_broadcast(insults):
+    """Returns the payload to publish for one insult (str) or a batch of insults (list).
+
+    A single unstamped insult is sent as the bare string, exactly as before. Batches are
+    sent as {"insults": [...]} (plus "sent_at" when timestamps are enabled).
+    """
+    if isinstance(insults, str):
+        insults = [insults]
+    if len(insults) == 1:
+        if not BROADCAST_TIMESTAMPS:
+            return insults[0]
+        return json.dumps({"insult": insults[0], "sent_at": time.time()})
+    message = {"insults": list(insults)}
+    if BROADCAST_TIMESTAMPS:
+        message["sent_at"] = time.time()
+    return json.dumps(message)
+
+def decode_broadcast(payload):
+    """Returns (list_of_insults, sent_at). sent_at is None for unstamped payloads."""
+    if isinstance(payload, bytes):
+        payload = payload.decode()
+    if payload.startswith("{"):
+        try:
+            message = json.loads(payload)
+            if "insults" in message:
+                return message["insults"], message.get("sent_at")
+            return [message["insult"]], message["sent_at"]
+        except (json.JSONDecodeError, KeyError, TypeError):
+            pass # An insult that merely starts with '{'
+    return [payload], None
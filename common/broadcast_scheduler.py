@@ -0,0 +1,99 @@
+# broadcast_scheduler.py
+import os
+import time
+
+DEFAULT_BROADCAST_INTERVAL = 5.0 # Seconds, the historical one-insult-every-5s behaviour
+VERBOSE_RATE_LIMIT = 10.0 # Above this many publishes/sec, log a periodic summary instead of every publish
+SUMMARY_INTERVAL = 5.0 # Seconds between summaries in high-rate mode
+
+
+class BroadcastScheduler:
+    """Paces broadcasts with a token bucket on the monotonic clock.
+
+    Tokens accrue from the real elapsed time rather than from how long we slept, so the
+    long-run rate does not drift however late the caller wakes up (publishing time, sleep
+    granularity, GIL...). `burst` caps how many missed slots may be caught up at once;
+    beyond that, slots are dropped instead of piling up. Each slot is one publish carrying
+    `batch_size` insults.
+    """
+    def __init__(self, rate, batch_size=1, burst=1):
+        if rate <= 0:
+            raise ValueError("Broadcast rate must be positive.")
+        self.rate = float(rate)
+        self.batch_size = max(1, int(batch_size))
+        self.burst = max(1, int(burst))
+        self._tokens = 1.0 # First broadcast goes out right away
+        self._last_refill = time.monotonic()
+        self._granted = 0
+        self._granted_at_last_summary = 0
+        self._last_summary = self._last_refill
+
+    @classmethod
+    def from_env(cls):
+        """BROADCAST_RATE (publishes/sec) or BROADCAST_INTERVAL (seconds), BROADCAST_BATCH, BROADCAST_BURST."""
+        if os.environ.get("BROADCAST_RATE"):
+            rate = float(os.environ["BROADCAST_RATE"])
+        else:
+            rate = 1.0 / float(os.environ.get("BROADCAST_INTERVAL", DEFAULT_BROADCAST_INTERVAL))
+        batch_size = int(os.environ.get("BROADCAST_BATCH", 1))
+        # By default allow catching up ~10ms worth of slots, so high rates survive coarse sleeps
+        burst = int(os.environ.get("BROADCAST_BURST", max(1, int(rate / 100))))
+        return cls(rate, batch_size, burst)
+
+    @property
+    def verbose(self):
+        """True when the rate is low enough to log every publish."""
+        return self.rate <= VERBOSE_RATE_LIMIT
+
+    def describe(self):
+        return f"{self.rate:g} publishes/sec x {self.batch_size} insult(s), burst {self.burst}"
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+            self._last_refill = now
+
+    def available_slots(self):
+        """Non-blocking: consumes and returns the number of publishes allowed right now."""
+        self._refill()
+        slots = int(self._tokens)
+        self._tokens -= slots
+        self._granted += slots
+        return slots
+
+    def time_until_next_slot(self):
+        self._refill()
+        if self._tokens >= 1.0:
+            return 0.0
+        return max(0.0, (1.0 - self._tokens) / self.rate + (self._last_refill - time.monotonic()))
+
+    def wait_for_slots(self, should_continue=lambda: True, max_sleep=0.1):
+        """Blocks until at least one publish is allowed and returns how many (0 if should_continue() turned False).
+
+        Sleeps in chunks of at most max_sleep seconds so shutdown flags stay responsive.
+        """
+        while should_continue():
+            slots = self.available_slots()
+            if slots:
+                return slots
+            time.sleep(min(max_sleep, self.time_until_next_slot()))
+        return 0
+
+    def defer(self, seconds):
+        """Pushes the next slot `seconds` into the future (e.g. to keep a previous leader's cadence)."""
+        self._tokens = 0.0
+        self._last_refill = time.monotonic() + max(0.0, seconds) - 1.0 / self.rate
+
+    def periodic_summary(self):
+        """In high-rate mode, returns a one-line summary every SUMMARY_INTERVAL seconds, else None."""
+        now = time.monotonic()
+        if self.verbose or now - self._last_summary < SUMMARY_INTERVAL:
+            return None
+        granted = self._granted - self._granted_at_last_summary
+        achieved = granted / (now - self._last_summary)
+        self._granted_at_last_summary = self._granted
+        self._last_summary = now
+        return (f"{granted} publishes ({granted * self.batch_size} insults) in the last {SUMMARY_INTERVAL:.0f}s, "
+                f"{achieved:.1f}/sec (target {self.rate:g}/sec)")
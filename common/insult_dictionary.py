@@ -0,0 +1,146 @@
+# insult_dictionary.py
+# Live insult dictionary for the filter workers, distributed through Redis instead of being
+# hard-coded in every worker.
+#
+# Channel: the full dictionary is a versioned snapshot in DICTIONARY_KEY ({"version", "insults"});
+# each publish bumps VERSION_KEY and announces the new version on DICTIONARY_CHANNEL, all in one
+# Lua script, so versions are unique and the snapshot never goes backwards. Subscribers treat an
+# announcement as "fetch the snapshot if newer": a missed pub/sub message (reconnect, slow
+# consumer) is caught up by the next one or by the snapshot read on (re)subscribe.
+#
+# Swap: a DictionarySubscriber thread builds the new matcher in the background and then replaces
+# LiveDictionary's current Dictionary with one attribute assignment. Workers read current() once
+# per task (or batch), so each task is filtered with one complete dictionary, old or new, and
+# consumption never stops. The build still competes for the GIL with the consuming thread:
+# stress_tests/Benchmark/dictionary_swap_benchmark.py measures both.
+#
+#   FILTER_DICTIONARY_UPDATES=1   subscribe (filter_worker_redis.py, filter_worker_rabbit.py)
+#   FILTER_DICTIONARY_HOST        Redis with the channel (default: REDIS_HOST, else localhost)
+# Publishing: redis_insult_service/dictionary_publisher_redis.py mirrors the insult store.
+from collections import namedtuple
+import threading
+import json
+import time
+import os
+
+from common import metrics
+from common.result_cache import dictionary_version
+
+DICTIONARY_KEY = "filter_dictionary"
+VERSION_KEY = "filter_dictionary:version"
+DICTIONARY_CHANNEL = "filter_dictionary_updates"
+UPDATES_ENV = "FILTER_DICTIONARY_UPDATES"
+HOST_ENV = "FILTER_DICTIONARY_HOST"
+RECONNECT_DELAY = 2.0 # Seconds between subscription attempts while Redis is unreachable
+
+# KEYS: version key, snapshot key; ARGV: JSON list of insults, channel. Returns the new version.
+_PUBLISH_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('SET', KEYS[2], '{"version":' .. version .. ',"insults":' .. ARGV[1] .. '}')
+redis.call('PUBLISH', ARGV[2], '{"version":' .. version .. '}')
+return version
+"""
+
+# version: publish counter (0 = the worker's built-in list); fingerprint: content hash, used as
+# the result caches' dictionary version; matcher: what the filter function takes
+Dictionary = namedtuple("Dictionary", "version fingerprint insults matcher")
+
+
+def build_dictionary(version, insults, build_matcher=frozenset):
+    insults = frozenset(insult.lower() for insult in insults)
+    matcher = build_matcher(insults)
+    fingerprint = dictionary_version(insults)
+    if getattr(matcher, "variant", ""): # e.g. normalization: same entries, different results
+        fingerprint = f"{fingerprint}-{matcher.variant}"
+    return Dictionary(version, fingerprint, insults, matcher)
+
+def publish_dictionary(client, insults):
+    """Publishes a new dictionary snapshot; returns its version."""
+    return client.eval(_PUBLISH_SCRIPT, 2, VERSION_KEY, DICTIONARY_KEY, json.dumps(sorted(insults)),
+                       DICTIONARY_CHANNEL)
+
+
+class LiveDictionary:
+    """The dictionary a worker filters with. current() is a lock-free read of an immutable
+    Dictionary; apply() builds a newer one and swaps it in."""
+    def __init__(self, initial_insults, build_matcher=frozenset, prefix=""):
+        self._build_matcher = build_matcher
+        self._prefix = prefix
+        self._current = build_dictionary(0, initial_insults, build_matcher)
+        self._apply_lock = threading.Lock() # One build at a time; readers never take it
+        self.updates = metrics.counter("filter_dictionary_updates_total", "Dictionary versions swapped in.")
+        self.build_time = metrics.histogram("filter_dictionary_build_seconds", "Time to build a new dictionary's matcher.",
+                                            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+        metrics.gauge("filter_dictionary_version", "Dictionary version in use.", function=lambda: self._current.version)
+        metrics.gauge("filter_dictionary_size", "Insults in the dictionary in use.", function=lambda: len(self._current.insults))
+
+    def current(self):
+        return self._current
+
+    def apply(self, version, insults):
+        """Swaps in the dictionary if `version` is newer than the current one. Returns the
+        (build seconds, swap seconds) it took, or None if it was not newer."""
+        with self._apply_lock:
+            if version <= self._current.version:
+                return None
+            started = time.perf_counter()
+            dictionary = build_dictionary(version, insults, self._build_matcher)
+            built = time.perf_counter()
+            self._current = dictionary # The swap: readers see the old or the new one, never a mix
+            swapped = time.perf_counter()
+        self.build_time.observe(built - started)
+        self.updates.inc()
+        print(f"{self._prefix} Dictionary v{version} ({len(dictionary.insults)} insults) swapped in: "
+              f"build {(built - started) * 1000:.1f}ms, swap {(swapped - built) * 1e6:.1f}us.")
+        return built - started, swapped - built
+
+
+class DictionarySubscriber(threading.Thread):
+    """Background thread keeping a LiveDictionary at the latest published version."""
+    def __init__(self, live, client, prefix=""):
+        super().__init__(name="DictionarySubscriber", daemon=True)
+        self.live = live
+        self.client = client
+        self.prefix = prefix
+        self._stop_event = threading.Event()
+
+    @classmethod
+    def start_from_env(cls, live, prefix=""):
+        """Started subscriber if FILTER_DICTIONARY_UPDATES=1, else None."""
+        if os.environ.get(UPDATES_ENV) != "1":
+            return None
+        import redis # Only needed with updates on, e.g. by RabbitMQ workers
+        host = os.environ.get(HOST_ENV) or os.environ.get("REDIS_HOST", "localhost")
+        subscriber = cls(live, redis.Redis(host=host, port=6379, db=0, decode_responses=True), prefix)
+        subscriber.start()
+        return subscriber
+
+    def load_snapshot(self):
+        raw = self.client.get(DICTIONARY_KEY)
+        if raw is not None:
+            snapshot = json.loads(raw)
+            self.live.apply(snapshot["version"], snapshot["insults"])
+
+    def run(self):
+        while not self._stop_event.is_set():
+            pubsub = None
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(DICTIONARY_CHANNEL)
+                self.load_snapshot() # After subscribing, so nothing published in between is missed
+                while not self._stop_event.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and json.loads(message["data"])["version"] > self.live.current().version:
+                        self.load_snapshot()
+            except Exception as e: # redis.exceptions.RedisError, malformed snapshots
+                print(f"{self.prefix} Dictionary subscription error: {e}. Retrying in {RECONNECT_DELAY:.0f}s...")
+                self._stop_event.wait(RECONNECT_DELAY)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,48 @@
+# insult_shards.py
+# Where new insults are published for the RabbitMQ insult processors (insult_processor_rabbit.py).
+#
+# With INSULT_SHARD_COUNT > 1 each insult goes through the direct exchange SHARD_EXCHANGE_NAME with
+# its shard index (shard_for_insult) as routing key, to queue 'add_insult_queue.shard-<index>'.
+# Publishers declare and bind every shard queue themselves (declare_insult_queues), so insults sent
+# before a shard's processor is up wait in its queue instead of being routed nowhere and dropped.
+# Otherwise everything goes to the plain 'add_insult_queue'.
+import zlib
+import os
+
+ADD_INSULT_QUEUE_NAME = 'add_insult_queue'
+SHARD_EXCHANGE_NAME = 'insult_shard_exchange' # Direct exchange, routing key = shard index
+SHARD_COUNT_ENV = "INSULT_SHARD_COUNT"
+
+
+def shard_count_from_env():
+    return int(os.environ.get(SHARD_COUNT_ENV, 1))
+
+def shard_for_insult(insult_text, shard_count):
+    """Stable across processes and runs (unlike hash(), which is salted per interpreter)."""
+    if isinstance(insult_text, str):
+        insult_text = insult_text.encode()
+    return zlib.crc32(insult_text) % shard_count
+
+def shard_queue_name(shard_index):
+    return f"{ADD_INSULT_QUEUE_NAME}.shard-{shard_index}"
+
+def insult_queue_names(shard_count):
+    if shard_count <= 1:
+        return [ADD_INSULT_QUEUE_NAME]
+    return [shard_queue_name(i) for i in range(shard_count)]
+
+def declare_insult_queues(channel, shard_count):
+    """Declares the durable queue(s) insults are published to, bound to the shard exchange if sharded."""
+    if shard_count <= 1:
+        channel.queue_declare(queue=ADD_INSULT_QUEUE_NAME, durable=True)
+        return
+    channel.exchange_declare(exchange=SHARD_EXCHANGE_NAME, exchange_type='direct', durable=True)
+    for shard_index in range(shard_count):
+        channel.queue_declare(queue=shard_queue_name(shard_index), durable=True)
+        channel.queue_bind(exchange=SHARD_EXCHANGE_NAME, queue=shard_queue_name(shard_index), routing_key=str(shard_index))
+
+def insult_route(insult_text, shard_count):
+    """(exchange, routing_key) to publish one insult with."""
+    if shard_count <= 1:
+        return '', ADD_INSULT_QUEUE_NAME # Default exchange, name of the queue
+    return SHARD_EXCHANGE_NAME, str(shard_for_insult(insult_text, shard_count))
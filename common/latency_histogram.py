@@ -0,0 +1,113 @@
+# latency_histogram.py
+# Compact, mergeable latency histogram with HDR-style log-linear buckets.
+# Each client process records into its own histogram and the parent merges them, so tail
+# percentiles can be reported without shipping every single latency between processes.
+
+SUB_BUCKET_BITS = 7 # 128 linear sub-buckets per power of two: < 0.8% relative error
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+EXACT_LIMIT = 2 * SUB_BUCKET_COUNT # Values below this (in microseconds) get their own bucket
+REPORT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _bucket_index(micros):
+    if micros < EXACT_LIMIT:
+        return micros
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    return shift * SUB_BUCKET_COUNT + (micros >> shift)
+
+def _bucket_value(index):
+    """Middle of the bucket's value range, in microseconds."""
+    if index < EXACT_LIMIT:
+        return index
+    shift = index // SUB_BUCKET_COUNT - 1
+    mantissa = index - shift * SUB_BUCKET_COUNT
+    return (mantissa << shift) + (1 << shift) // 2
+
+
+class LatencyHistogram:
+    """Latencies in seconds, stored in 1 microsecond resolution log-linear buckets.
+
+    Only non-empty buckets are kept (a dict), so a histogram pickles to a few KB no matter
+    how many values were recorded. min, max, count and sum are exact.
+    """
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        micros = max(0, int(seconds * 1_000_000))
+        index = _bucket_index(micros)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    @classmethod
+    def merged(cls, histograms):
+        result = cls()
+        for histogram in histograms:
+            if histogram is not None:
+                result.merge(histogram)
+        return result
+
+    def percentile(self, p):
+        """Value (seconds) at or below which p percent of the recorded values fall; nan if empty."""
+        if not self.count:
+            return float('nan')
+        if p >= 100:
+            return self.max
+        rank = max(1, -(-self.count * p // 100)) # ceil, at least the first value
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                # Clamp to the exact extremes so p0/p100-ish values never leave the observed range
+                return min(self.max, max(self.min, _bucket_value(index) / 1_000_000))
+        return self.max
+
+    def mean(self):
+        return (self.total / self.count) if self.count else float('nan')
+
+    def summary_ms(self, percentiles=REPORT_PERCENTILES):
+        """{"p50": ..., "p90": ..., "max": ..., "mean": ...} in milliseconds."""
+        summary = {f"p{p:g}": self.percentile(p) * 1000 for p in percentiles}
+        summary["max"] = (self.max * 1000) if self.count else float('nan')
+        summary["mean"] = self.mean() * 1000
+        return summary
+
+    def format_summary(self, percentiles=REPORT_PERCENTILES):
+        """One line for the stress test output, e.g. 'p50: 1.02ms, p90: ..., max: 8.31ms'."""
+        summary = self.summary_ms(percentiles)
+        return ", ".join(f"{name}: {summary[name]:.2f}ms" for name in [f"p{p:g}" for p in percentiles] + ["max"])
+
+    def to_dict(self):
+        """JSON-friendly form; bucket indices become strings as JSON keys must be."""
+        return {"counts": {str(index): n for index, n in self.counts.items()}, "count": self.count,
+                "total": self.total, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(index): n for index, n in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.total = data["total"]
+        histogram.min = data["min"]
+        histogram.max = data["max"]
+        return histogram
@@ -0,0 +1,264 @@
+# metrics.py
+# In-process runtime metrics (counters, gauges, histograms) for the servers and workers.
+#
+# Every process has one registry (REGISTRY). Metrics are exposed two ways:
+#   - Prometheus text format over HTTP (GET /metrics, or /metrics.json) when METRICS_PORT is set
+#   - snapshot(), which the XML-RPC and Pyro services return from their get_metrics() method
+# Hot-path cost: Counter.inc() is one uncontended lock acquire and an add, well under 1us.
+# See stress_tests/Benchmark/metrics_overhead.py.
+import http.server
+import itertools
+import threading
+import bisect
+import json
+import time
+import os
+
+METRICS_PORT_ENV = "METRICS_PORT"
+# Seconds; covers the ~50us in-process filter up to multi-second queueing delays
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Monotonic count. inc() adds one; add() takes any non-negative amount."""
+    kind = "counter"
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help = help_text
+        self._value = 0 # Stays an int unless fractional amounts (seconds) are added
+        self._lock = threading.Lock()
+
+    def inc(self):
+        with self._lock:
+            self._value += 1
+
+    def add(self, amount):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Gauge:
+    """Current value. Either set()/inc()/dec() it, or give a function evaluated at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text="", function=None):
+        self.name = name
+        self.help = help_text
+        self._function = function
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        if self._function is None:
+            return self._value
+        try:
+            return self._function()
+        except Exception:
+            return float('nan') # A broken callback must not break the whole scrape
+
+
+class Histogram:
+    """Prometheus-style histogram: fixed upper bounds, count and sum (sum of service times = busy time)."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self._bounds = tuple(sorted(buckets))
+        self._counts = [0] * (len(self._bounds) + 1) # Last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._bounds, value) # First bound >= value, i.e. 'le'
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        """with histogram.time(): ... observes the block's duration in seconds."""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = list(itertools.accumulate(counts))
+        buckets = {f"{bound:g}": n for bound, n in zip(self._bounds, cumulative)}
+        buckets["+Inf"] = cumulative[-1]
+        return {"buckets": buckets, "count": cumulative[-1], "sum": total}
+
+    @property
+    def value(self):
+        return self.snapshot()
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class MetricsRegistry:
+    """Named metrics of one process, plus constant labels (component, worker id...) for every sample."""
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.labels = {}
+        self.gauge("process_start_time_seconds", "Unix time the process started.").set(time.time())
+
+    def set_labels(self, **labels):
+        self.labels.update({name: str(value) for name, value in labels.items()})
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' already registered as a {metric.kind}.")
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name, help_text="", function=None):
+        return self._get_or_create(Gauge, name, help_text, function)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets)
+
+    def snapshot(self):
+        """{name: value}, histograms as {"buckets", "count", "sum"}; XML-RPC and Pyro friendly."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        result = {"labels": dict(self.labels), "timestamp": time.time()}
+        result.update({metric.name: metric.value for metric in metrics})
+        return result
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        labels = ",".join(f'{name}="{_escape(value)}"' for name, value in sorted(self.labels.items()))
+        lines = []
+        for metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            if metric.kind == "histogram":
+                snapshot = metric.snapshot()
+                for bound, n in snapshot["buckets"].items():
+                    bucket_labels = f'{labels},le="{bound}"' if labels else f'le="{bound}"'
+                    lines.append(f"{metric.name}_bucket{{{bucket_labels}}} {n}")
+                lines.append(f"{metric.name}_sum{_braces(labels)} {snapshot['sum']!r}")
+                lines.append(f"{metric.name}_count{_braces(labels)} {snapshot['count']}")
+            else:
+                lines.append(f"{metric.name}{_braces(labels)} {_format_value(metric.value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _braces(labels):
+    return f"{{{labels}}}" if labels else ""
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, float) and value != value:
+        return "NaN"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# --- Process-wide registry and shortcuts ---
+REGISTRY = MetricsRegistry()
+
+def counter(name, help_text=""):
+    return REGISTRY.counter(name, help_text)
+
+def gauge(name, help_text="", function=None):
+    return REGISTRY.gauge(name, help_text, function)
+
+def histogram(name, help_text="", buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, help_text, buckets)
+
+def set_labels(**labels):
+    REGISTRY.set_labels(**labels)
+
+def snapshot():
+    return REGISTRY.snapshot()
+
+
+# --- HTTP endpoint ---
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path in ("/", "/metrics"):
+            body = self.registry.render_prometheus().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body = json.dumps(self.registry.snapshot()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would drown the component's own console output
+
+
+def start_http_server(port, host="0.0.0.0", registry=REGISTRY):
+    """Serves the registry on a daemon thread; port 0 picks a free port. Returns the server."""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
+
+def start_http_server_from_env(prefix="[Metrics]", registry=REGISTRY):
+    """Starts the endpoint if METRICS_PORT is set. A busy port only costs the endpoint, not the component."""
+    port = os.environ.get(METRICS_PORT_ENV)
+    if not port:
+        return None
+    try:
+        server = start_http_server(int(port), registry=registry)
+    except (OSError, ValueError) as e:
+        print(f"{prefix} Could not serve metrics on port {port}: {e}")
+        return None
+    print(f"{prefix} Serving Prometheus metrics on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server
@@ -0,0 +1,218 @@
+# profiling.py
+# Opt-in profiling for the filter workers: per-task phase timings and a stack sampler.
+#
+# Enable with FILTER_PROFILE=1 (or phases / stacks to get only one of the two), or toggle at
+# runtime with SIGUSR1: the first signal starts profiling, the next one stops it and dumps.
+# The handler only sets an Event; a "profile-toggle" thread does the starting and dumping, since
+# the handler runs on the main thread, possibly while it holds the phase lock.
+# On shutdown (or on that second signal) the profiler writes, to FILTER_PROFILE_DIR
+# (default: current directory):
+#   <name>.phases.txt  per-phase time breakdown (also printed)
+#   <name>.collapsed   sampled stacks in collapsed format, for flamegraph.pl / speedscope
+# When profiling is off, phase() returns a shared no-op context manager.
+import contextlib
+import threading
+import signal
+import time
+import sys
+import os
+
+PROFILE_ENV = "FILTER_PROFILE"
+PROFILE_DIR_ENV = "FILTER_PROFILE_DIR"
+SAMPLE_INTERVAL_ENV = "FILTER_PROFILE_INTERVAL_MS"
+DEFAULT_SAMPLE_INTERVAL = 0.005 # Seconds between stack samples
+MAX_STACK_DEPTH = 64
+WAIT_SUFFIX = "(wait)" # Phases named like this are idle time (blocking dequeue), not work
+
+_NO_PHASE = contextlib.nullcontext()
+
+
+class _Phase:
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler._add_phase(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class StackSampler:
+    """Samples every thread's Python stack on a timer and counts identical stacks."""
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = {} # "thread;outer;...;inner" -> samples
+        self.samples = 0
+        self._active = False
+        self._thread = None
+
+    def start(self):
+        self._active = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name="stack-sampler")
+        self._thread.start()
+
+    def stop(self):
+        self._active = False
+        if self._thread:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while self._active:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                key = ";".join([names.get(thread_id, str(thread_id))] + _frame_labels(frame))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed_lines(self):
+        return [f"{stack} {count}" for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])]
+
+
+def _frame_labels(frame):
+    """Outermost-first 'function (file.py)' labels; line numbers left out so loops don't split stacks."""
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+class WorkerProfiler:
+    """Phase timer + stack sampler for one worker process, controlled by env var or SIGUSR1."""
+    def __init__(self, name, prefix="[Profile]"):
+        self.name = name
+        self.prefix = prefix
+        self.active = False # Profiling running (phases and/or stacks)
+        self.enabled = False # Phase timing on: checked on the hot path
+        self._phases = {} # name -> [total_seconds, calls]
+        self._tasks = 0
+        self._lock = threading.Lock()
+        self._toggle_requested = threading.Event()
+        self._sampler = None
+        self._started_at = None
+        self._want_phases = True
+        self._want_stacks = True
+
+    @classmethod
+    def from_env(cls, name, prefix="[Profile]"):
+        """FILTER_PROFILE = 1/all, phases or stacks enables at startup; SIGUSR1 toggles either way."""
+        profiler = cls(name, prefix)
+        mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+        if mode in ("phases", "stacks"):
+            profiler._want_phases = mode == "phases"
+            profiler._want_stacks = mode == "stacks"
+        if mode and mode not in ("0", "false", "off"):
+            profiler.start()
+        profiler.install_signal_handler()
+        return profiler
+
+    def install_signal_handler(self):
+        if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+            return # Windows, or not in the main thread: env var only
+        threading.Thread(target=self._toggle_loop, daemon=True, name="profile-toggle").start()
+        signal.signal(signal.SIGUSR1, self._request_toggle)
+
+    def _request_toggle(self, signum, frame):
+        """SIGUSR1 handler. Takes no lock: it may interrupt _add_phase() on the same thread."""
+        self._toggle_requested.set()
+
+    def _toggle_loop(self):
+        while True:
+            self._toggle_requested.wait()
+            self._toggle_requested.clear()
+            if self.active:
+                self.stop_and_dump()
+            else:
+                self.start()
+
+    def start(self):
+        with self._lock:
+            self._phases = {}
+            self._tasks = 0
+        self._started_at = time.perf_counter()
+        if self._want_stacks:
+            interval = float(os.environ.get(SAMPLE_INTERVAL_ENV, DEFAULT_SAMPLE_INTERVAL * 1000)) / 1000
+            self._sampler = StackSampler(interval)
+            self._sampler.start()
+        self.enabled = self._want_phases
+        self.active = True
+        print(f"{self.prefix} Profiling started ({'phases' if self._want_phases else ''}"
+              f"{' + ' if self._want_phases and self._want_stacks else ''}{'stacks' if self._want_stacks else ''}).")
+
+    def phase(self, name):
+        """with profiler.phase("filter"): ...  A no-op unless phase profiling is on."""
+        return _Phase(self, name) if self.enabled else _NO_PHASE
+
+    def task_done(self):
+        if self.enabled:
+            with self._lock:
+                self._tasks += 1
+
+    def _add_phase(self, name, seconds):
+        with self._lock:
+            entry = self._phases.get(name)
+            if entry is None:
+                self._phases[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def breakdown_lines(self):
+        """Phases named '... (wait)' are idle time: reported, but left out of the busy-time shares."""
+        with self._lock:
+            phases = {name: list(entry) for name, entry in self._phases.items()}
+            tasks = self._tasks
+        wall = (time.perf_counter() - self._started_at) if self._started_at else 0.0
+        waiting = sum(total for name, (total, _) in phases.items() if name.endswith(WAIT_SUFFIX))
+        busy = sum(total for name, (total, _) in phases.items() if not name.endswith(WAIT_SUFFIX))
+        lines = [f"Phase breakdown for {self.name}: {tasks} tasks in {wall:.2f}s, "
+                 f"{busy:.3f}s busy in phases, {waiting:.3f}s waiting"]
+        lines.append(f"  {'Phase':<16} | {'Total s':>9} | {'Busy %':>6} | {'Calls':>8} | {'us/call':>9} | {'us/task':>9}")
+        for name, (total, calls) in sorted(phases.items(), key=lambda item: (item[0].endswith(WAIT_SUFFIX), -item[1][0])):
+            share = "-" if name.endswith(WAIT_SUFFIX) else f"{(total / busy * 100) if busy else 0.0:.1f}%"
+            per_task = (total / tasks * 1e6) if tasks else float('nan')
+            lines.append(f"  {name:<16} | {total:>9.3f} | {share:>6} | {calls:>8} | "
+                         f"{total / calls * 1e6:>9.1f} | {per_task:>9.1f}")
+        return lines
+
+    def stop_and_dump(self):
+        """Stops profiling and writes the report files. Safe to call more than once."""
+        with self._lock: # The toggle thread and shutdown may both get here
+            if not self.active:
+                return
+            self.active = False
+            self.enabled = False
+        sampler, self._sampler = self._sampler, None
+        if sampler:
+            sampler.stop()
+        out_dir = os.environ.get(PROFILE_DIR_ENV, os.getcwd())
+        base_name = os.path.join(out_dir, f"{self.name}_{time.strftime('%Y%m%d_%H%M%S')}")
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            if self._want_phases:
+                lines = self.breakdown_lines()
+                for line in lines:
+                    print(f"{self.prefix} {line}")
+                with open(base_name + ".phases.txt", "w") as f:
+                    f.write("\n".join(lines) + "\n")
+                print(f"{self.prefix} Phase breakdown written to {base_name}.phases.txt")
+            if sampler:
+                with open(base_name + ".collapsed", "w") as f:
+                    f.write("\n".join(sampler.collapsed_lines()) + "\n")
+                print(f"{self.prefix} {sampler.samples} stack samples written to {base_name}.collapsed "
+                      f"(flamegraph.pl {os.path.basename(base_name)}.collapsed > flame.svg)")
+        except OSError as e:
+            print(f"{self.prefix} Could not write profile to {out_dir}: {e}")
@@ -0,0 +1,96 @@
+# readiness.py
+# Startup handshake between a launcher (scaling tests, scaler, worker agent) and the worker
+# processes it starts, instead of sleeping a fixed "long enough" time after Popen.
+#
+# The launcher opens a pipe and hands its write end to every child in WORKER_READY_FD.
+# A worker calls signal_ready() once it can actually take tasks (connected and consuming,
+# or registered with its dispatcher); that writes one line "<pid> <detail>" to the pipe.
+# The launcher blocks on the read end until N workers are ready, one of them dies, or the
+# timeout passes, so setup time is bounded by the real startup time.
+# Writes of one short line to a pipe are atomic, so any number of children can share it.
+# Started by hand (no WORKER_READY_FD), signal_ready() does nothing.
+import subprocess
+import select
+import time
+import os
+
+READY_FD_ENV = "WORKER_READY_FD"
+DEAD_CHECK_INTERVAL = 0.5 # Max seconds between checks that the launched processes are still alive
+
+
+def signal_ready(detail=""):
+    """Tells the launcher this process is ready. Only the first call writes; later ones are no-ops."""
+    fd = os.environ.pop(READY_FD_ENV, None) # Popped so reconnects don't signal twice, and grandchildren don't inherit it
+    if not fd:
+        return False
+    try:
+        os.write(int(fd), f"{os.getpid()} {detail}".replace("\n", " ")[:200].encode() + b"\n")
+        os.close(int(fd))
+        return True
+    except (OSError, ValueError):
+        return False # Launcher gone or fd not ours: nothing to tell
+
+
+class ReadinessPipe:
+    """Launcher side: popen() children through it, then wait() for their ready signals."""
+    supported = os.name == "posix" # pass_fds is POSIX-only
+
+    def __init__(self):
+        self.ready = {} # pid -> detail, across all wait() calls
+        self._buffer = b""
+        self._read_fd = self._write_fd = None
+        if self.supported:
+            self._read_fd, self._write_fd = os.pipe()
+
+    def popen(self, args, env=None, **kwargs):
+        """subprocess.Popen with WORKER_READY_FD pointing at this pipe."""
+        if not self.supported:
+            return subprocess.Popen(args, env=env, **kwargs)
+        env = dict(os.environ if env is None else env)
+        env[READY_FD_ENV] = str(self._write_fd)
+        kwargs["pass_fds"] = tuple(kwargs.get("pass_fds", ())) + (self._write_fd,)
+        return subprocess.Popen(args, env=env, **kwargs)
+
+    def wait(self, count, timeout, processes=(), fallback_delay=2.0):
+        """Blocks until `count` children have signalled (in total), one of `processes` exits
+        before signalling, or `timeout` seconds pass. Returns the number ready.
+        Where pipes can't be passed (Windows) it sleeps fallback_delay and trusts the children."""
+        if not self.supported:
+            time.sleep(fallback_delay)
+            alive = sum(1 for proc in processes if proc.poll() is None)
+            return alive if processes else count
+        deadline = time.monotonic() + timeout
+        while len(self.ready) < count:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if any(proc.poll() is not None and proc.pid not in self.ready for proc in processes):
+                break # Died during startup: it will never signal
+            readable, _, _ = select.select([self._read_fd], [], [], min(remaining, DEAD_CHECK_INTERVAL))
+            if readable:
+                self._read_lines()
+        return len(self.ready)
+
+    def _read_lines(self):
+        self._buffer += os.read(self._read_fd, 4096)
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            pid, _, detail = line.decode(errors="replace").partition(" ")
+            if pid.isdigit():
+                self.ready[int(pid)] = detail
+
+    def close(self):
+        for fd in (self._read_fd, self._write_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._read_fd = self._write_fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
@@ -0,0 +1,243 @@
+# result_cache.py
+# Content-addressed cache of filter results, consulted before a text is queued or dispatched.
+#
+# Key: sha1 of the text plus the insult dictionary's version (dictionary_version()), so a
+# result is only reused for the same text under the same dictionary. The text is hashed exactly
+# as given: the filter keeps everything but the insults verbatim, so any normalization here
+# would hand back another text's output. A lookup under a new dictionary version drops every
+# entry at once instead of letting stale ones age out. Only lookups move the version: a store
+# under any other version (a text filtered before a swap, finishing after it) is skipped.
+#
+# Eviction keeps the estimated size under max_bytes, least recently used ("lru") or least
+# frequently used ("lfu", ties broken by age) first. Each entry remembers what computing it
+# cost, so hits add up to the latency saved.
+#
+#   FILTER_CACHE_MB       memory cap in MB (default 16; 0 disables the cache)
+#   FILTER_CACHE_POLICY   lru (default) or lfu
+#
+# SharedResultCache puts one of these (L1, per process) in front of Redis (L2, shared by every
+# Redis/RabbitMQ filter worker), so a text filtered by any worker is reused by all of them while
+# hot entries never leave the process. Misses of a whole batch are looked up with one MGET and
+# new results written with one pipelined SET ... EX per batch.
+#
+#   FILTER_SHARED_CACHE=1       enable it in filter_worker_redis.py / filter_worker_rabbit.py
+#   FILTER_SHARED_CACHE_HOST    Redis holding the entries (default: REDIS_HOST, else localhost)
+#   FILTER_SHARED_CACHE_TTL     seconds an entry lives in Redis (default 3600)
+from collections import OrderedDict
+import threading
+import hashlib
+import json
+import time
+import os
+
+from common import metrics
+
+CACHE_MB_ENV = "FILTER_CACHE_MB"
+CACHE_POLICY_ENV = "FILTER_CACHE_POLICY"
+ENTRY_OVERHEAD = 200 # Bytes per entry besides the filtered text: key, dict slots, bookkeeping
+SHARED_CACHE_ENV = "FILTER_SHARED_CACHE"
+SHARED_CACHE_HOST_ENV = "FILTER_SHARED_CACHE_HOST"
+SHARED_CACHE_TTL_ENV = "FILTER_SHARED_CACHE_TTL"
+SHARED_KEY_PREFIX = "filter_cache:"
+SHARED_RETRY_AFTER = 5.0 # Seconds the L2 is skipped after a Redis error (the L1 keeps working)
+
+
+def dictionary_version(insults):
+    """Short, order-independent fingerprint of an insult collection."""
+    return hashlib.sha1("\n".join(sorted(insult.lower() for insult in insults)).encode()).hexdigest()[:12]
+
+def cache_key(text, version):
+    return hashlib.sha1(f"{version}\0{text}".encode("utf-8", "surrogatepass")).digest()
+
+
+class FilterResultCache:
+    """Thread-safe. get() returns the cached filtered text or None; put() stores one with its cost."""
+    def __init__(self, max_bytes, policy="lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown cache policy '{policy}' (choose lru or lfu).")
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.version = None
+        self.size_bytes = 0
+        self._entries = {} # key -> [filtered_text, cost_seconds, size, frequency]
+        self._order = OrderedDict() # lru: keys, least recent first
+        self._buckets = {} # lfu: frequency -> OrderedDict of keys, oldest first
+        self._min_frequency = 0
+        self._lock = threading.Lock()
+        self.hits = metrics.counter("filter_cache_hits_total", "Texts answered from the result cache.")
+        self.misses = metrics.counter("filter_cache_misses_total", "Texts that had to be filtered.")
+        self.evictions = metrics.counter("filter_cache_evictions_total", "Entries evicted to stay under the memory cap.")
+        self.invalidations = metrics.counter("filter_cache_invalidations_total", "Full flushes after a dictionary change.")
+        self.saved_seconds = metrics.counter("filter_cache_saved_seconds_total", "Filtering/dispatch time the hits avoided.")
+        metrics.gauge("filter_cache_bytes", "Estimated size of the cached entries.", function=lambda: self.size_bytes)
+        metrics.gauge("filter_cache_entries", "Entries in the result cache.", function=lambda: len(self._entries))
+
+    @classmethod
+    def from_env(cls):
+        """The cache configured by FILTER_CACHE_MB / FILTER_CACHE_POLICY, or None if disabled."""
+        megabytes = float(os.environ.get(CACHE_MB_ENV, "16"))
+        if megabytes <= 0:
+            return None
+        return cls(int(megabytes * 1024 * 1024), os.environ.get(CACHE_POLICY_ENV, "lru"))
+
+    def get(self, text, version):
+        key = cache_key(text, version)
+        with self._lock:
+            if version != self.version:
+                self._invalidate(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses.inc()
+                return None
+            self._touch(key, entry)
+        self.hits.inc()
+        self.saved_seconds.add(entry[1])
+        return entry[0]
+
+    def put(self, text, version, filtered_text, cost_seconds=0.0):
+        key = cache_key(text, version)
+        size = len(filtered_text) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version != self.version:
+                return # Stale result: storing it must not flush the current entries
+            if key in self._entries:
+                return # Filled meanwhile by a concurrent miss on the same text
+            entry = [filtered_text, cost_seconds, size, 1]
+            self._entries[key] = entry
+            self.size_bytes += size
+            if self.policy == "lru":
+                self._order[key] = None
+            else:
+                self._buckets.setdefault(1, OrderedDict())[key] = None
+                self._min_frequency = 1
+            while self.size_bytes > self.max_bytes:
+                self._evict_one()
+
+    def stats(self):
+        """Hit rate and latency saved so far; XML-RPC and Pyro friendly."""
+        hits, misses = self.hits.value, self.misses.value
+        return {"policy": self.policy, "max_bytes": self.max_bytes, "bytes": self.size_bytes,
+                "entries": len(self._entries), "dictionary_version": self.version, "hits": hits,
+                "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "evictions": self.evictions.value, "invalidations": self.invalidations.value,
+                "saved_seconds": self.saved_seconds.value}
+
+    # --- Internals (caller holds the lock) ---
+    def _invalidate(self, version):
+        if self._entries:
+            self.invalidations.inc()
+        self._entries.clear()
+        self._order.clear()
+        self._buckets.clear()
+        self._min_frequency = 0
+        self.size_bytes = 0
+        self.version = version
+
+    def _touch(self, key, entry):
+        if self.policy == "lru":
+            self._order.move_to_end(key)
+            return
+        frequency = entry[3]
+        bucket = self._buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[frequency]
+            if self._min_frequency == frequency:
+                self._min_frequency = frequency + 1
+        entry[3] = frequency + 1
+        self._buckets.setdefault(frequency + 1, OrderedDict())[key] = None
+
+    def _evict_one(self):
+        if self.policy == "lru":
+            key, _ = self._order.popitem(last=False)
+        else:
+            bucket = self._buckets[self._min_frequency]
+            key, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self._buckets[self._min_frequency]
+                self._min_frequency = min(self._buckets, default=0)
+        self.size_bytes -= self._entries.pop(key)[2]
+        self.evictions.inc()
+
+
+class SharedResultCache:
+    """Per-process L1 (FilterResultCache) over a Redis L2. get_many() returns, per text, the
+    filtered text and where it came from ("l1", "l2"), or (None, None) on a miss. Redis errors
+    count as misses: the cache never stops a worker from filtering."""
+    def __init__(self, client, ttl=3600, l1=None):
+        self.client = client
+        self.ttl = ttl
+        self.l1 = l1
+        self._skip_l2_until = 0.0
+        self.hits = metrics.counter("filter_shared_cache_hits_total", "L1 misses answered by the shared Redis cache.")
+        self.misses = metrics.counter("filter_shared_cache_misses_total", "Texts in neither cache.")
+        self.errors = metrics.counter("filter_shared_cache_errors_total", "Redis errors while using the shared cache.")
+        self.saved_seconds = metrics.counter("filter_shared_cache_saved_seconds_total", "Filtering time the L2 hits avoided.")
+        self.round_trip = metrics.histogram("filter_shared_cache_seconds", "One MGET or pipelined SET batch.")
+
+    @classmethod
+    def from_env(cls):
+        """The cache configured by FILTER_SHARED_CACHE*, with the FILTER_CACHE_MB L1; None if disabled."""
+        if os.environ.get(SHARED_CACHE_ENV) != "1":
+            return None
+        import redis # Only needed with the shared cache on, e.g. by RabbitMQ workers
+        host = os.environ.get(SHARED_CACHE_HOST_ENV) or os.environ.get("REDIS_HOST", "localhost")
+        client = redis.Redis(host=host, port=6379, db=0, decode_responses=True)
+        return cls(client, int(os.environ.get(SHARED_CACHE_TTL_ENV, "3600")), FilterResultCache.from_env())
+
+    @staticmethod
+    def _key(text, version):
+        return f"{SHARED_KEY_PREFIX}{version}:{cache_key(text, version).hex()}"
+
+    def _l2_failed(self, error):
+        self.errors.inc()
+        self._skip_l2_until = time.monotonic() + SHARED_RETRY_AFTER
+        print(f"Shared cache: Redis error ({error}); using the local cache only for {SHARED_RETRY_AFTER:.0f}s.")
+
+    def get_many(self, texts, version):
+        found = [(None, None)] * len(texts)
+        missing = [] # Indexes to look up in Redis
+        for i, text in enumerate(texts):
+            filtered_text = self.l1.get(text, version) if self.l1 else None
+            if filtered_text is not None:
+                found[i] = (filtered_text, "l1")
+            else:
+                missing.append(i)
+        if missing and time.monotonic() >= self._skip_l2_until:
+            try:
+                with self.round_trip.time():
+                    values = self.client.mget([self._key(texts[i], version) for i in missing])
+            except Exception as e: # redis.exceptions.RedisError and socket errors
+                self._l2_failed(e)
+                values = [None] * len(missing)
+            for i, value in zip(missing, values):
+                if value is None:
+                    continue
+                entry = json.loads(value)
+                found[i] = (entry["filtered"], "l2")
+                self.hits.inc()
+                self.saved_seconds.add(entry.get("cost", 0.0))
+                if self.l1:
+                    self.l1.put(texts[i], version, entry["filtered"], entry.get("cost", 0.0))
+        self.misses.add(sum(1 for value, _ in found if value is None))
+        return found
+
+    def put_many(self, entries, version):
+        """entries: (text, filtered_text, cost_seconds) computed by this worker."""
+        if not entries:
+            return
+        for text, filtered_text, cost in entries:
+            if self.l1:
+                self.l1.put(text, version, filtered_text, cost)
+        if time.monotonic() < self._skip_l2_until:
+            return
+        try:
+            with self.round_trip.time():
+                pipe = self.client.pipeline(transaction=False)
+                for text, filtered_text, cost in entries:
+                    pipe.set(self._key(text, version), json.dumps({"filtered": filtered_text, "cost": cost}), ex=self.ttl)
+                pipe.execute()
+        except Exception as e:
+            self._l2_failed(e)
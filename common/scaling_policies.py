@@ -0,0 +1,137 @@
+# scaling_policies.py
+# Worker-count policies for the dynamic scaler, and the arrival-rate estimate they work from.
+#
+#   formula    the original rule: N = ceil((B + lambda_est * Tr) / C), lambda_est a fixed guess
+#   reactive   sized on the arrival rate measured over the last poll: N = ceil((rate + B / Tr) / C)
+#   holt       same sizing, on a Holt-Winters forecast of the rate (level + trend, plus an
+#              additive season if season_length is set) over the time new workers need to start,
+#              so capacity is requested ahead of a rising load
+#
+# All of them take (backlog, arrival rate) once per poll and return a worker count clamped to
+# [min_workers, max_workers]. dynamic_scaler_rabbit.py picks one with SCALER_POLICY;
+# stress_tests/Benchmark/scaling_policy_replay.py replays a load trace through each.
+import math
+
+
+class ArrivalRateEstimator:
+    """Tasks/second arriving between two polls: backlog growth plus the tasks completed meanwhile.
+    Without a completion count it assumes the workers were busy the whole interval while a
+    backlog was left (service_capacity tasks/second), which undercounts arrivals when idle."""
+    def __init__(self):
+        self._last = None # (time, backlog, completed_total)
+
+    def update(self, now, backlog, completed_total=None, service_capacity=None):
+        last, self._last = self._last, (now, backlog, completed_total)
+        if last is None or now <= last[0]:
+            return None
+        elapsed = now - last[0]
+        if completed_total is not None and last[2] is not None:
+            served = completed_total - last[2]
+        elif service_capacity is not None:
+            served = service_capacity * elapsed if backlog > 0 else last[1]
+        else:
+            return None
+        return max(0.0, backlog - last[1] + served) / elapsed
+
+
+class _Policy:
+    name = None
+
+    def __init__(self, capacity, min_workers=1, max_workers=3, target_response_time=2.0, **unused):
+        self.capacity = capacity # Tasks/second one worker completes (C)
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.target_response_time = target_response_time # Seconds a backlog may take to clear (Tr)
+
+    def clamp(self, workers):
+        return max(self.min_workers, min(workers, self.max_workers))
+
+    def size_for(self, arrival_rate, backlog):
+        """Workers to keep up with arrival_rate and clear the backlog within target_response_time."""
+        if self.capacity <= 0:
+            return self.max_workers if (arrival_rate or backlog) else self.min_workers
+        return math.ceil((arrival_rate + backlog / self.target_response_time) / self.capacity)
+
+
+class FormulaPolicy(_Policy):
+    """The scaler's original rule, kept as the baseline."""
+    name = "formula"
+
+    def __init__(self, capacity, arrival_rate_estimate=150, **kwargs):
+        super().__init__(capacity, **kwargs)
+        self.arrival_rate_estimate = arrival_rate_estimate
+
+    def desired_workers(self, backlog, arrival_rate=None):
+        numerator = backlog + (self.arrival_rate_estimate * self.target_response_time)
+        if self.capacity > 0:
+            return self.clamp(math.ceil(numerator / self.capacity))
+        return self.max_workers if numerator > 0 else self.min_workers
+
+
+class ReactivePolicy(_Policy):
+    """Sized on the last measured arrival rate (the previous one if this poll has none)."""
+    name = "reactive"
+
+    def __init__(self, capacity, **kwargs):
+        super().__init__(capacity, **kwargs)
+        self.last_rate = 0.0
+
+    def desired_workers(self, backlog, arrival_rate=None):
+        if arrival_rate is not None:
+            self.last_rate = arrival_rate
+        return self.clamp(self.size_for(self.last_rate, backlog))
+
+
+class HoltWintersPolicy(_Policy):
+    """Additive Holt-Winters on the per-poll arrival rate. Sizes for the highest forecast over the
+    next `horizon` polls, where horizon covers one poll plus the worker start-up lead time."""
+    name = "holt"
+
+    def __init__(self, capacity, interval=5.0, lead_time=2.0, alpha=0.5, beta=0.3, gamma=0.3,
+                 season_length=0, **kwargs):
+        super().__init__(capacity, **kwargs)
+        self.alpha = alpha # Level smoothing
+        self.beta = beta # Trend smoothing
+        self.gamma = gamma # Seasonal smoothing
+        self.season_length = int(season_length) # Polls per season (0: no seasonality)
+        self.horizon = max(1, math.ceil((interval + lead_time) / interval))
+        self.level = None
+        self.trend = 0.0
+        self.seasonal = [0.0] * self.season_length
+        self.step = 0
+
+    def _season(self, step):
+        return self.seasonal[step % self.season_length] if self.season_length else 0.0
+
+    def observe(self, rate):
+        if self.level is None:
+            self.level = rate
+        else:
+            season = self._season(self.step)
+            previous_level = self.level
+            self.level = self.alpha * (rate - season) + (1 - self.alpha) * (self.level + self.trend)
+            self.trend = self.beta * (self.level - previous_level) + (1 - self.beta) * self.trend
+            if self.season_length:
+                self.seasonal[self.step % self.season_length] = (
+                    self.gamma * (rate - self.level) + (1 - self.gamma) * season)
+        self.step += 1
+
+    def forecast(self, steps_ahead):
+        if self.level is None:
+            return 0.0
+        return max(0.0, self.level + steps_ahead * self.trend + self._season(self.step + steps_ahead - 1))
+
+    def desired_workers(self, backlog, arrival_rate=None):
+        if arrival_rate is not None:
+            self.observe(arrival_rate)
+        predicted = max(self.forecast(h) for h in range(1, self.horizon + 1))
+        return self.clamp(self.size_for(predicted, backlog))
+
+
+POLICIES = {policy.name: policy for policy in (FormulaPolicy, ReactivePolicy, HoltWintersPolicy)}
+
+def make_policy(name, capacity, **params):
+    """Policy by name; parameters a policy does not use are ignored."""
+    if name not in POLICIES:
+        raise ValueError(f"Unknown scaling policy '{name}' (choose from {', '.join(POLICIES)}).")
+    return POLICIES[name](capacity, **params)
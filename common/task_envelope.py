@@ -0,0 +1,96 @@
+# task_envelope.py
+# Filter task identity and timestamps, carried producer -> queue -> worker -> results.
+#
+# A task on the wire is {"task_id", "text", "enqueued_at"}; the worker adds "dequeued_at" and
+# "finished_at" to the result it stores. Plain-text tasks (old producers) are still accepted:
+# they simply have no id or enqueue time, so only their service time can be measured.
+import json
+import time
+import uuid
+
+from common.latency_histogram import LatencyHistogram
+
+
+def new_task(text):
+    return {"task_id": uuid.uuid4().hex, "text": text, "enqueued_at": time.time()}
+
+def encode_task(text):
+    """Wire format of a new task for the Redis/RabbitMQ queues."""
+    return json.dumps(new_task(text))
+
+def decode_task(raw):
+    """Accepts an encoded task or a plain text string (bytes or str) and stamps dequeued_at."""
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    task = None
+    if raw.startswith("{"):
+        try:
+            task = json.loads(raw)
+            if not isinstance(task, dict) or "text" not in task:
+                task = None
+        except json.JSONDecodeError:
+            pass # A text that merely starts with '{'
+    if task is None:
+        task = {"task_id": None, "text": raw, "enqueued_at": None}
+    task["dequeued_at"] = time.time()
+    return task
+
+def result_record(task, filtered_text, **extra):
+    """The stored result: original/filtered/timestamp as before, plus the task's id and timestamps."""
+    finished_at = time.time()
+    record = {
+        "task_id": task.get("task_id"),
+        "original": task["text"],
+        "filtered": filtered_text,
+        "enqueued_at": task.get("enqueued_at"),
+        "dequeued_at": task.get("dequeued_at"),
+        "finished_at": finished_at,
+        "timestamp": finished_at, # Kept for existing readers
+    }
+    record.update(extra)
+    return record
+
+def task_timings(result):
+    """(queue_wait, service_time, end_to_end) in seconds; None for a value that can't be computed."""
+    enqueued_at, dequeued_at, finished_at = (result.get("enqueued_at"), result.get("dequeued_at"),
+                                             result.get("finished_at"))
+    queue_wait = (dequeued_at - enqueued_at) if enqueued_at is not None and dequeued_at is not None else None
+    service_time = (finished_at - dequeued_at) if dequeued_at is not None and finished_at is not None else None
+    end_to_end = (finished_at - enqueued_at) if enqueued_at is not None and finished_at is not None else None
+    return queue_wait, service_time, end_to_end
+
+def format_timings(result):
+    """'queue wait 1.20ms, service 0.31ms, end-to-end 1.51ms' for one result."""
+    parts = []
+    for name, value in zip(("queue wait", "service", "end-to-end"), task_timings(result)):
+        parts.append(f"{name} {value * 1000:.2f}ms" if value is not None else f"{name} n/a")
+    return ", ".join(parts)
+
+
+class TaskTimingSummary:
+    """Queue-wait, service-time and end-to-end latency distributions over a set of results."""
+    def __init__(self):
+        self.queue_wait = LatencyHistogram()
+        self.service_time = LatencyHistogram()
+        self.end_to_end = LatencyHistogram()
+        self.results = 0
+
+    def add(self, result):
+        self.results += 1
+        for histogram, value in zip((self.queue_wait, self.service_time, self.end_to_end), task_timings(result)):
+            if value is not None:
+                histogram.record(max(0.0, value)) # Clocks of different hosts may disagree slightly
+
+    def format_lines(self):
+        lines = [f"Task timings over {self.results} results:"]
+        for name, histogram in (("Queue wait", self.queue_wait), ("Service time", self.service_time),
+                                ("End-to-end", self.end_to_end)):
+            if histogram.count:
+                lines.append(f"  {name:<12}: {histogram.format_summary()} (n={histogram.count})")
+            else:
+                lines.append(f"  {name:<12}: n/a (results without timestamps)")
+        return lines
+
+    def print_summary(self, prefix=""):
+        for line in self.format_lines():
+            print(prefix + line)
@@ -0,0 +1,116 @@
+# text_normalizer.py
+# Optional normalization for the censor matcher (common/censor_matcher.py), so obfuscated insults
+# ("1D10T", "i.d.i.o.t", full-width "ｉｄｉｏｔ", "dümmy") match their dictionary entries.
+#
+# One str.translate pass with a precomputed per-character table does all character folding:
+#   - NFKC compatibility folding (full-width, ligatures, circled/superscript digits, ...) and
+#     casefold ("ß" -> "ss"). Combining marks are dropped: a per-character table cannot compose
+#     them, so accents are folded away altogether ("dümmy" and "dümmy" both -> "dummy").
+#   - Leetspeak: 0->o 1->i 3->e 4->a 5->s 7->t @->a $->s (the mapped symbols become word characters).
+#     One letter per symbol, so other readings are missed: "ST00PID" (0 for u) becomes "stoopid",
+#     "1" for "l" becomes "i", and "+" or "!" still split the word.
+# The table is built eagerly for Latin, Greek/Cyrillic and the full-width forms, and filled in
+# lazily (then cached) for any other character the first time it is seen.
+#
+# Separator collapsing works on words, not characters: a run of at least MIN_SPELLED_RUN
+# single-character words with at most MAX_SEPARATOR separator characters between them is read as
+# one word ("i.d.i.o.t", "i d i o t", "i-d-i-o-t" -> "idiot"; "_" is a word character, so
+# "i_d_i_o_t" is not). Dictionary entries go through the same steps, so "St00pid" in the
+# dictionary is stored as "stoopid" and matches "ST00PID", but not "stupid".
+#
+# Folding can change lengths ("ﬁ" -> "fi", combining marks -> ""), so spans found in the
+# normalized text are mapped back through an offset map, built only for texts with a match (and
+# skipped when every character folds to exactly one) with a second translate table of lengths.
+#
+#   FILTER_NORMALIZE=1        normalize in filter_worker_redis.py / filter_worker_rabbit.py
+#   FILTER_NORMALIZE_LEET=0   ... without the leetspeak mapping
+from itertools import accumulate
+from bisect import bisect_right
+import unicodedata
+import re
+import os
+
+LEET = {"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"}
+MIN_SPELLED_RUN = 3 # Single characters in a row read as one spelled-out word
+MAX_SEPARATOR = 3 # Separator characters allowed between them (" . ")
+# A spelled-out run (single-character words, separators without newlines) or a plain word
+TOKEN_PATTERN = re.compile(r"(?<!\w)\w(?:[^\w\n]{1,%d}\w(?!\w)){%d,}|\w+" % (MAX_SEPARATOR, MIN_SPELLED_RUN - 1))
+NON_WORD_PATTERN = re.compile(r"\W+")
+EAGER_RANGES = ((0x0000, 0x0530), (0x1E00, 0x2000), (0xFF00, 0xFFF0)) # Latin, Greek, Cyrillic, full-width
+NORMALIZE_ENV = "FILTER_NORMALIZE"
+LEET_ENV = "FILTER_NORMALIZE_LEET"
+
+
+def fold_character(character, leet=True):
+    decomposed = unicodedata.normalize("NFKD", character)
+    folded = unicodedata.normalize("NFKC", "".join(c for c in decomposed if not unicodedata.combining(c))).casefold()
+    if leet:
+        folded = "".join(LEET.get(c, c) for c in folded)
+    return folded
+
+
+class _FoldingTable(dict):
+    """str.translate table: code point -> folded string. Misses are folded and cached."""
+    def __init__(self, leet):
+        super().__init__()
+        self.leet = leet
+        self.non_unit = set() # Characters whose folding is not exactly one character
+        for start, end in EAGER_RANGES:
+            for code in range(start, end):
+                self[code]
+
+    def __missing__(self, code):
+        character = chr(code)
+        folded = fold_character(character, self.leet)
+        if len(folded) != 1:
+            self.non_unit.add(character)
+        self[code] = folded
+        return folded
+
+
+class _LengthTable(dict):
+    """str.translate table: code point -> chr(length of its folding), for the offset map."""
+    def __init__(self, folding):
+        super().__init__()
+        self.folding = folding
+
+    def __missing__(self, code):
+        length = chr(len(self.folding[code]))
+        self[code] = length
+        return length
+
+
+class TextNormalizer:
+    """normalize() folds a text; words() splits the folded text into words, spelled-out runs
+    joined; word_spans() and original_spans() locate them in the folded and the original text."""
+    def __init__(self, leet=True):
+        self.leet = leet
+        self.name = "nfkc+casefold" + ("+leet" if leet else "") # Part of the result caches' key
+        self._table = _FoldingTable(leet)
+        self._lengths = _LengthTable(self._table)
+
+    @classmethod
+    def from_env(cls):
+        """The normalizer configured by FILTER_NORMALIZE / FILTER_NORMALIZE_LEET, or None."""
+        if os.environ.get(NORMALIZE_ENV) != "1":
+            return None
+        return cls(leet=os.environ.get(LEET_ENV, "1") != "0")
+
+    def normalize(self, text):
+        return text.translate(self._table)
+
+    def words(self, normalized):
+        return [word if word.isalnum() else NON_WORD_PATTERN.sub("", word) for word in TOKEN_PATTERN.findall(normalized)]
+
+    def word_spans(self, normalized):
+        """Spans of words()' words; only needed once a text matched."""
+        return [m.span() for m in TOKEN_PATTERN.finditer(normalized)]
+
+    def original_spans(self, text, spans):
+        """Spans of normalize(text) -> spans of text. A span also takes in the characters that
+        folded to nothing right after it (combining marks)."""
+        if self._table.non_unit.isdisjoint(text):
+            return spans # Every character folded to exactly one: same offsets
+        # starts[i]: where text[i]'s folding starts in the normalized text
+        starts = list(accumulate(map(ord, text.translate(self._lengths)), initial=0))
+        return [(bisect_right(starts, start) - 1, bisect_right(starts, end) - 1) for start, end in spans]
@@ -1,6 +1,13 @@
 # filter_client_pyro.py
 import Pyro4
 import time
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.task_envelope import TaskTimingSummary, format_timings
 
 DISPATCHER_NAME = "example.filter.dispatcher"
 
@@ -30,7 +37,7 @@ def main():
             # submit_text_for_filtering on dispatcher will call a worker
             response_dict = dispatcher_proxy.submit_text_for_filtering(text)
             if isinstance(response_dict, dict) and response_dict.get("status") == "success":
-                print(f"  Dispatcher: Text processed. Filtered: '{response_dict['filtered']}'")
+                print(f"  Dispatcher: Task {response_dict.get('task_id', 'N/A')} processed. Filtered: '{response_dict['filtered']}'")
             else:
                 print(f"  Dispatcher response/error: {response_dict}") # If it's an error string
             time.sleep(0.5) # Give some time between submissions
@@ -45,12 +52,17 @@ def main():
         results = dispatcher_proxy.get_filtered_results()
         if results:
             print("Centrally Stored Filtered Results:")
+            timings = TaskTimingSummary()
             for item in results:
+                timings.add(item)
+                print(f"  Task ID  : {item.get('task_id') or 'N/A'}")
                 print(f"  Original : '{item['original']}'")
                 print(f"  Filtered : '{item['filtered']}'")
                 print(f"  Worker   : {item.get('processed_by_worker', 'N/A')}") # get() in case key is missing
                 print(f"  Timestamp: {time.ctime(item['timestamp'])}")
+                print(f"  Timings  : {format_timings(item)}")
                 print("-" * 20)
+            timings.print_summary()
         else:
             print("No filtered results available from dispatcher yet.")
     except Exception as e:
@@ -1,27 +1,90 @@
 import Pyro4
+import subprocess
 import threading
+import signal
+import math
 import time
 import random
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.readiness import ReadinessPipe, signal_ready
+from common.result_cache import FilterResultCache, dictionary_version
+from common.task_envelope import new_task, result_record
 
 # --- Configuration ---
 DISPATCHER_NAME = "example.filter.dispatcher"
 KNOWN_INSULTS_LIST = {"stupid", "idiot", "dummy", "moron", "lame", "darn", "heck"} # Lowercased
+LATENCY_EWMA_WEIGHT = 0.2 # Weight of the newest round trip in a worker's average latency
+
+# --- Elastic worker pool (off unless PYRO_POOL_MAX_WORKERS > 0) ---
+# The dispatcher starts local filter_worker_pyro.py processes itself and keeps between
+# PYRO_POOL_MIN_WORKERS and PYRO_POOL_MAX_WORKERS of them. They register like hand-started
+# workers, which keep working alongside and count towards the capacity but are never retired.
+# Sizing uses Little's law on the last POOL_INTERVAL: busy seconds / interval = calls in flight
+# on average, and the pool aims for TARGET_IN_FLIGHT_PER_WORKER of them per worker, adding one
+# more while the mean round trip is above POOL_LATENCY_TARGET.
+POOL_MIN_WORKERS = int(os.environ.get("PYRO_POOL_MIN_WORKERS", "1"))
+POOL_MAX_WORKERS = int(os.environ.get("PYRO_POOL_MAX_WORKERS", "0"))
+POOL_LATENCY_TARGET = float(os.environ.get("PYRO_POOL_LATENCY_TARGET", "0.1")) # Seconds per round trip
+TARGET_IN_FLIGHT_PER_WORKER = 2.0
+POOL_INTERVAL = 2.0 # Seconds between sizing decisions
+POOL_COOLDOWN = 6.0 # Seconds after a spawn/retire before the next one
+POOL_READY_TIMEOUT = 15 # Seconds for a spawned worker to register
+POOL_DRAIN_TIMEOUT = 10 # Seconds a retiring worker may take to finish its in-flight calls
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "filter_worker_pyro.py")
 
 @Pyro4.expose
 @Pyro4.behavior(instance_mode="single")
 class FilterDispatcher:
     def __init__(self):
         self._worker_uris = [] # List to store URIs of registered worker objects
-        self._filtered_results = [] # List to store {original, filtered, worker_uri, timestamp}
+        self._filtered_results = [] # List to store {task_id, original, filtered, worker_uri, timestamps}
         self._lock = threading.Lock() # For worker_uris and filtered_results
+        self._results_changed = threading.Condition(self._lock) # Wakes wait_for_results() callers
         self._next_worker_index = 0 # For simple round-robin
+        self._worker_stats = {} # uri -> {"outstanding", "latency_ewma", "completed"}
+        self._worker_idle = threading.Condition(self._lock) # Wakes drain_worker() when a call returns
+        self._dictionary_version = dictionary_version(KNOWN_INSULTS_LIST)
+        self._cache = FilterResultCache.from_env() # Consulted before any worker is picked; FILTER_CACHE_MB=0 disables it
+
+        metrics.set_labels(component="filter_dispatcher_pyro")
+        self._received = metrics.counter("filter_tasks_received_total", "Texts submitted for filtering.")
+        self._processed = metrics.counter("filter_tasks_processed_total", "Texts filtered by a worker.")
+        self._errors = metrics.counter("filter_task_errors_total", "Submissions answered with an error.")
+        self._in_flight = metrics.gauge("filter_tasks_in_flight", "Texts currently being filtered by a worker.")
+        self._dispatch_time = metrics.histogram("filter_dispatch_seconds", "Worker round trip per text.")
+        metrics.gauge("filter_workers_registered", "Registered workers.", function=lambda: len(self._worker_uris))
         print("FilterDispatcher initialized.")
 
+    def _stats_for(self, worker_uri_str):
+        """The worker's stats entry, created on first use (caller holds the lock)."""
+        return self._worker_stats.setdefault(worker_uri_str, {"outstanding": 0, "latency_ewma": None, "completed": 0})
+
+    def _call_finished(self, worker_uri_str, latency=None):
+        """Bookkeeping after a call to a worker returned (latency given if it succeeded)."""
+        with self._lock:
+            stats = self._worker_stats[worker_uri_str]
+            stats["outstanding"] -= 1
+            if latency is not None:
+                stats["completed"] += 1
+                previous = stats["latency_ewma"]
+                stats["latency_ewma"] = latency if previous is None else (
+                    LATENCY_EWMA_WEIGHT * latency + (1 - LATENCY_EWMA_WEIGHT) * previous)
+            if stats["outstanding"] == 0 and worker_uri_str not in self._worker_uris:
+                del self._worker_stats[worker_uri_str] # Unregistered and now drained
+            self._worker_idle.notify_all()
+
     def register_worker(self, worker_uri_str):
         """Called by a FilterWorker to register itself."""
         with self._lock:
             if worker_uri_str not in self._worker_uris:
                 self._worker_uris.append(worker_uri_str)
+                self._stats_for(worker_uri_str)
                 print(f"Dispatcher: Registered worker: {worker_uri_str}")
                 return f"Worker {worker_uri_str} registered successfully."
             else:
@@ -32,6 +95,8 @@ class FilterDispatcher:
         with self._lock:
             if worker_uri_str in self._worker_uris:
                 self._worker_uris.remove(worker_uri_str)
+                if self._worker_stats.get(worker_uri_str, {}).get("outstanding") == 0:
+                    del self._worker_stats[worker_uri_str] # Otherwise kept until its calls return
                 print(f"Dispatcher: Unregistered worker: {worker_uri_str}")
                 return f"Worker {worker_uri_str} unregistered."
             return "Worker not found for unregistration."
@@ -40,49 +105,74 @@ class FilterDispatcher:
         if not isinstance(original_text, str):
             raise ValueError("Text to filter must be a string.")
 
+        task = new_task(original_text) # Enqueued = received by the dispatcher
+        self._received.inc()
+        version = self._dictionary_version
+        if self._cache is not None:
+            filtered_text = self._cache.get(original_text, version)
+            if filtered_text is not None:
+                task["dequeued_at"] = time.time()
+                self._processed.inc()
+                with self._lock:
+                    self._filtered_results.append(result_record(task, filtered_text, processed_by_worker="cache", cached=True))
+                    self._results_changed.notify_all()
+                return {"status": "success", "task_id": task["task_id"], "original": original_text,
+                        "filtered": filtered_text, "cached": True}
         selected_worker_uri = None
         worker_proxy = None
 
         with self._lock:
             if not self._worker_uris:
                 print("Dispatcher: No workers registered to process the text.")
+                self._errors.inc()
 
                 return "Error: No workers available to filter text."
             
             # Simple round-robin to select a worker
             selected_worker_uri = self._worker_uris[self._next_worker_index % len(self._worker_uris)]
             self._next_worker_index += 1
+            self._stats_for(selected_worker_uri)["outstanding"] += 1
         
-        print(f"Dispatcher: Assigning text '{original_text[:30]}...' to worker {selected_worker_uri}")
+        print(f"Dispatcher: Assigning task {task['task_id']} '{original_text[:30]}...' to worker {selected_worker_uri}")
+        task["dequeued_at"] = time.time() # Dequeued = handed to a worker
 
+        self._in_flight.inc()
+        latency = None
         try:
             worker_proxy = Pyro4.Proxy(selected_worker_uri)
             # The worker needs the list of insults to perform the filtering
             # The worker's method should be like: filter_text_actual(text, insults_to_check)
             filtered_text = worker_proxy.process_this_text(original_text, list(KNOWN_INSULTS_LIST)) 
                                                             # Pass KNOWN_INSULTS_LIST
+            latency = time.time() - task["dequeued_at"]
         except Pyro4.errors.CommunicationError as e:
             print(f"Dispatcher: Communication error with worker {selected_worker_uri}: {e}. Removing worker.")
             # Auto-remove worker if communication fails
             self.unregister_worker(selected_worker_uri) # Call method that handles lock
+            self._errors.inc()
             return f"Error: Could not reach worker {selected_worker_uri}. Please resubmit."
         except Exception as e:
             print(f"Dispatcher: Error during filtering with worker {selected_worker_uri}: {type(e).__name__} - {e}")
             # Potentially remove worker here too, or mark as unreliable
+            self._errors.inc()
             return f"Error processing text with worker: {e}"
+        finally:
+            self._in_flight.dec()
+            self._call_finished(selected_worker_uri, latency)
+        self._dispatch_time.observe(latency)
+        self._processed.inc()
+        if self._cache is not None:
+            self._cache.put(original_text, version, filtered_text, latency) # A hit saves the worker round trip
 
         # Store the result centrally
         with self._lock:
-            result_entry = {
-                "original": original_text,
-                "filtered": filtered_text,
-                "processed_by_worker": selected_worker_uri,
-                "timestamp": time.time()
-            }
+            result_entry = result_record(task, filtered_text, processed_by_worker=selected_worker_uri)
             self._filtered_results.append(result_entry)
+            self._results_changed.notify_all()
         
         print(f"Dispatcher: Text processed by {selected_worker_uri}. Filtered: '{filtered_text[:30]}...'")
-        return {"status": "success", "original": original_text, "filtered": filtered_text}
+        return {"status": "success", "task_id": task["task_id"], "original": original_text, "filtered": filtered_text,
+                "cached": False}
 
 
     def get_filtered_results(self):
@@ -90,8 +180,161 @@ class FilterDispatcher:
             print(f"Dispatcher: Retrieving {len(self._filtered_results)} filtered results.")
             return list(self._filtered_results) # Return a copy
 
+    def wait_for_results(self, count, timeout=None):
+        """Blocks until at least `count` results are stored (or `timeout` seconds pass) and returns
+        how many there are. Lets clients wait for completion without polling get_filtered_results()."""
+        with self._results_changed:
+            self._results_changed.wait_for(lambda: len(self._filtered_results) >= count, timeout)
+            return len(self._filtered_results)
+
+    def clear_filtered_results(self):
+        """Drops all stored results (e.g. between test runs); returns how many were dropped."""
+        with self._lock:
+            cleared = len(self._filtered_results)
+            self._filtered_results = []
+            print(f"Dispatcher: Cleared {cleared} filtered results.")
+            return cleared
+
+    def dispatch_seconds(self):
+        """{"count", "sum"} of worker round trips so far; deltas give the load over an interval."""
+        snapshot = self._dispatch_time.snapshot()
+        return {"count": snapshot["count"], "sum": snapshot["sum"]}
+
+    def get_worker_stats(self):
+        """Per registered (or still draining) worker: calls outstanding, average round trip, calls completed."""
+        with self._lock:
+            return {uri: dict(stats, registered=uri in self._worker_uris) for uri, stats in self._worker_stats.items()}
+
+    def drain_worker(self, worker_uri_str, timeout=POOL_DRAIN_TIMEOUT):
+        """Unregisters a worker (no new calls go to it) and waits for its in-flight calls to return.
+        Returns True if it drained within `timeout` seconds."""
+        self.unregister_worker(worker_uri_str)
+        with self._worker_idle:
+            return self._worker_idle.wait_for(
+                lambda: self._worker_stats.get(worker_uri_str, {}).get("outstanding", 0) == 0, timeout)
+
+    def get_cache_stats(self):
+        """Result cache hit rate and the worker time it saved ({"enabled": False} if off)."""
+        if self._cache is None:
+            return {"enabled": False}
+        return dict(self._cache.stats(), enabled=True)
+
+    def get_metrics(self):
+        """Counters, gauges and histograms of the dispatcher (same data as the METRICS_PORT endpoint)."""
+        return metrics.snapshot()
+
+class ElasticWorkerPool:
+    """Spawns and retires local filter_worker_pyro.py processes for a FilterDispatcher (see
+    POOL_* above). Spawned workers register themselves through the Name Server like any other;
+    retiring one drains it first: unregister, wait for its in-flight calls, then SIGINT."""
+    def __init__(self, dispatcher, min_workers=POOL_MIN_WORKERS, max_workers=POOL_MAX_WORKERS):
+        self.dispatcher = dispatcher
+        self.min_workers = min(min_workers, max_workers)
+        self.max_workers = max_workers
+        self._managed = [] # {"process", "uri"}, oldest first
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_action = 0.0
+        self._last_busy = None # (time, dispatch_seconds sum) at the previous decision
+        metrics.gauge("filter_workers_managed", "Workers started by the elastic pool.", function=lambda: len(self._managed))
+
+    def start(self):
+        """Runs the sizing loop in a background thread; the Pyro daemon must be serving
+        (spawned workers register through it) for spawns to become ready."""
+        self._thread = threading.Thread(target=self._run, name="ElasticWorkerPool", daemon=True)
+        self._thread.start()
+
+    def spawn(self):
+        with ReadinessPipe() as readiness:
+            proc = readiness.popen([sys.executable, WORKER_SCRIPT], stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+            ready = readiness.wait(1, POOL_READY_TIMEOUT, [proc]) == 1
+        if not ready:
+            print(f"Dispatcher pool: Worker PID {proc.pid} did not register within {POOL_READY_TIMEOUT}s, stopping it.")
+            self._stop_process(proc)
+            return False
+        uri = readiness.ready[proc.pid] # The worker's readiness detail is its URI
+        self._managed.append({"process": proc, "uri": uri})
+        print(f"Dispatcher pool: Spawned worker PID {proc.pid} ({uri}). Managed: {len(self._managed)}")
+        return True
+
+    def retire(self, worker):
+        self._managed.remove(worker)
+        drained = self.dispatcher.drain_worker(worker["uri"])
+        if not drained:
+            print(f"Dispatcher pool: Worker {worker['uri']} still busy after {POOL_DRAIN_TIMEOUT}s, stopping anyway.")
+        self._stop_process(worker["process"])
+        print(f"Dispatcher pool: Retired worker PID {worker['process'].pid}. Managed: {len(self._managed)}")
+
+    def _stop_process(self, proc):
+        if proc.poll() is None:
+            proc.send_signal(signal.SIGINT) # The worker's Ctrl+C path: unregister (a no-op by now) and exit
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+    def _pick_worker_to_retire(self):
+        """The managed worker with the fewest calls in flight (the newest on ties)."""
+        stats = self.dispatcher.get_worker_stats()
+        return min(reversed(self._managed), key=lambda w: stats.get(w["uri"], {}).get("outstanding", 0))
+
+    def desired_workers(self):
+        """Managed workers wanted for the load of the last interval, clamped to [min, max]."""
+        now, busy = time.time(), self.dispatcher.dispatch_seconds()
+        last, self._last_busy = self._last_busy, (now, busy)
+        total = len(self.dispatcher.get_worker_stats()) # All registered or draining workers
+        unmanaged = max(0, total - len(self._managed))
+        if last is None or now <= last[0]:
+            return max(self.min_workers, min(len(self._managed), self.max_workers))
+        in_flight = (busy["sum"] - last[1]["sum"]) / (now - last[0]) # Little's law: busy seconds per second
+        calls = busy["count"] - last[1]["count"]
+        latency = (busy["sum"] - last[1]["sum"]) / calls if calls else 0.0
+        wanted = math.ceil(in_flight / TARGET_IN_FLIGHT_PER_WORKER)
+        if latency > POOL_LATENCY_TARGET:
+            wanted = max(wanted, total + 1)
+        return max(self.min_workers, min(wanted - unmanaged, self.max_workers))
+
+    def _reap(self):
+        """Forgets managed workers that exited on their own (the dispatcher drops their URIs on the next failed call)."""
+        for worker in [w for w in self._managed if w["process"].poll() is not None]:
+            self._managed.remove(worker)
+            self.dispatcher.unregister_worker(worker["uri"])
+            print(f"Dispatcher pool: Worker PID {worker['process'].pid} exited (code {worker['process'].returncode}).")
+
+    def _run(self):
+        while len(self._managed) < self.min_workers and not self._stop.is_set():
+            if not self.spawn():
+                break
+        while not self._stop.wait(POOL_INTERVAL):
+            self._reap()
+            desired = self.desired_workers()
+            if time.time() - self._last_action < POOL_COOLDOWN:
+                continue
+            if desired > len(self._managed):
+                if self.spawn(): # One per decision
+                    self._last_action = time.time()
+            elif desired < len(self._managed):
+                self.retire(self._pick_worker_to_retire())
+                self._last_action = time.time()
+
+    def stop(self):
+        """Stops the sizing loop and every managed worker (all at once: called on dispatcher
+        shutdown, when no calls are in flight any more)."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=POOL_READY_TIMEOUT + POOL_DRAIN_TIMEOUT)
+        for worker in self._managed:
+            self.dispatcher.unregister_worker(worker["uri"])
+            if worker["process"].poll() is None:
+                worker["process"].send_signal(signal.SIGINT)
+        for worker in self._managed:
+            self._stop_process(worker["process"]) # Waits, and kills stragglers
+        print(f"Dispatcher pool: Stopped {len(self._managed)} managed worker(s).")
+        self._managed = []
+
 def start_dispatcher_server():
-    daemon = Pyro4.Daemon(host="127.0.0.1")
+    daemon = Pyro4.Daemon(host=os.environ.get("PYRO_DISPATCHER_HOST", "127.0.0.1")) # Reachable address for multi-node runs
     ns = Pyro4.locateNS()
     
     dispatcher_instance = FilterDispatcher()
@@ -100,6 +343,13 @@ def start_dispatcher_server():
     
     print(f"FilterDispatcherServer ready. URI: {uri}")
     print(f"Registered as '{DISPATCHER_NAME}' in the Name Server.")
+    metrics.start_http_server_from_env(prefix="FilterDispatcherServer:")
+    pool = None
+    if POOL_MAX_WORKERS > 0:
+        pool = ElasticWorkerPool(dispatcher_instance)
+        print(f"FilterDispatcherServer: Elastic pool of {pool.min_workers}-{pool.max_workers} local workers.")
+        pool.start() # Its first workers register once requestLoop() below is serving
+    signal_ready(str(uri)) # Resolvable through the Name Server from here on
     
     try:
         daemon.requestLoop()
@@ -111,6 +361,8 @@ def start_dispatcher_server():
             try: ns.remove(DISPATCHER_NAME)
             except Pyro4.errors.NamingError: pass
         if daemon: daemon.shutdown()
+        if pool:
+            pool.stop() # After the daemon is down, so the workers' unregister calls fail fast instead of hanging
         print("FilterDispatcherServer: Shutdown complete.")
 
 if __name__ == "__main__":
@@ -2,14 +2,26 @@
 import Pyro4
 import re # For filtering
 import time
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.profiling import WorkerProfiler
+from common.readiness import signal_ready
 
 # --- Configuration ---
 DISPATCHER_NAME = "example.filter.dispatcher" # To find and register with the dispatcher
 
 @Pyro4.expose
 class FilterWorker:
-    def __init__(self, worker_id="Worker"): # worker_id for logging
+    def __init__(self, profiler, worker_id="Worker"): # worker_id for logging
         self.worker_id = worker_id
+        self.profiler = profiler
+        self._processed = metrics.counter("filter_tasks_processed_total", "Texts filtered.")
+        self._service_time = metrics.histogram("filter_service_seconds", "Time to filter one text; the sum is the busy time.")
         print(f"{self.worker_id}: Initialized.")
 
     def process_this_text(self, original_text, known_insults_list):
@@ -18,33 +30,50 @@ class FilterWorker:
         It receives the text and the list of insults to use for filtering.
         """
         print(f"{self.worker_id}: Received text to filter: '{original_text[:50]}...' with {len(known_insults_list)} known insults.")
+        start = time.perf_counter()
                 
         # Convert known_insults_list to a set for efficient lookup if not already
-        insults_to_check_set = set(insult.lower() for insult in known_insults_list)
+        with self.profiler.phase("insult set"):
+            insults_to_check_set = set(insult.lower() for insult in known_insults_list)
 
-        words = re.split(r'(\W+)', original_text) # Split by non-word characters, keeping delimiters
-        censored_words = []
-        for word in words:
-            if word.lower() in insults_to_check_set:
-                censored_words.append("CENSORED")
-            else:
-                censored_words.append(word)
-        filtered_text = "".join(censored_words)
+        with self.profiler.phase("filter"):
+            words = re.split(r'(\W+)', original_text) # Split by non-word characters, keeping delimiters
+            censored_words = []
+            for word in words:
+                if word.lower() in insults_to_check_set:
+                    censored_words.append("CENSORED")
+                else:
+                    censored_words.append(word)
+            filtered_text = "".join(censored_words)
+        self._service_time.observe(time.perf_counter() - start)
+        self._processed.inc()
+        self.profiler.task_done()
         
         print(f"{self.worker_id}: Filtering complete. Result: '{filtered_text[:50]}...'")
         return filtered_text # Return the filtered text to the dispatcher
 
+    def get_metrics(self):
+        """Counters and histograms of this worker (same data as the METRICS_PORT endpoint)."""
+        return metrics.snapshot()
+
 def main():
     # --- Worker's local Pyro setup ---
-    worker_daemon = Pyro4.Daemon(host="127.0.0.1") # Use specific host
+    # PYRO_WORKER_HOST: an address the dispatcher can reach when the worker runs on another node
+    worker_daemon = Pyro4.Daemon(host=os.environ.get("PYRO_WORKER_HOST", "127.0.0.1")) # Use specific host
     
+    # FILTER_PROFILE=1 or SIGUSR1: per-phase timings + stack samples (incl. Pyro's server threads), dumped on exit
+    profiler = WorkerProfiler.from_env(f"filter_worker_pyro_{os.getpid()}")
+
     # Create a unique ID for this worker instance for logging/identification
     
-    worker_instance = FilterWorker() 
+    worker_instance = FilterWorker(profiler) 
     worker_uri = worker_daemon.register(worker_instance)
     worker_instance.worker_id = f"Worker@{worker_uri.location}" # Update worker_id with its location
     
     print(f"{worker_instance.worker_id}: Active at URI {worker_uri}")
+    metrics.set_labels(component="filter_worker_pyro", worker=worker_instance.worker_id)
+    metrics.start_http_server_from_env(prefix=f"{worker_instance.worker_id}:")
+    profiler.prefix = f"{worker_instance.worker_id}:"
 
     # --- Register with the Dispatcher ---
     dispatcher_proxy = None
@@ -53,6 +82,7 @@ def main():
         print(f"{worker_instance.worker_id}: Attempting to register with Dispatcher '{DISPATCHER_NAME}'...")
         response = dispatcher_proxy.register_worker(str(worker_uri)) # Pass my URI as string
         print(f"{worker_instance.worker_id}: Dispatcher registration response: {response}")
+        signal_ready(str(worker_uri)) # Registered: the dispatcher can hand us tasks
     except Pyro4.errors.NamingError:
         print(f"{worker_instance.worker_id}: Error: Could not find Dispatcher '{DISPATCHER_NAME}'. Worker will not be able to process tasks from it.")
         worker_daemon.shutdown()
@@ -79,6 +109,7 @@ def main():
                 print(f"{worker_instance.worker_id}: Could not unregister from Dispatcher: {type(e).__name__}")
         
         if worker_daemon: worker_daemon.shutdown()
+        worker_instance.profiler.stop_and_dump()
         print(f"{worker_instance.worker_id}: Shutdown complete.")
 
 if __name__ == "__main__":
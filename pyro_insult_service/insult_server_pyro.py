@@ -1,16 +1,35 @@
 # insult_server_pyro.py
 import Pyro4
 import threading
-import time
 import random
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.broadcast_payload import encode_broadcast
+from common.broadcast_scheduler import BroadcastScheduler
 
 @Pyro4.expose
 @Pyro4.behavior(instance_mode="single") # Ensures all clients interact with the same instance
 class InsultServer:
     def __init__(self):
         self._insults = set()       # To store unique insults
+        self._insults_list = []     # Same insults, for O(1) random picks at high broadcast rates
         self._subscriber_uris = []  # List to store URIs of subscriber's notification objects
         self._lock = threading.Lock()
+        self._scheduler = BroadcastScheduler.from_env() # Rate/batch from BROADCAST_* env vars, 5s default
+
+        metrics.set_labels(component="insult_server_pyro")
+        self._add_requests = metrics.counter("insult_add_requests_total", "add_insult calls.")
+        self._insults_added = metrics.counter("insults_added_total", "New (non-duplicate) insults stored.")
+        self._broadcasts = metrics.counter("broadcasts_published_total", "Broadcast messages sent (one per batch).")
+        self._notifications = metrics.counter("broadcast_notifications_total", "Subscriber notifications attempted.")
+        self._notification_errors = metrics.counter("broadcast_notification_errors_total", "Subscriber notifications that failed.")
+        metrics.gauge("insults_stored", "Insults in the set.", function=lambda: len(self._insults_list))
+        metrics.gauge("subscribers_registered", "Registered subscribers.", function=lambda: len(self._subscriber_uris))
         
         # Start a daemon thread for broadcasting insults
         self._broadcaster_active = True
@@ -19,6 +38,7 @@ class InsultServer:
         print("InsultServer initialized and broadcaster thread started.")
 
     def add_insult(self, insult_string):
+        self._add_requests.inc()
         with self._lock:
             if not isinstance(insult_string, str):
 
@@ -28,6 +48,8 @@ class InsultServer:
                 print(f"Insult '{insult_string}' already exists.")
                 return f"Insult '{insult_string}' already exists."
             self._insults.add(insult_string)
+            self._insults_list.append(insult_string)
+            self._insults_added.inc()
             print(f"Added insult: '{insult_string}'")
             return f"Insult '{insult_string}' added successfully."
 
@@ -57,38 +79,54 @@ class InsultServer:
                 print(f"Subscriber URI {subscriber_uri_str} not found for unregistration.")
                 return f"Subscriber {subscriber_uri_str} not found."
 
+    def get_metrics(self):
+        """Counters and gauges of this server (same data as the METRICS_PORT endpoint)."""
+        return metrics.snapshot()
+
     def _notify_specific_subscriber(self, subscriber_uri_str, insult_message):
         """Attempts to notify a single subscriber."""
+        self._notifications.inc()
         try:
             # Create a proxy for the subscriber's remote notification object
             subscriber_notification_obj = Pyro4.Proxy(subscriber_uri_str)
             # Call the agreed-upon method on the subscriber's object
             subscriber_notification_obj.receive_insult(insult_message)
-            print(f"  Successfully notified {subscriber_uri_str} with '{insult_message}'")
+            if self._scheduler.verbose:
+                print(f"  Successfully notified {subscriber_uri_str} with '{insult_message}'")
         except Pyro4.errors.CommunicationError:
+            self._notification_errors.inc()
             print(f"  Communication error with subscriber {subscriber_uri_str}. Will attempt to unregister.")
 
         except Exception as e:
+            self._notification_errors.inc()
             print(f"  Error notifying subscriber {subscriber_uri_str}: {type(e).__name__} - {e}")
 
 
     def _periodic_broadcast(self):
         """Daemon thread function to periodically send a random insult."""
-        print("Broadcaster: Starting periodic broadcasts every 5 seconds.")
+        scheduler = self._scheduler
+        print(f"Broadcaster: Starting periodic broadcasts at {scheduler.describe()}.")
         while self._broadcaster_active:
-            time.sleep(5)
-            insult_to_send = None
+            slots = scheduler.wait_for_slots(lambda: self._broadcaster_active)
+            batches = []
             current_subscriber_uris_copy = []
 
             with self._lock:
-                if self._insults and self._subscriber_uris:
-                    insult_to_send = random.choice(list(self._insults))
+                if self._insults_list and self._subscriber_uris:
+                    batches = [random.choices(self._insults_list, k=scheduler.batch_size) for _ in range(slots)]
                     current_subscriber_uris_copy = list(self._subscriber_uris) # Work on a copy
 
-            if insult_to_send and current_subscriber_uris_copy:
-                print(f"Broadcaster: Sending insult '{insult_to_send}' to {len(current_subscriber_uris_copy)} subscribers.")
-                for sub_uri in current_subscriber_uris_copy:
-                    self._notify_specific_subscriber(sub_uri, insult_to_send)
+            if batches and current_subscriber_uris_copy:
+                for batch in batches:
+                    if scheduler.verbose:
+                        print(f"Broadcaster: Sending insult '{batch[0] if len(batch) == 1 else batch}' to {len(current_subscriber_uris_copy)} subscribers.")
+                    payload = encode_broadcast(batch)
+                    self._broadcasts.inc()
+                    for sub_uri in current_subscriber_uris_copy:
+                        self._notify_specific_subscriber(sub_uri, payload)
+                summary = scheduler.periodic_summary()
+                if summary:
+                    print(f"Broadcaster: {summary} to {len(current_subscriber_uris_copy)} subscribers.")
             elif not self._insults:
                 # print("Broadcaster: No insults to send.") 
                 pass
@@ -117,6 +155,7 @@ def start_server():
     
     print(f"InsultServer ready. URI: {uri}")
     print(f"Registered as '{service_name}' in the Name Server.")
+    metrics.start_http_server_from_env(prefix="InsultServer:")
     
     try:
         daemon.requestLoop() # Start the event loop of the server to wait for calls
@@ -1,12 +1,21 @@
 # insult_subscriber_pyro.py
 import Pyro4
 import time # For a small delay
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.broadcast_payload import decode_broadcast
 
 @Pyro4.expose # This class will receive remote calls
 class NotificationReceiver:
     def receive_insult(self, insult_message):
         """This method is called by the InsultServer when a new insult is broadcast."""
-        print(f"\n[SUBSCRIBER] >>> Received Insult: {insult_message}")
+        insults, _ = decode_broadcast(insult_message) # One insult or a batch
+        for insult in insults:
+            print(f"\n[SUBSCRIBER] >>> Received Insult: {insult}")
         return "ACK: Insult received."
 
 def main():
@@ -3,6 +3,12 @@ import pika
 import sys
 import time
 import random
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.task_envelope import encode_task
 
 RABBITMQ_HOST = 'localhost'
 TASK_QUEUE_NAME = 'filter_task_work_queue'
@@ -19,7 +25,7 @@ def send_batch(channel, num_messages, batch_name="Batch"):
     for i in range(num_messages):
         text_content = random.choice(SAMPLE_TEXTS) + f" msg_{i}"
         channel.basic_publish(
-            exchange='', routing_key=TASK_QUEUE_NAME, body=text_content,
+            exchange='', routing_key=TASK_QUEUE_NAME, body=encode_task(text_content),
             properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
         )
         if (i + 1) % 100 == 0: # Print progress for large batches
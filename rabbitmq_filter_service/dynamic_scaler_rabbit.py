@@ -6,10 +6,17 @@ import os
 import signal
 import math
 import datetime
+import urllib.request
+import json
+import sys
 
 # --- Configuration ---
 PYTHON_EXECUTABLE = "/home/milax/Documents/SD/P1/SD-env/bin/python" # YOUR VENV PYTHON!
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+from common.scaling_policies import ArrivalRateEstimator, make_policy
 FILTER_WORKER_SCRIPT = os.path.join(PROJECT_ROOT, "rabbitmq_filter_service", "filter_worker_rabbit.py")
 
 RESULTS_QUEUE_NAME_RABBIT = 'filter_results_data_queue'
@@ -36,10 +43,29 @@ Tr_TARGET_RESPONSE_TIME = 2.0 # Seconds: Target for tasks in backlog
 LAMBDA_ESTIMATED_ARRIVAL_RATE = 150 # tasks/second
 
 SCALE_COOLDOWN_PERIOD = 15 # Seconds: Reduced for quicker reaction in demo
+# How N_desired is chosen (common/scaling_policies.py): "formula" (the rule above, default),
+# "reactive" (measured arrival rate) or "holt" (Holt-Winters forecast of the arrival rate, scaling
+# ahead of demand; SCALER_SEASON_SECONDS > 0 adds a seasonal component of that period).
+SCALING_POLICY = os.environ.get("SCALER_POLICY", "formula")
+SEASON_SECONDS = float(os.environ.get("SCALER_SEASON_SECONDS", "0"))
+WORKER_LEAD_TIME = 2.0 # Seconds from a scale-up decision to a cold-started worker consuming
+WORKER_READY_TIMEOUT = 15 # Seconds to wait for a new worker to report it is consuming
+# Warm pool: pre-started standby workers (connected, not consuming). Scaling up then activates one
+# with SIGUSR2 (activation is just basic_consume) instead of paying interpreter start + pika import
+# + AMQP handshake. 0 = cold starts only. See stress_tests/Benchmark/scale_up_latency.py.
+WARM_POOL_SIZE = int(os.environ.get("SCALER_WARM_POOL_SIZE", "0")) if hasattr(signal, "SIGUSR2") else 0
+ACTIVATE_SIGNAL = getattr(signal, "SIGUSR2", None)
+# Scale-down drains a worker (SIGTERM: finish and ack what it holds, then exit) and picks the one
+# holding the fewest unacked deliveries, read from its metrics endpoint (METRICS_PORT = base + worker number).
+WORKER_DRAIN_TIMEOUT = 15 # Seconds to wait for a draining worker before killing it
+WORKER_METRICS_BASE_PORT = int(os.environ.get("SCALER_WORKER_METRICS_BASE_PORT", "9300")) # 0: no endpoints, stop the oldest
+METRICS_FETCH_TIMEOUT = 0.5 # Seconds per worker when choosing whom to stop
 
 active_worker_processes_info = [] # List of dicts: {"process": Popen_obj, "pid": pid, "id_str": "Worker-X"}
+standby_worker_processes_info = [] # Same dicts, for the warm pool
 last_scaling_action_time = 0
 worker_id_counter = 0 # To give unique IDs to workers
+completed_by_worker = {} # id_str -> last filter_tasks_processed_total seen (kept after the worker stops)
 
 # --- Log File ---
 SCALER_LOG_FILE = "dynamic_scaler_log.csv"
@@ -62,53 +88,138 @@ def get_queue_length(queue_name):
         if connection and connection.is_open:
             connection.close()
 
+def launch_worker_process(standby=False):
+    """Starts a worker and waits for its readiness signal (consuming, or connected for a standby).
+    Returns its info dict, or None if it could not be started."""
+    global worker_id_counter
+    worker_id_counter += 1
+    worker_id_str = f"Worker-{worker_id_counter}"
+    try:
+        # Redirect worker output to its own log file to keep scaler output clean
+        worker_logfile_name = f"worker_{worker_id_counter}_log.txt"
+        worker_logfile = open(worker_logfile_name, "w")
+        env = dict(os.environ, FILTER_WORKER_STANDBY="1" if standby else "0")
+        metrics_port = WORKER_METRICS_BASE_PORT + worker_id_counter if WORKER_METRICS_BASE_PORT else None
+        if metrics_port:
+            env["METRICS_PORT"] = str(metrics_port)
+
+        # The worker reports on the readiness pipe once it is consuming: that is when capacity arrives
+        launched_at = time.perf_counter()
+        with ReadinessPipe() as readiness:
+            proc = readiness.popen([PYTHON_EXECUTABLE, FILTER_WORKER_SCRIPT], env=env,
+                                   stdout=worker_logfile, stderr=subprocess.STDOUT)
+            ready = readiness.wait(1, WORKER_READY_TIMEOUT, [proc]) == 1
+        time_to_ready = time.perf_counter() - launched_at
+        worker_logfile.close() # The child has its own copy of the descriptor
+    except Exception as e:
+        log_message = f"Failed to start new worker {worker_id_str}: {e}"
+        print(log_message); log_to_file(f"ERROR,{log_message}")
+        if 'worker_logfile' in locals() and worker_logfile: worker_logfile.close() # Close if opened
+        return None
+
+    state = "standby (connected)" if standby else "consuming"
+    if ready:
+        log_message = f"New worker {worker_id_str} (PID: {proc.pid}) {state} after {time_to_ready:.3f}s"
+    else:
+        log_message = f"New worker {worker_id_str} (PID: {proc.pid}) not ready after {time_to_ready:.1f}s (exited: {proc.poll() is not None})"
+    print(log_message); log_to_file(f"INFO,{log_message}")
+    return {"process": proc, "pid": proc.pid, "id_str": worker_id_str, "logfile": worker_logfile_name,
+            "metrics_port": metrics_port}
+
+def activate_standby_worker():
+    """Moves a warm worker to the active set with one signal; returns its info, or None if the pool is empty."""
+    while standby_worker_processes_info:
+        worker_info = standby_worker_processes_info.pop(0)
+        if worker_info["process"].poll() is not None:
+            continue # Died while idle
+        signal_sent_at = time.perf_counter()
+        os.kill(worker_info["pid"], ACTIVATE_SIGNAL)
+        active_worker_processes_info.append(worker_info)
+        log_message = (f"Activated standby worker {worker_info['id_str']} (PID: {worker_info['pid']}) in "
+                       f"{(time.perf_counter() - signal_sent_at) * 1000:.2f}ms. Total: {len(active_worker_processes_info)}")
+        print(log_message); log_to_file(f"INFO,{log_message}")
+        return worker_info
+    return None
+
+def refill_warm_pool():
+    """Tops the standby pool up to WARM_POOL_SIZE, but never beyond what could still be activated."""
+    room = MAX_WORKERS - len(active_worker_processes_info)
+    while len(standby_worker_processes_info) < min(WARM_POOL_SIZE, room):
+        worker_info = launch_worker_process(standby=True)
+        if worker_info is None:
+            break
+        standby_worker_processes_info.append(worker_info)
+
 def start_new_worker():
-    global active_worker_processes_info, worker_id_counter
+    global active_worker_processes_info
     if len(active_worker_processes_info) < MAX_WORKERS:
-        worker_id_counter += 1
-        worker_id_str = f"Worker-{worker_id_counter}"
-        log_message = f"Attempting to start {worker_id_str} (current: {len(active_worker_processes_info)})"
+        log_message = f"Attempting to add a worker (current: {len(active_worker_processes_info)}, warm: {len(standby_worker_processes_info)})"
         print(log_message); log_to_file(f"INFO,{log_message}")
-        try:
-            # Redirect worker output to its own log file to keep scaler output clean
-            worker_logfile_name = f"worker_{worker_id_counter}_log.txt"
-            worker_logfile = open(worker_logfile_name, "w")
-            
-            proc = subprocess.Popen([PYTHON_EXECUTABLE, FILTER_WORKER_SCRIPT],
-                                    stdout=worker_logfile, stderr=subprocess.STDOUT)
-            
-            active_worker_processes_info.append({"process": proc, "pid": proc.pid, "id_str": worker_id_str, "logfile": worker_logfile_name})
-            log_message = f"New worker {worker_id_str} (PID: {proc.pid}) started. Total: {len(active_worker_processes_info)}"
-            print(log_message); log_to_file(f"INFO,{log_message}")
+        if activate_standby_worker():
             return True
-        except Exception as e:
-            log_message = f"Failed to start new worker {worker_id_str}: {e}"
-            print(log_message); log_to_file(f"ERROR,{log_message}")
-            if 'worker_logfile' in locals() and worker_logfile: worker_logfile.close() # Close if opened
+        worker_info = launch_worker_process() # Cold start
+        if worker_info is None:
             return False
+        active_worker_processes_info.append(worker_info)
+        log_message = f"Worker {worker_info['id_str']} started cold. Total: {len(active_worker_processes_info)}"
+        print(log_message); log_to_file(f"INFO,{log_message}")
+        return True
     return False
 
+def worker_metric(worker_info, name):
+    """One value from the worker's metrics endpoint, or None if unknown."""
+    if not worker_info.get("metrics_port"):
+        return None
+    try:
+        url = f"http://127.0.0.1:{worker_info['metrics_port']}/metrics.json"
+        with urllib.request.urlopen(url, timeout=METRICS_FETCH_TIMEOUT) as response:
+            return json.load(response).get(name)
+    except (OSError, ValueError):
+        return None
+
+def worker_unacked(worker_info):
+    """Deliveries the worker holds unacked (its filter_tasks_unacked gauge), or None if unknown."""
+    return worker_metric(worker_info, "filter_tasks_unacked")
+
+def completed_tasks_total():
+    """Tasks completed by all workers so far, from their metrics; None without endpoints."""
+    if not WORKER_METRICS_BASE_PORT:
+        return None
+    for worker_info in active_worker_processes_info:
+        processed = worker_metric(worker_info, "filter_tasks_processed_total")
+        if processed is not None:
+            completed_by_worker[worker_info["id_str"]] = processed
+    return sum(completed_by_worker.values())
+
+def pick_worker_to_stop():
+    """Index of the least-loaded active worker; the oldest one wins ties, or if no load is known."""
+    loads = [(worker_unacked(info), index) for index, info in enumerate(active_worker_processes_info)]
+    known = [(load, index) for load, index in loads if load is not None]
+    return min(known)[1] if known else 0
+
 def stop_one_worker():
     global active_worker_processes_info
     if len(active_worker_processes_info) > MIN_WORKERS:
         try:
-            worker_info_to_stop = active_worker_processes_info.pop(0) # Stop oldest worker
+            worker_info_to_stop = active_worker_processes_info.pop(pick_worker_to_stop())
             proc_to_stop = worker_info_to_stop["process"]
             pid_to_stop = worker_info_to_stop.get("pid", "N/A")
             worker_id_str = worker_info_to_stop.get("id_str", f"PID {pid_to_stop}")
 
-            log_message = f"Attempting to stop worker {worker_id_str} (PID: {pid_to_stop})"
+            log_message = f"Attempting to drain and stop worker {worker_id_str} (PID: {pid_to_stop})"
             print(log_message); log_to_file(f"INFO,{log_message}")
             
-            proc_to_stop.terminate() 
-            proc_to_stop.wait(timeout=5) 
-            if proc_to_stop.poll() is None: 
-                log_message_kill = f"Worker {worker_id_str} (PID: {pid_to_stop}) did not terminate gracefully, killing."
+            drain_started = time.perf_counter()
+            proc_to_stop.terminate() # SIGTERM = drain: the worker finishes and acks what it holds, then exits
+            try:
+                proc_to_stop.wait(timeout=WORKER_DRAIN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                log_message_kill = f"Worker {worker_id_str} (PID: {pid_to_stop}) did not drain within {WORKER_DRAIN_TIMEOUT}s, killing."
                 print(log_message_kill); log_to_file(f"INFO,{log_message_kill}")
                 proc_to_stop.kill()
                 proc_to_stop.wait(timeout=2)
             
-            log_message_stopped = f"Worker {worker_id_str} stopped. Total: {len(active_worker_processes_info)}"
+            log_message_stopped = f"Worker {worker_id_str} stopped after {time.perf_counter() - drain_started:.2f}s. Total: {len(active_worker_processes_info)}"
             print(log_message_stopped); log_to_file(f"INFO,{log_message_stopped}")
 
             # Close worker's log file
@@ -122,8 +233,23 @@ def stop_one_worker():
         return False
     return False
 
+def stop_standby_workers():
+    while standby_worker_processes_info:
+        worker_info = standby_worker_processes_info.pop()
+        proc = worker_info["process"]
+        if proc.poll() is None:
+            proc.terminate() # Standby workers exit straight from their idle wait
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait(timeout=2)
+        log_message = f"Standby worker {worker_info['id_str']} stopped."
+        print(log_message); log_to_file(f"INFO,{log_message}")
+
 def cleanup_terminated_workers():
-    global active_worker_processes_info
+    global active_worker_processes_info, standby_worker_processes_info
+    standby_worker_processes_info = [w for w in standby_worker_processes_info if w["process"].poll() is None]
     # (cleanup logic remains same)
     live_workers_info = []
     changed = False
@@ -143,12 +269,24 @@ def cleanup_terminated_workers():
 def scaler_loop():
     global last_scaling_action_time
 
-    header = "Timestamp,Backlog_B,Active_Workers,N_Desired_Formula,Action_Taken"
+    policy = make_policy(SCALING_POLICY, C_WORKER_CAPACITY, min_workers=MIN_WORKERS, max_workers=MAX_WORKERS,
+                         target_response_time=Tr_TARGET_RESPONSE_TIME,
+                         arrival_rate_estimate=LAMBDA_ESTIMATED_ARRIVAL_RATE, interval=POLL_INTERVAL,
+                         lead_time=0.0 if WARM_POOL_SIZE else WORKER_LEAD_TIME,
+                         season_length=round(SEASON_SECONDS / POLL_INTERVAL))
+    rate_estimator = ArrivalRateEstimator()
+    print(f"Scaler: Using the '{policy.name}' scaling policy.")
+
+    # Arrival_Rate is appended so older logs (5 columns) still replay
+    header = "Timestamp,Backlog_B,Active_Workers,N_Desired_Formula,Action_Taken,Arrival_Rate"
     print(header); log_to_file(header) # Print and log CSV header
 
     print("Scaler: Starting initial minimum workers...")
     for _ in range(MIN_WORKERS): # Start initial MIN_WORKERS
         start_new_worker()
+    if WARM_POOL_SIZE:
+        print(f"Scaler: Pre-starting {WARM_POOL_SIZE} standby worker(s) for the warm pool...")
+        refill_warm_pool()
     last_scaling_action_time = 0 # Allow first decision after poll_interval without cooldown
 
     try:
@@ -166,14 +304,9 @@ def scaler_loop():
             
             num_current_live_workers = len(active_worker_processes_info)
             
-            numerator = current_backlog_B + (LAMBDA_ESTIMATED_ARRIVAL_RATE * Tr_TARGET_RESPONSE_TIME)
-            N_desired = MIN_WORKERS 
-            if C_WORKER_CAPACITY > 0:
-                N_desired = math.ceil(numerator / C_WORKER_CAPACITY)
-            else: 
-                 if numerator > 0 : N_desired = MAX_WORKERS 
-
-            N_desired = max(MIN_WORKERS, min(N_desired, MAX_WORKERS))
+            arrival_rate = rate_estimator.update(time.time(), current_backlog_B, completed_tasks_total(),
+                                                 service_capacity=num_current_live_workers * C_WORKER_CAPACITY)
+            N_desired = policy.desired_workers(current_backlog_B, arrival_rate)
             
             action_taken_str = "Maintain"
             scaled_this_cycle = False
@@ -194,8 +327,11 @@ def scaler_loop():
                 action_taken_str = f"InCooldown ({SCALE_COOLDOWN_PERIOD - (time.time() - last_scaling_action_time):.0f}s left)"
             
             num_current_live_workers = len(active_worker_processes_info) # Re-check after potential scaling
-            log_line = f"{ts},{current_backlog_B},{num_current_live_workers},{N_desired},{action_taken_str}"
+            rate_str = f"{arrival_rate:.1f}" if arrival_rate is not None else ""
+            log_line = f"{ts},{current_backlog_B},{num_current_live_workers},{N_desired},{action_taken_str},{rate_str}"
             print(log_line); log_to_file(log_line)
+            if WARM_POOL_SIZE:
+                refill_warm_pool() # After the decision, so a refill never delays an activation
 
     except KeyboardInterrupt:
         log_message_kb = "\nScaler: KeyboardInterrupt. Shutting down..."
@@ -203,6 +339,7 @@ def scaler_loop():
     finally:
         log_message_final = "Scaler: Final cleanup. Terminating active workers..."
         print(log_message_final); log_to_file(f"INFO,{log_message_final}")
+        stop_standby_workers()
         
 
         while len(active_worker_processes_info) > 0:
@@ -219,7 +356,7 @@ if __name__ == "__main__":
         print(f"CRITICAL WARNING: PYTHON_EXECUTABLE is '{PYTHON_EXECUTABLE}'.")
     with open(SCALER_LOG_FILE, "w") as f: # Create/overwrite log file
         f.write(f"Scaler Log Initialized at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Config: MIN_W={MIN_WORKERS}, MAX_W={MAX_WORKERS}, POLL_I={POLL_INTERVAL}s, COOLDOWN={SCALE_COOLDOWN_PERIOD}s\n")
+        f.write(f"Config: MIN_W={MIN_WORKERS}, MAX_W={MAX_WORKERS}, POLL_I={POLL_INTERVAL}s, COOLDOWN={SCALE_COOLDOWN_PERIOD}s, WARM_POOL={WARM_POOL_SIZE}, POLICY={SCALING_POLICY}\n")
         f.write(f"Formula: T_avg={T_AVG_PROCESSING_PER_TASK:.6f}s, C_cap={C_WORKER_CAPACITY:.0f}rps, Tr_target={Tr_TARGET_RESPONSE_TIME}s, Lambda_est={LAMBDA_ESTIMATED_ARRIVAL_RATE}rps\n")
 
     try:
@@ -2,6 +2,12 @@
 import pika
 import sys
 import time
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.task_envelope import encode_task
 
 RABBITMQ_HOST = 'localhost'
 TASK_QUEUE_NAME = 'filter_task_work_queue'
@@ -42,7 +48,7 @@ def main():
             channel.basic_publish(
                 exchange='', # Default exchange
                 routing_key=TASK_QUEUE_NAME, # Name of the queue
-                body=text_content,
+                body=encode_task(text_content), # Task id + enqueue time + text
                 properties=pika.BasicProperties(
                     delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE, # Make message persistent
                 )
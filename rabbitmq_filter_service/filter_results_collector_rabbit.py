@@ -4,12 +4,21 @@ import sys
 import signal
 import json
 import time # For ctime
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.task_envelope import TaskTimingSummary, format_timings
 
 RABBITMQ_HOST = 'localhost'
 RESULTS_QUEUE_NAME = 'filter_results_data_queue'
 
+SUMMARY_EVERY = 100 # Print the timing distributions every N results (and on exit)
+
 # Global channel for signal handler
 consuming_channel = None
+timings = TaskTimingSummary() # Queue-wait / service / end-to-end over all results received
 
 def signal_shutdown(signum, frame):
     global consuming_channel
@@ -29,11 +38,17 @@ def display_result_callback(ch, method, properties, body):
         result_data_str = body.decode()
         result_data = json.loads(result_data_str) # Parse JSON string
         
+        timings.add(result_data)
+        
         print("\n--- Filtered Result Received ---")
+        print(f"  Task ID  : {result_data.get('task_id') or 'N/A'}")
         print(f"  Original : '{result_data.get('original', 'N/A')}'")
         print(f"  Filtered : '{result_data.get('filtered', 'N/A')}'")
         print(f"  Worker ID: {result_data.get('worker_id', 'N/A')}")
         print(f"  Timestamp: {time.ctime(result_data.get('timestamp', 0))}")
+        print(f"  Timings  : {format_timings(result_data)}")
+        if timings.results % SUMMARY_EVERY == 0:
+            timings.print_summary("[Collector] ")
         
         ch.basic_ack(delivery_tag=method.delivery_tag) # Acknowledge received result
     except json.JSONDecodeError:
@@ -93,6 +108,8 @@ def main():
                 connection.close()
             print("Collector: Connection closed in finally block.")
             
+    if timings.results:
+        timings.print_summary("[Collector] ")
     print("Results Collector: Exited.")
 
 if __name__ == '__main__':
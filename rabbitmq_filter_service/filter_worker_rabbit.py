@@ -1,95 +1,212 @@
 # filter_worker_rabbit.py
 import pika
+import functools
 import time
-import re
 import signal
 import os
 import json
 import random
+import sys
 
-RABBITMQ_HOST = 'localhost'
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.profiling import WorkerProfiler
+from common.readiness import signal_ready
+from common.censor_matcher import CensorMatcher
+from common.insult_dictionary import DictionarySubscriber, LiveDictionary
+from common.result_cache import SharedResultCache
+from common.task_envelope import decode_task, result_record
+from common.text_normalizer import TextNormalizer
+
+RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", 'localhost') # Set on other nodes to reach the shared broker
 TASK_QUEUE_NAME = 'filter_task_work_queue'
 RESULTS_QUEUE_NAME = 'filter_results_data_queue'
 
 KNOWN_INSULTS = {"stupid", "idiot", "dummy", "moron", "lame", "darn", "heck"} # Lowercased
 
+# --- Shared result cache (FILTER_SHARED_CACHE=1, common/result_cache.py) ---
+# Checked per delivery: the local L1 first, then one GET against the shared Redis.
+shared_cache = SharedResultCache.from_env()
+
+# --- Live dictionary (FILTER_DICTIONARY_UPDATES=1, common/insult_dictionary.py) ---
+# KNOWN_INSULTS until a published dictionary arrives; new versions are built and swapped in by a
+# background thread subscribed on Redis, so consumption never pauses for an update.
+# FILTER_NORMALIZE=1: also match obfuscated spellings ("1D10T", "i.d.i.o.t"; common/text_normalizer.py)
+normalizer = TextNormalizer.from_env()
+dictionary = LiveDictionary(KNOWN_INSULTS, build_matcher=functools.partial(CensorMatcher, normalizer=normalizer),
+                            prefix=f"Worker {os.getpid()}:")
+
+# --- Warm-pool standby mode (used by dynamic_scaler_rabbit.py) ---
+# With FILTER_WORKER_STANDBY=1 the worker starts up, connects and declares its queues, then idles
+# without consuming until it gets ACTIVATE_SIGNAL. Activation is then just basic_consume.
+# (SIGUSR1 is taken by the profiler toggle.)
+STANDBY_ENV = "FILTER_WORKER_STANDBY"
+ACTIVATE_SIGNAL = getattr(signal, "SIGUSR2", None) # None on Windows: standby mode unavailable
+STANDBY_POLL = 0.02 # Seconds between activation checks while idle; bounds the activation latency
+
+# --- Drain on shutdown ---
+# SIGTERM/SIGINT start a drain: acks are deferred (so the broker's window stays full and it stops
+# pushing), every message already received is processed and its result published, then the
+# consumer is cancelled and the deferred acks go out in one multiple-ack. Nothing is handed back
+# for redelivery. A second signal, or FILTER_WORKER_DRAIN=0, stops at once: buffered messages are
+# rejected and redelivered to other workers (the old behaviour).
+DRAIN_ON_SHUTDOWN = os.environ.get("FILTER_WORKER_DRAIN", "1") != "0"
+PREFETCH_COUNT = int(os.environ.get("RABBITMQ_PREFETCH", "1")) # Unacked deliveries per worker
+EVENT_LOOP_TICK = 0.25 # Seconds between shutdown-flag checks while idle
+DRAIN_SETTLE = 0.05 # A drain pass that receives nothing for this long means the window is empty
+DRAIN_TIMEOUT = 10 # Seconds a drain may take before the worker stops anyway
+
+# --- Metrics (served on METRICS_PORT if set) ---
+tasks_received = metrics.counter("filter_tasks_received_total", "Tasks delivered by RabbitMQ.")
+tasks_processed = metrics.counter("filter_tasks_processed_total", "Tasks filtered, published and acked.")
+task_errors = metrics.counter("filter_task_errors_total", "Tasks nacked because the result could not be published.")
+tasks_redelivered = metrics.counter("filter_tasks_redelivered_total", "Deliveries flagged as redelivered by the broker.")
+tasks_unacked = metrics.gauge("filter_tasks_unacked", "Deliveries received and not yet acked; the scaler drains the least loaded worker.")
+service_time = metrics.histogram("filter_service_seconds", "Time to filter, publish and ack one task; the sum is the busy time.")
+queue_wait = metrics.histogram("filter_queue_wait_seconds", "Enqueue-to-delivery time of enveloped tasks.")
+
 # --- Graceful shutdown ---
-# Global channel for signal handler to attempt stopping consumption
+# The handler only sets flags: the consume loop in main() sees them between deliveries
 consuming_channel = None
 worker_id = os.getpid() # Unique ID for this worker instance
+standby = os.environ.get(STANDBY_ENV) == "1" and ACTIVATE_SIGNAL is not None
+activated_at = None # perf_counter time ACTIVATE_SIGNAL arrived
+shutdown_requested = False
+stop_now = False # Second signal: skip the drain
+deferred_ack_tags = [] # Delivery tags (of the current channel) processed during a drain, acked together at the end
+
+def signal_activate(signum, frame):
+    global activated_at
+    if activated_at is None:
+        activated_at = time.perf_counter()
 
 def signal_shutdown(signum, frame):
-    global consuming_channel
-    print(f"\nWorker {worker_id}: Shutdown signal received...")
-    if consuming_channel and consuming_channel.is_open:
-        try:
-            # Tells RabbitMQ to stop sending messages to this consumer.
-            # The current message being processed (if any) should still be acked/nacked.
-            # The start_consuming() loop will then typically exit.
-            consuming_channel.stop_consuming()
-            print(f"Worker {worker_id}: Consumption stopping command sent.")
-        except Exception as e:
-            print(f"Worker {worker_id}: Error trying to stop consuming: {e}")
-    # The main loop's finally block will handle closing the connection.
+    global shutdown_requested, stop_now
+    if shutdown_requested:
+        stop_now = True
+        print(f"\nWorker {worker_id}: Second shutdown signal, stopping without draining...")
+        return
+    shutdown_requested = True
+    mode = "draining" if DRAIN_ON_SHUTDOWN else "stopping"
+    print(f"\nWorker {worker_id}: Shutdown signal received, {mode}...")
 
 signal.signal(signal.SIGINT, signal_shutdown)
 signal.signal(signal.SIGTERM, signal_shutdown)
+if ACTIVATE_SIGNAL is not None:
+    signal.signal(ACTIVATE_SIGNAL, signal_activate)
 
+# FILTER_PROFILE=1 or SIGUSR1: per-phase timings + stack samples, dumped on exit
+profiler = WorkerProfiler.from_env(f"filter_worker_rabbit_{worker_id}", prefix=f"Worker {worker_id}:")
 
-def filter_text_logic(original_text, known_insults_set):
-    words = re.split(r'(\W+)', original_text)
-    censored_words = []
-    for word in words:
-        if word.lower() in known_insults_set:
-            censored_words.append("CENSORED")
-        else:
-            censored_words.append(word)
-    return "".join(censored_words)
+
+def filter_text_logic(original_text, matcher):
+    """The actual filtering logic: every dictionary word or phrase becomes CENSORED (whole words,
+    any case; see common/censor_matcher.py)."""
+    return matcher.censor(original_text)
 
 def process_message_callback(ch, method, properties, body):
     """Callback executed when a message is received from the task queue."""
-    original_text = body.decode()
-    print(f"\nWorker {worker_id}: Received task: '{original_text[:50]}...'")
+    with profiler.phase("decode"):
+        task = decode_task(body) # Envelope or plain text; stamps dequeued_at
+    tasks_received.inc()
+    tasks_unacked.inc()
+    if method.redelivered:
+        tasks_redelivered.inc()
+    if task["enqueued_at"] is not None:
+        queue_wait.observe(max(0.0, task["dequeued_at"] - task["enqueued_at"]))
+    original_text = task["text"]
+    print(f"\nWorker {worker_id}: Received task {task['task_id']}: '{original_text[:50]}...'")
 
-    filtered_text = filter_text_logic(original_text, KNOWN_INSULTS)
-    print(f"Worker {worker_id}: Filtered result: '{filtered_text[:50]}...'")
+    current = dictionary.current() # Filter and cache under one version, even if a swap lands meanwhile
+    filtered_text, source = None, None
+    if shared_cache is not None:
+        with profiler.phase("cache lookup"):
+            filtered_text, source = shared_cache.get_many([original_text], current.fingerprint)[0]
+    if filtered_text is None:
+        started = time.perf_counter()
+        with profiler.phase("filter"):
+            filtered_text = filter_text_logic(original_text, current.matcher)
+        if shared_cache is not None:
+            with profiler.phase("cache store"):
+                shared_cache.put_many([(original_text, filtered_text, time.perf_counter() - started)], current.fingerprint)
+    print(f"Worker {worker_id}: Filtered result{f' ({source} cache)' if source else ''}: '{filtered_text[:50]}...'")
 
-    # Prepare result data
-    result_data = {
-        "original": original_text,
-        "filtered": filtered_text,
-        "worker_id": worker_id,
-        "timestamp": time.time()
-    }
-    result_body = json.dumps(result_data)
+    # Prepare result data (with the task's id and timestamps)
+    extra = {"cached": source} if source else {}
+    with profiler.phase("encode"):
+        result_body = json.dumps(result_record(task, filtered_text, worker_id=worker_id,
+                                               redelivered=method.redelivered, **extra))
 
     try:
         # Publish the filtered result to the results queue
-        ch.queue_declare(queue=RESULTS_QUEUE_NAME, durable=True) # Ensures results queue exists
-        ch.basic_publish(
-            exchange='', # Default exchange
-            routing_key=RESULTS_QUEUE_NAME,
-            body=result_body,
-            properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
-        )
+        with profiler.phase("queue_declare"):
+            ch.queue_declare(queue=RESULTS_QUEUE_NAME, durable=True) # Ensures results queue exists
+        with profiler.phase("publish"):
+            ch.basic_publish(
+                exchange='', # Default exchange
+                routing_key=RESULTS_QUEUE_NAME,
+                body=result_body,
+                properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
+            )
         print(f"Worker {worker_id}: Sent filtered result to queue '{RESULTS_QUEUE_NAME}'.")
         
-        # Acknowledge the message from the task queue after successful processing AND result publishing
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        print(f"Worker {worker_id}: Task acknowledged.")
+        # Acknowledge the message from the task queue after successful processing AND result publishing.
+        # While draining, the ack is held back so the broker sends no more (see drain_and_cancel).
+        if shutdown_requested and DRAIN_ON_SHUTDOWN and not stop_now:
+            deferred_ack_tags.append(method.delivery_tag)
+        else:
+            with profiler.phase("ack"):
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+            tasks_unacked.dec()
+            print(f"Worker {worker_id}: Task acknowledged.")
+        service_time.observe(time.time() - task["dequeued_at"])
+        tasks_processed.inc()
+        profiler.task_done()
 
     except Exception as e:
+        task_errors.inc()
         print(f"Worker {worker_id}: Error publishing result or acknowledging task: {e}")
         # Decide on retry logic or nack (negative acknowledgment)
         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False) # Don't requeue if we can't process result
+        tasks_unacked.dec()
         print(f"Worker {worker_id}: Task NACKed (not requeued) due to result processing error.")
 
 
+def forget_channel_deliveries():
+    """The channel is gone: the broker redelivers whatever it had not seen acked, and delivery
+    tags are per channel, so none of them may be acked on the next one."""
+    deferred_ack_tags.clear()
+    tasks_unacked.set(0)
+
+def drain_and_cancel(connection, channel, consumer_tag):
+    """Processes every delivery already sent to us, then cancels the consumer and acks them all.
+    Acks are deferred from the first shutdown signal, so the broker stops at our prefetch window
+    and nothing is left buffered for basic_cancel to reject back into the queue."""
+    started = time.perf_counter()
+    if DRAIN_ON_SHUTDOWN:
+        while not stop_now and time.perf_counter() - started < DRAIN_TIMEOUT:
+            received = tasks_received.value
+            connection.process_data_events(time_limit=DRAIN_SETTLE) # Dispatches buffered deliveries to the callback
+            if tasks_received.value == received:
+                break # Nothing new for DRAIN_SETTLE: the broker has stopped sending
+    channel.basic_cancel(consumer_tag) # Pika rejects (requeues) anything still undispatched
+    if deferred_ack_tags:
+        channel.basic_ack(delivery_tag=max(deferred_ack_tags), multiple=True)
+        tasks_unacked.dec(len(deferred_ack_tags))
+    print(f"Worker {worker_id}: Drained {len(deferred_ack_tags)} task(s) "
+          f"in {time.perf_counter() - started:.3f}s; consumer cancelled.")
+    deferred_ack_tags.clear()
+
 def main():
     global consuming_channel, worker_id
     connection = None # Initialize to None
 
     print(f"Filter Worker {worker_id}: Starting...")
+    metrics.set_labels(component="filter_worker_rabbit", worker=worker_id)
+    metrics.start_http_server_from_env(prefix=f"Worker {worker_id}:")
+    subscriber = DictionarySubscriber.start_from_env(dictionary, prefix=f"Worker {worker_id}:")
     
     while True: # Outer loop for connection retries
         try:
@@ -102,25 +219,41 @@ def main():
             consuming_channel.queue_declare(queue=RESULTS_QUEUE_NAME, durable=True) 
             print(f"Worker {worker_id}: Connected to RabbitMQ. Queues '{TASK_QUEUE_NAME}' and '{RESULTS_QUEUE_NAME}' ready.")
 
-            # Fair dispatch: Don't give more than one message to a worker at a time.
+            # Fair dispatch: Don't give more than PREFETCH_COUNT (default 1) messages to a worker at a time.
             # The worker will send an ack when it's done.
-            consuming_channel.basic_qos(prefetch_count=1)
+            consuming_channel.basic_qos(prefetch_count=PREFETCH_COUNT)
+
+            just_activated = False
+            if standby and activated_at is None:
+                print(f"Worker {worker_id}: Standby: connected, waiting for {ACTIVATE_SIGNAL.name} to start consuming.")
+                signal_ready("standby") # The pool counts us as warm from here
+                while activated_at is None and not shutdown_requested:
+                    connection.sleep(STANDBY_POLL) # Keeps heartbeats flowing while idle
+                if shutdown_requested:
+                    break
+                just_activated = True
 
-            consuming_channel.basic_consume(
+            consumer_tag = consuming_channel.basic_consume(
                 queue=TASK_QUEUE_NAME,
                 on_message_callback=process_message_callback
                 # auto_ack=False by default, which is what we want for manual ack
             )
 
+            if just_activated:
+                print(f"Worker {worker_id}: Consuming {(time.perf_counter() - activated_at) * 1000:.1f}ms after activation.")
             print(f"Worker {worker_id}: Waiting for tasks on '{TASK_QUEUE_NAME}'. To exit press CTRL+C")
-            consuming_channel.start_consuming() # Blocking call
+            signal_ready(TASK_QUEUE_NAME) # Consumer registered: the broker will deliver to us (first connection only)
+            # Like start_consuming(), but checks the shutdown flag between deliveries (at least every tick)
+            while not shutdown_requested:
+                connection.process_data_events(time_limit=EVENT_LOOP_TICK)
+            drain_and_cancel(connection, consuming_channel, consumer_tag)
             
-            # If start_consuming() exits (e.g., due to stop_consuming() from signal handler)
             print(f"Worker {worker_id}: Consumption loop finished.")
             break # Exit outer while loop if consumption finished gracefully
 
         except pika.exceptions.AMQPConnectionError as e:
             print(f"Worker {worker_id}: RabbitMQ Connection Error: {e}. Retrying in 5 seconds...")
+            forget_channel_deliveries()
             if consuming_channel and consuming_channel.is_open: consuming_channel.close()
             if connection and connection.is_open: connection.close()
             consuming_channel, connection = None, None
@@ -130,6 +263,7 @@ def main():
             break # Exit outer while loop
         except Exception as e:
             print(f"Worker {worker_id}: An unexpected error occurred in main loop: {e}. Retrying in 5s...")
+            forget_channel_deliveries()
             if consuming_channel and consuming_channel.is_open: consuming_channel.close()
             if connection and connection.is_open: connection.close()
             consuming_channel, connection = None, None
@@ -141,6 +275,9 @@ def main():
                 connection.close()
             print(f"Worker {worker_id}: Connection closed in finally block.")
     
+    if subscriber is not None:
+        subscriber.stop()
+    profiler.stop_and_dump()
     print(f"Filter Worker {worker_id}: Exited.")
 
 if __name__ == "__main__":
@@ -2,18 +2,24 @@
 import pika
 import sys
 import time
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.insult_shards import ADD_INSULT_QUEUE_NAME, declare_insult_queues, insult_route, shard_count_from_env
 
 RABBITMQ_HOST = 'localhost'
-ADD_INSULT_QUEUE_NAME = 'add_insult_queue' # Must match processor's queue
+SHARD_COUNT = shard_count_from_env() # Must match the processors' INSULT_SHARD_COUNT
 
 def main():
     try:
         connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
         channel = connection.channel()
 
-        # Declare the queue: this ensures it exists.
-        # The processor also declares it as durable.
-        channel.queue_declare(queue=ADD_INSULT_QUEUE_NAME, durable=True)
+        # Declare the queue(s): this ensures they exist (and, sharded, are bound) before any processor
+        # is up. The processors also declare them as durable.
+        declare_insult_queues(channel, SHARD_COUNT)
 
         default_insults = [
             "Your code is so messy, it looks like a spaghetti factory exploded.",
@@ -30,15 +36,16 @@ def main():
             print(f"Sending default insults...")
 
         for insult_text in insults_to_send:
+            exchange, routing_key = insult_route(insult_text, SHARD_COUNT)
             channel.basic_publish(
-                exchange='', # Default exchange
-                routing_key=ADD_INSULT_QUEUE_NAME, # Name of the queue
+                exchange=exchange,
+                routing_key=routing_key,
                 body=insult_text,
                 properties=pika.BasicProperties(
                     delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE, # Make message persistent
                 )
             )
-            print(f" [x] Sent '{insult_text}' to queue '{ADD_INSULT_QUEUE_NAME}'")
+            print(f" [x] Sent '{insult_text}' to '{exchange or ADD_INSULT_QUEUE_NAME}' (routing key '{routing_key}')")
             time.sleep(0.05) # Tiny pause
 
         connection.close()
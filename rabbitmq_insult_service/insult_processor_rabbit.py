@@ -5,47 +5,236 @@ import random
 import threading
 import signal
 import sys 
+import os
+import json
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.broadcast_payload import encode_broadcast
+from common.broadcast_scheduler import BroadcastScheduler
+from common.insult_shards import ADD_INSULT_QUEUE_NAME, SHARD_EXCHANGE_NAME, shard_count_from_env, shard_queue_name
 
 RABBITMQ_HOST = 'localhost'
-ADD_INSULT_QUEUE_NAME = 'add_insult_queue' # For receiving new insults
 BROADCAST_EXCHANGE_NAME = 'insult_broadcast_exchange' # Fanout for broadcasting
 
+# --- Sharded mode ---
+# With SHARD_COUNT > 1, adders route each insult by a hash of its text through a direct
+# exchange, and this instance only owns (consumes, dedupes, checkpoints) shard SHARD_INDEX.
+# Routing and queue names: common/insult_shards.py.
+#
+# Every shard publishes a report (size + sample) every SHARD_REPORT_INTERVAL on its own timer,
+# checked inside the broadcaster's wait loop, and every shard collects all reports. The leader,
+# the only shard that broadcasts, is the lowest shard index with a live report: shard 0
+# normally. If it dies, its reports go stale after SHARD_REPORT_MAX_AGE and the next shard up
+# takes over (no broadcasts in between); when it comes back, both may broadcast for up to one
+# report interval. A shard that just (re)connected listens for two intervals before leading.
+SHARD_COUNT = shard_count_from_env()
+SHARD_INDEX = int(os.environ.get("INSULT_SHARD_INDEX", 0))
+SHARD_REPORTS_EXCHANGE_NAME = 'insult_shard_reports' # Fanout: every shard reports its size + a sample
+SHARD_REPORT_SAMPLE_SIZE = 64 # Insults sampled into each report
+SHARD_REPORT_INTERVAL = float(os.environ.get("INSULT_SHARD_REPORT_INTERVAL", 1.0)) # Seconds, independent of the broadcast rate
+SHARD_REPORT_MAX_AGE = 3 * SHARD_REPORT_INTERVAL # Three missed reports: the shard is dead
+SHARDED = SHARD_COUNT > 1
+if SHARDED:
+    ADD_INSULT_QUEUE_NAME = shard_queue_name(SHARD_INDEX)
+
+# --- Persistence / batching configuration ---
+# 'file' keeps an append-only JSON-lines log next to this script, 'redis' keeps a Redis set,
+# 'none' disables checkpointing (old in-memory behaviour).
+CHECKPOINT_BACKEND = os.environ.get("INSULT_CHECKPOINT_BACKEND", "file")
+_SHARD_SUFFIX = f".shard-{SHARD_INDEX}" if SHARDED else ""
+CHECKPOINT_FILE = os.environ.get("INSULT_CHECKPOINT_FILE",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), f"insults_checkpoint{_SHARD_SUFFIX}.jsonl"))
+CHECKPOINT_REDIS_HOST = os.environ.get("INSULT_CHECKPOINT_REDIS_HOST", 'localhost')
+CHECKPOINT_REDIS_PORT = int(os.environ.get("INSULT_CHECKPOINT_REDIS_PORT", 6379))
+CHECKPOINT_REDIS_KEY = os.environ.get("INSULT_CHECKPOINT_REDIS_KEY", 'rabbit_insults_set') + _SHARD_SUFFIX
+
+PREFETCH_COUNT = int(os.environ.get("INSULT_PREFETCH_COUNT", 500)) # Unacked messages the broker may push to us
+CHECKPOINT_BATCH_SIZE = int(os.environ.get("INSULT_CHECKPOINT_BATCH", 200)) # Checkpoint + ack after this many messages
+CHECKPOINT_INTERVAL = float(os.environ.get("INSULT_CHECKPOINT_INTERVAL", 0.5)) # ...or after this many seconds
+
 # In-memory store for unique insults
 _insults_set = set()
-_insults_lock = threading.Lock() # To protect _insults_set
+_insults_list = [] # Same insults, for O(1) random picks at high broadcast rates
+_insults_lock = threading.Lock() # To protect _insults_set and _insults_list
 
 _broadcaster_active = True
 _consumer_channel = None # Make it accessible for shutdown
 
+# Messages received since the last checkpoint. They are only acked once the
+# insults they carried are safely in the checkpoint (at-least-once: a crash
+# before the checkpoint means RabbitMQ redelivers them, and the set dedupes).
+_pending_new_insults = []
+_pending_message_count = 0
+_last_pending_delivery_tag = None
+_checkpoint_store = None
+
+# --- Metrics (served on METRICS_PORT if set) ---
+insult_messages_received = metrics.counter("insult_messages_received_total", "add_insult messages consumed.")
+insults_added = metrics.counter("insults_added_total", "New (non-duplicate) insults stored.")
+checkpoints_written = metrics.counter("insult_checkpoints_total", "Checkpoint + multi-ack batches.")
+checkpoint_time = metrics.histogram("insult_checkpoint_seconds", "Time to persist and ack one batch.")
+broadcasts_published = metrics.counter("broadcasts_published_total", "Broadcast messages published.")
+broadcast_errors = metrics.counter("broadcast_errors_total", "Broadcaster connection or publish errors.")
+metrics.gauge("insults_stored", "Insults in the in-memory set.", function=lambda: len(_insults_list))
+metrics.gauge("insult_messages_unacked", "Messages waiting for the next checkpoint.", function=lambda: _pending_message_count)
+
+
+class FileCheckpointStore:
+    """Append-only JSON-lines log: one insult per line, only new insults are ever appended."""
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        insults = set()
+        if not os.path.exists(self.path):
+            return insults
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    insults.add(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write; those insults were never acked.
+                    print(f"[Processor] Skipping corrupt checkpoint line: {line[:50]}")
+        return insults
+
+    def append(self, new_insults):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(insult) + "\n" for insult in new_insults))
+            f.flush()
+            os.fsync(f.fileno()) # Must be on disk before we ack
+
+    def close(self):
+        pass
+
+
+class RedisCheckpointStore:
+    """Keeps the insult set mirrored in a Redis set (SADD per batch, SMEMBERS on startup)."""
+    def __init__(self, host, port, key):
+        import redis # Optional dependency, only needed for this backend
+        self.key = key
+        self._r = redis.Redis(host=host, port=port, db=0, decode_responses=True)
+
+    def load(self):
+        return set(self._r.smembers(self.key))
+
+    def append(self, new_insults):
+        self._r.sadd(self.key, *new_insults)
+
+    def close(self):
+        self._r.close()
+
+
+def create_checkpoint_store():
+    if CHECKPOINT_BACKEND == "file":
+        return FileCheckpointStore(CHECKPOINT_FILE)
+    if CHECKPOINT_BACKEND == "redis":
+        return RedisCheckpointStore(CHECKPOINT_REDIS_HOST, CHECKPOINT_REDIS_PORT, CHECKPOINT_REDIS_KEY)
+    return None
+
+def restore_insults_from_checkpoint():
+    """Rebuilds _insults_set from the checkpoint store at startup."""
+    if not _checkpoint_store:
+        print("[Processor] Checkpointing disabled, starting with an empty insult set.")
+        return
+    start = time.perf_counter()
+    restored = _checkpoint_store.load()
+    with _insults_lock:
+        for insult in restored:
+            if insult not in _insults_set:
+                _insults_set.add(insult)
+                _insults_list.append(insult)
+    print(f"[Processor] Restored {len(restored)} insults from {CHECKPOINT_BACKEND} checkpoint in {time.perf_counter() - start:.3f}s.")
+
+def checkpoint_and_ack(ch):
+    """Persists the insults added since the last checkpoint, then acks every message up to the last one in one go."""
+    global _pending_new_insults, _pending_message_count, _last_pending_delivery_tag
+    if _last_pending_delivery_tag is None:
+        return
+    with checkpoint_time.time():
+        if _pending_new_insults and _checkpoint_store:
+            _checkpoint_store.append(_pending_new_insults)
+        ch.basic_ack(delivery_tag=_last_pending_delivery_tag, multiple=True)
+    checkpoints_written.inc()
+    print(f"[Processor] Checkpointed {len(_pending_new_insults)} new insults, acked {_pending_message_count} messages.")
+    _pending_new_insults = []
+    _pending_message_count = 0
+    _last_pending_delivery_tag = None
+
+def persist_pending_after_channel_loss():
+    """The broker will redeliver our unacked messages, and they will then look like duplicates,
+    so the insults they added must reach the checkpoint now or they would never be persisted."""
+    global _pending_new_insults, _pending_message_count, _last_pending_delivery_tag
+    if _pending_new_insults and _checkpoint_store:
+        try:
+            _checkpoint_store.append(_pending_new_insults)
+        except Exception as e:
+            print(f"[Processor] Could not persist pending insults after channel loss: {e}")
+    _pending_new_insults = []
+    _pending_message_count = 0
+    _last_pending_delivery_tag = None
+
+def periodic_checkpoint(connection, channel):
+    """Timer callback so a partial batch is not left unacked when traffic stops."""
+    if not channel.is_open:
+        return
+    checkpoint_and_ack(channel)
+    connection.call_later(CHECKPOINT_INTERVAL, lambda: periodic_checkpoint(connection, channel))
+
 def add_insult_callback(ch, method, properties, body):
     """Called when a new insult is received on ADD_INSULT_QUEUE_NAME."""
+    global _pending_message_count, _last_pending_delivery_tag
     insult_text = body.decode()
+    insult_messages_received.inc()
     with _insults_lock:
         if insult_text not in _insults_set:
             _insults_set.add(insult_text)
+            _insults_list.append(insult_text)
+            _pending_new_insults.append(insult_text)
+            insults_added.inc()
             print(f"[Processor] Added insult: '{insult_text}'. Total: {len(_insults_set)}")
         else:
             print(f"[Processor] Insult '{insult_text}' already exists.")
-    ch.basic_ack(delivery_tag=method.delivery_tag)
+    _pending_message_count += 1
+    _last_pending_delivery_tag = method.delivery_tag
+    if _pending_message_count >= CHECKPOINT_BATCH_SIZE:
+        checkpoint_and_ack(ch)
 
 def start_consuming_new_insults():
     """Connects and starts consuming messages to add insults."""
     global _consumer_channel
+    connection = None
     try:
         connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
         _consumer_channel = connection.channel()
         _consumer_channel.queue_declare(queue=ADD_INSULT_QUEUE_NAME, durable=True)
-        _consumer_channel.basic_qos(prefetch_count=1)
+        if SHARDED:
+            _consumer_channel.exchange_declare(exchange=SHARD_EXCHANGE_NAME, exchange_type='direct', durable=True)
+            _consumer_channel.queue_bind(exchange=SHARD_EXCHANGE_NAME, queue=ADD_INSULT_QUEUE_NAME, routing_key=str(SHARD_INDEX))
+        # Prefetch must cover a whole batch, or the batch would never fill up
+        prefetch_count = max(PREFETCH_COUNT, CHECKPOINT_BATCH_SIZE)
+        _consumer_channel.basic_qos(prefetch_count=prefetch_count)
         _consumer_channel.basic_consume(queue=ADD_INSULT_QUEUE_NAME, on_message_callback=add_insult_callback)
+        connection.call_later(CHECKPOINT_INTERVAL, lambda: periodic_checkpoint(connection, _consumer_channel))
         
-        print(f"[Processor] Waiting for insults on queue '{ADD_INSULT_QUEUE_NAME}'.")
+        print(f"[Processor] Waiting for insults on queue '{ADD_INSULT_QUEUE_NAME}' (prefetch={prefetch_count}, batch={CHECKPOINT_BATCH_SIZE}).")
         _consumer_channel.start_consuming() # Blocking call
+        # Flush the last partial batch before the channel goes away
+        if _consumer_channel.is_open:
+            checkpoint_and_ack(_consumer_channel)
     except pika.exceptions.AMQPConnectionError as e:
         print(f"[Processor Consumer] AMQP Connection Error: {e}. Retrying in 5s...")
+        persist_pending_after_channel_loss()
         time.sleep(5)
         start_consuming_new_insults() # Simple retry
     except Exception as e:
         print(f"[Processor Consumer] Unexpected error: {e}")
+        persist_pending_after_channel_loss()
     finally:
         if _consumer_channel and _consumer_channel.is_open:
             _consumer_channel.close()
@@ -54,11 +243,78 @@ def start_consuming_new_insults():
         print("[Processor Consumer] Connection closed.")
 
 
+def sample_own_insults():
+    """Returns (size, sample) of this instance's insult set."""
+    with _insults_lock:
+        size = len(_insults_list)
+        sample = random.sample(_insults_list, min(SHARD_REPORT_SAMPLE_SIZE, size))
+    return size, sample
+
+def publish_shard_report(channel, latest_reports):
+    size, sample = sample_own_insults()
+    report = {"shard": SHARD_INDEX, "size": size, "sample": sample}
+    channel.basic_publish(exchange=SHARD_REPORTS_EXCHANGE_NAME, routing_key='', body=json.dumps(report))
+    latest_reports[SHARD_INDEX] = (time.time(), report) # Our own copy may not be routed back yet
+
+def collect_shard_reports(channel, reports_queue, latest_reports):
+    """Drains the reports queue, keeping only the newest report of each shard."""
+    while True:
+        method_frame, _, body = channel.basic_get(queue=reports_queue, auto_ack=True)
+        if not method_frame:
+            break
+        try:
+            report = json.loads(body)
+            latest_reports[report["shard"]] = (time.time(), report)
+        except (json.JSONDecodeError, KeyError):
+            print(f"[Broadcaster] Ignoring malformed shard report: {body[:50]}")
+
+def live_shard_reports(latest_reports):
+    now = time.time()
+    return [report for received_at, report in latest_reports.values() if now - received_at <= SHARD_REPORT_MAX_AGE]
+
+def broadcast_leader(latest_reports, listening_for):
+    """Lowest shard index with a live report (ours always is, once published), or None while a
+    lower shard may be alive but not heard from yet."""
+    leader = min((report["shard"] for report in live_shard_reports(latest_reports)), default=SHARD_INDEX)
+    if leader == SHARD_INDEX and SHARD_INDEX and listening_for < 2 * SHARD_REPORT_INTERVAL:
+        return None
+    return leader
+
+def pick_insults_across_shards(latest_reports, count):
+    """Picks `count` insults: each from a shard chosen with probability proportional to its size."""
+    live_reports = [report for report in live_shard_reports(latest_reports) if report["sample"]]
+    if not live_reports:
+        return []
+    chosen = random.choices(live_reports, weights=[report["size"] for report in live_reports], k=count)
+    return [random.choice(report["sample"]) for report in chosen]
+
+def pick_own_insults(count):
+    with _insults_lock:
+        if not _insults_list:
+            return []
+        return random.choices(_insults_list, k=count)
+
 def periodic_broadcaster():
-    """Periodically fetches a random insult and publishes it to a fanout exchange."""
+    """Periodically fetches random insults and publishes them to a fanout exchange."""
     global _broadcaster_active
     connection = None
     channel = None
+    reports_queue = None
+    latest_reports = {} # shard index -> (received_at, report)
+    next_shard_report = 0.0
+    listening_since = 0.0
+    is_leader = False
+    scheduler = BroadcastScheduler.from_env() # Rate/batch from BROADCAST_* env vars, 5s default
+    print(f"[Broadcaster] Broadcasting {scheduler.describe()}.")
+
+    def exchange_shard_reports():
+        """Called from the wait loop (every 0.1s at most): reports run on their own timer."""
+        nonlocal next_shard_report
+        if time.monotonic() >= next_shard_report:
+            next_shard_report = time.monotonic() + SHARD_REPORT_INTERVAL
+            publish_shard_report(channel, latest_reports)
+            collect_shard_reports(channel, reports_queue, latest_reports)
+        return _broadcaster_active
 
     while _broadcaster_active:
         try:
@@ -67,36 +323,55 @@ def periodic_broadcaster():
                 channel = connection.channel()
                 channel.exchange_declare(exchange=BROADCAST_EXCHANGE_NAME, exchange_type='fanout')
                 print(f"[Broadcaster] Connected and exchange '{BROADCAST_EXCHANGE_NAME}' declared.")
+                if SHARDED:
+                    channel.exchange_declare(exchange=SHARD_REPORTS_EXCHANGE_NAME, exchange_type='fanout')
+                    reports_queue = channel.queue_declare(queue='', exclusive=True).method.queue
+                    channel.queue_bind(exchange=SHARD_REPORTS_EXCHANGE_NAME, queue=reports_queue)
+                    next_shard_report = 0.0 # Report right away on the new channel
+                    listening_since = time.monotonic()
 
-            insult_to_send = None
-            with _insults_lock:
-                if _insults_set:
-                    insult_to_send = random.choice(list(_insults_set))
-            
-            if insult_to_send and channel and channel.is_open:
+            # Drift-free pacing; checks _broadcaster_active (and, sharded, the report timer) at least every 0.1s
+            slots = scheduler.wait_for_slots(exchange_shard_reports if SHARDED else lambda: _broadcaster_active)
+            if not slots:
+                break
+
+            if SHARDED:
+                # Reports were published/collected by the wait loop, so before the first pick too
+                leader = broadcast_leader(latest_reports, time.monotonic() - listening_since)
+                if (leader == SHARD_INDEX) != is_leader:
+                    is_leader = leader == SHARD_INDEX
+                    print(f"[Broadcaster] Shard {SHARD_INDEX} {'is now' if is_leader else 'is no longer'} "
+                          f"the broadcast leader for {SHARD_COUNT} shards (leader: {'undecided' if leader is None else f'shard {leader}'}).")
+
+            for _ in range(slots):
+                if SHARDED:
+                    batch = pick_insults_across_shards(latest_reports, scheduler.batch_size) if is_leader else []
+                else:
+                    batch = pick_own_insults(scheduler.batch_size)
+                if not batch or not (channel and channel.is_open):
+                    break # No insults to send or channel not ready
                 channel.basic_publish(
                     exchange=BROADCAST_EXCHANGE_NAME,
                     routing_key='', # Ignored for fanout
-                    body=insult_to_send,
+                    body=encode_broadcast(batch),
                     properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
                 )
-                print(f"[Broadcaster] Sent: '{insult_to_send}'")
-            # else:
-                # print("[Broadcaster] No insults to send or channel not ready.")
-            
-            # Sleep for 5 seconds, but check _broadcaster_active more often
-            for _ in range(50): # 50 * 0.1s = 5s
-                if not _broadcaster_active:
-                    break
-                time.sleep(0.1)
+                broadcasts_published.inc()
+                if scheduler.verbose:
+                    print(f"[Broadcaster] Sent: '{batch[0] if len(batch) == 1 else batch}'")
+            summary = scheduler.periodic_summary()
+            if summary:
+                print(f"[Broadcaster] {summary}")
 
         except pika.exceptions.AMQPConnectionError as e:
+            broadcast_errors.inc()
             print(f"[Broadcaster] AMQP Connection Error: {e}. Retrying in 5s...")
             if channel and channel.is_open: channel.close()
             if connection and connection.is_open: connection.close()
             connection, channel = None, None # Reset for re-connection
             time.sleep(5)
         except Exception as e:
+            broadcast_errors.inc()
             print(f"[Broadcaster] Unexpected error: {e}. Retrying in 5s...")
             if channel and channel.is_open: channel.close()
             if connection and connection.is_open: connection.close()
@@ -125,6 +400,12 @@ if __name__ == "__main__":
     signal.signal(signal.SIGTERM, signal_shutdown)
 
     print("[Processor] Starting Insult Processor...")
+    if SHARDED:
+        print(f"[Processor] Sharded mode: owning shard {SHARD_INDEX} of {SHARD_COUNT} (queue '{ADD_INSULT_QUEUE_NAME}').")
+    _checkpoint_store = create_checkpoint_store()
+    restore_insults_from_checkpoint()
+    metrics.set_labels(component="insult_processor_rabbit", shard=SHARD_INDEX)
+    metrics.start_http_server_from_env(prefix="[Processor]")
 
     # Start the broadcaster in a separate thread
     broadcaster_thread = threading.Thread(target=periodic_broadcaster, daemon=True)
@@ -139,4 +420,6 @@ if __name__ == "__main__":
         print("[Processor] Main consumer loop exited, waiting for broadcaster thread...")
         broadcaster_thread.join(timeout=5) # Wait for up to 5s
 
+    if _checkpoint_store:
+        _checkpoint_store.close()
     print("[Processor] Shutdown complete.")
@@ -2,6 +2,12 @@
 import pika
 import sys
 import signal
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.broadcast_payload import decode_broadcast
 
 RABBITMQ_HOST = 'localhost'
 BROADCAST_EXCHANGE_NAME = 'insult_broadcast_exchange' # Must match processor's exchange
@@ -33,8 +39,9 @@ def signal_shutdown(signum, frame):
     print("[Subscriber] Exiting.")
 
 def on_message_callback(ch, method, properties, body):
-    insult_message = body.decode()
-    print(f"\n[SUBSCRIBER] >>> Received Insult: {insult_message}")
+    insults, _ = decode_broadcast(body) # One insult or a batch
+    for insult in insults:
+        print(f"\n[SUBSCRIBER] >>> Received Insult: {insult}")
 
 def main():
     global connection, channel, consumer_tag # Allow signal handler to access
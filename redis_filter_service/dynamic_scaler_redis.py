@@ -0,0 +1,267 @@
+# dynamic_scaler_redis.py
+# Dynamic scaler for the Redis filter workers, the counterpart of dynamic_scaler_rabbit.py:
+# every POLL_INTERVAL it reads the backlog (LLEN filter_work_queue) and the workers' heartbeats,
+# asks the scaling policy (common/scaling_policies.py) for N_desired, and starts or stops one
+# filter_worker_redis.py process per decision. Decisions go to dynamic_scaler_redis_log.csv in
+# the same columns as the RabbitMQ log, so scaling_policy_replay.py --log can replay it.
+#
+# Heartbeats (filter_worker_heartbeat:<host>:<pid>, refreshed every second by each worker) give:
+#   - tasks completed, for the arrival-rate estimate (also from workers this scaler did not start)
+#   - busy seconds, from which the per-worker capacity C is measured instead of guessed
+#   - tasks in flight (the batch a worker holds), to stop the least-loaded worker on scale-down
+#   - liveness: a managed worker whose heartbeat expired is stopped and dropped
+import subprocess
+import datetime
+import signal
+import socket
+import redis
+import time
+import json
+import sys
+import os
+
+# --- Configuration ---
+PYTHON_EXECUTABLE = os.environ.get("PYTHON_EXECUTABLE", sys.executable)
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+from common.scaling_policies import ArrivalRateEstimator, make_policy
+FILTER_WORKER_SCRIPT = os.path.join(PROJECT_ROOT, "redis_filter_service", "filter_worker_redis.py")
+
+REDIS_HOST = os.environ.get("REDIS_HOST", 'localhost')
+REDIS_PORT = 6379
+TASK_QUEUE_NAME = 'filter_work_queue'
+HEARTBEAT_KEY_PREFIX = 'filter_worker_heartbeat:' # Written by filter_worker_redis.py
+HOSTNAME = socket.gethostname() # Our workers' heartbeats are <HOSTNAME>:<pid>
+WORKER_BATCH = max(1, int(os.environ.get("FILTER_WORKER_BATCH", "1"))) # Inherited by the workers we start
+
+# Scaler Parameters
+MIN_WORKERS = int(os.environ.get("SCALER_MIN_WORKERS", "1"))
+MAX_WORKERS = int(os.environ.get("SCALER_MAX_WORKERS", "3"))
+POLL_INTERVAL = 5 # Seconds between decisions
+SCALE_COOLDOWN_PERIOD = 15 # Seconds after an action before the next one
+
+# Capacity C (tasks/second per worker): a starting guess, replaced by the heartbeats' measured
+# processed / busy_seconds once the workers have done CAPACITY_MIN_TASKS tasks between them.
+C_WORKER_CAPACITY = 1000
+CAPACITY_MIN_TASKS = 200
+Tr_TARGET_RESPONSE_TIME = 2.0 # Seconds: Target for tasks in backlog
+LAMBDA_ESTIMATED_ARRIVAL_RATE = 150 # tasks/second, for the "formula" policy
+# "formula" (default), "reactive" or "holt", as in dynamic_scaler_rabbit.py
+SCALING_POLICY = os.environ.get("SCALER_POLICY", "formula")
+SEASON_SECONDS = float(os.environ.get("SCALER_SEASON_SECONDS", "0"))
+WORKER_LEAD_TIME = 1.0 # Seconds from a scale-up decision to a new worker popping tasks
+WORKER_READY_TIMEOUT = 15 # Seconds to wait for a new worker to report it is connected
+# SIGTERM makes a worker finish the batch it popped (BLPOP plus up to FILTER_WORKER_BATCH - 1
+# more), delete its heartbeat and exit. It gets this long plus the batch's filtering time at
+# capacity C; only a worker stuck past that is killed, losing its batch.
+WORKER_DRAIN_TIMEOUT = 15
+HEARTBEAT_GRACE = 2 * POLL_INTERVAL # Seconds after start before a missing heartbeat counts
+
+active_worker_processes_info = [] # Dicts: {"process", "pid", "heartbeat_id", "id_str", "started_at"}, oldest first
+last_scaling_action_time = 0
+worker_id_counter = 0
+completed_by_worker = {} # "<host>:<pid>" -> last "processed" heartbeat value (kept after the worker exits)
+busy_by_worker = {} # "<host>:<pid>" -> last "busy_seconds" heartbeat value
+
+# --- Log File ---
+SCALER_LOG_FILE = "dynamic_scaler_redis_log.csv"
+
+def log_to_file(message):
+    with open(SCALER_LOG_FILE, "a") as f:
+        f.write(message + "\n")
+
+def log(message, kind="INFO"):
+    print(f"Scaler: {message}"); log_to_file(f"{kind},{message}")
+
+def read_heartbeats(r):
+    """"<host>:<pid>" -> heartbeat dict of every worker with a live heartbeat key."""
+    keys = list(r.scan_iter(match=f"{HEARTBEAT_KEY_PREFIX}*", count=100))
+    heartbeats = {}
+    for key, value in zip(keys, r.mget(keys) if keys else []):
+        if value is None:
+            continue # Expired between SCAN and MGET
+        try:
+            heartbeat = json.loads(value)
+            heartbeats[f"{heartbeat['host']}:{int(heartbeat['worker_id'])}"] = heartbeat
+        except (ValueError, KeyError, TypeError):
+            continue
+    return heartbeats
+
+def record_heartbeats(heartbeats):
+    """Completed tasks in total, including workers that have since exited."""
+    for heartbeat_id, heartbeat in heartbeats.items():
+        completed_by_worker[heartbeat_id] = heartbeat.get("processed", 0)
+        busy_by_worker[heartbeat_id] = heartbeat.get("busy_seconds", 0.0)
+    return sum(completed_by_worker.values())
+
+def measured_capacity():
+    """Tasks/second one worker completes while busy, or None until enough tasks were seen."""
+    processed, busy = sum(completed_by_worker.values()), sum(busy_by_worker.values())
+    if processed < CAPACITY_MIN_TASKS or busy <= 0:
+        return None
+    return processed / busy
+
+def start_new_worker():
+    global worker_id_counter
+    if len(active_worker_processes_info) >= MAX_WORKERS:
+        return False
+    worker_id_counter += 1
+    worker_id_str = f"RedisWorker-{worker_id_counter}"
+    try:
+        worker_logfile = open(f"redis_worker_{worker_id_counter}_log.txt", "w")
+        launched_at = time.perf_counter()
+        with ReadinessPipe() as readiness:
+            proc = readiness.popen([PYTHON_EXECUTABLE, FILTER_WORKER_SCRIPT],
+                                   env=dict(os.environ, REDIS_HOST=REDIS_HOST),
+                                   stdout=worker_logfile, stderr=subprocess.STDOUT)
+            ready = readiness.wait(1, WORKER_READY_TIMEOUT, [proc]) == 1
+        worker_logfile.close() # The child has its own copy of the descriptor
+    except Exception as e:
+        log(f"Failed to start new worker {worker_id_str}: {e}", "ERROR")
+        return False
+
+    if not ready:
+        log(f"New worker {worker_id_str} (PID: {proc.pid}) not ready after {time.perf_counter() - launched_at:.1f}s "
+            f"(exited: {proc.poll() is not None})", "ERROR")
+        stop_worker({"process": proc, "pid": proc.pid, "id_str": worker_id_str})
+        return False
+    active_worker_processes_info.append({"process": proc, "pid": proc.pid, "heartbeat_id": f"{HOSTNAME}:{proc.pid}",
+                                         "id_str": worker_id_str, "started_at": time.time()})
+    log(f"New worker {worker_id_str} (PID: {proc.pid}) connected after {time.perf_counter() - launched_at:.3f}s. "
+        f"Total: {len(active_worker_processes_info)}")
+    return True
+
+def drain_timeout(in_flight):
+    """WORKER_DRAIN_TIMEOUT plus the time to filter `in_flight` tasks at the (measured) capacity."""
+    return WORKER_DRAIN_TIMEOUT + in_flight / (measured_capacity() or C_WORKER_CAPACITY)
+
+def stop_worker(worker_info, in_flight=WORKER_BATCH):
+    """SIGTERM (finish the current batch, then exit); SIGKILL after drain_timeout(in_flight)."""
+    proc = worker_info["process"]
+    drain_started = time.perf_counter()
+    if proc.poll() is None:
+        proc.terminate()
+        timeout = drain_timeout(in_flight)
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            log(f"Worker {worker_info['id_str']} (PID: {worker_info['pid']}) did not drain within "
+                f"{timeout:.1f}s, killing.")
+            proc.kill()
+            proc.wait(timeout=2)
+    return time.perf_counter() - drain_started
+
+def stop_one_worker(heartbeats):
+    if len(active_worker_processes_info) <= MIN_WORKERS:
+        return False
+    # With FILTER_WORKER_BATCH a worker can hold a whole batch: stop the one with the fewest tasks
+    # in flight at its last heartbeat (a full batch if unknown), the newest among equals
+    def in_flight(worker_info):
+        return heartbeats.get(worker_info["heartbeat_id"], {}).get("in_flight", WORKER_BATCH)
+    index = min(reversed(range(len(active_worker_processes_info))),
+                key=lambda i: in_flight(active_worker_processes_info[i]))
+    worker_info = active_worker_processes_info.pop(index)
+    log(f"Draining and stopping worker {worker_info['id_str']} (PID: {worker_info['pid']}, "
+        f"{in_flight(worker_info)} tasks in flight)")
+    seconds = stop_worker(worker_info, in_flight(worker_info))
+    log(f"Worker {worker_info['id_str']} stopped after {seconds:.2f}s. Total: {len(active_worker_processes_info)}")
+    return True
+
+def cleanup_workers(heartbeats):
+    """Drops exited workers and stops those whose heartbeat expired (hung, or cut off from Redis)."""
+    global active_worker_processes_info
+    live = []
+    for worker_info in active_worker_processes_info:
+        proc = worker_info["process"]
+        if proc.poll() is not None:
+            log(f"Worker {worker_info['id_str']} (PID: {worker_info['pid']}) exited (code {proc.returncode}). Removing.")
+        elif worker_info["heartbeat_id"] not in heartbeats and time.time() - worker_info["started_at"] > HEARTBEAT_GRACE:
+            log(f"Worker {worker_info['id_str']} (PID: {worker_info['pid']}) has no heartbeat. Stopping it.", "ERROR")
+            stop_worker(worker_info)
+        else:
+            live.append(worker_info)
+    active_worker_processes_info = live
+
+# --- Main Scaler Loop ---
+def scaler_loop(r):
+    global last_scaling_action_time
+
+    policy = make_policy(SCALING_POLICY, C_WORKER_CAPACITY, min_workers=MIN_WORKERS, max_workers=MAX_WORKERS,
+                         target_response_time=Tr_TARGET_RESPONSE_TIME,
+                         arrival_rate_estimate=LAMBDA_ESTIMATED_ARRIVAL_RATE, interval=POLL_INTERVAL,
+                         lead_time=WORKER_LEAD_TIME, season_length=round(SEASON_SECONDS / POLL_INTERVAL))
+    rate_estimator = ArrivalRateEstimator()
+    print(f"Scaler: Using the '{policy.name}' scaling policy.")
+
+    header = "Timestamp,Backlog_B,Active_Workers,N_Desired_Formula,Action_Taken,Arrival_Rate,Capacity_C,Heartbeats"
+    print(header); log_to_file(header)
+
+    print("Scaler: Starting initial minimum workers...")
+    for _ in range(MIN_WORKERS):
+        start_new_worker()
+
+    try:
+        while True:
+            time.sleep(POLL_INTERVAL)
+            ts = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            try:
+                current_backlog_B = r.llen(TASK_QUEUE_NAME)
+                heartbeats = read_heartbeats(r)
+            except redis.exceptions.RedisError as e:
+                log_to_file(f"{ts},ERROR_Q_LEN,-1,-1,ErrorGettingQueueLength: {e}")
+                continue
+            cleanup_workers(heartbeats)
+
+            completed_total = record_heartbeats(heartbeats)
+            capacity = measured_capacity()
+            if capacity is not None:
+                policy.capacity = capacity
+            num_current_live_workers = len(active_worker_processes_info)
+            arrival_rate = rate_estimator.update(time.time(), current_backlog_B, completed_total)
+            N_desired = policy.desired_workers(current_backlog_B, arrival_rate)
+
+            action_taken_str = "Maintain"
+            if time.time() - last_scaling_action_time >= SCALE_COOLDOWN_PERIOD:
+                if N_desired > num_current_live_workers:
+                    action_taken_str = f"Attempt_ScaleUP_to_{N_desired}"
+                    if start_new_worker(): # One per decision, as in the RabbitMQ scaler
+                        last_scaling_action_time = time.time()
+                elif N_desired < num_current_live_workers:
+                    action_taken_str = f"Attempt_ScaleDOWN_to_{N_desired}"
+                    if stop_one_worker(heartbeats):
+                        last_scaling_action_time = time.time()
+            else:
+                action_taken_str = f"InCooldown ({SCALE_COOLDOWN_PERIOD - (time.time() - last_scaling_action_time):.0f}s left)"
+
+            num_current_live_workers = len(active_worker_processes_info)
+            rate_str = f"{arrival_rate:.1f}" if arrival_rate is not None else ""
+            # Heartbeats may exceed Active_Workers: workers started elsewhere count for the arrival rate only
+            log_line = (f"{ts},{current_backlog_B},{num_current_live_workers},{N_desired},{action_taken_str},"
+                        f"{rate_str},{policy.capacity:.0f},{len(heartbeats)}")
+            print(log_line); log_to_file(log_line)
+
+    except KeyboardInterrupt:
+        print("\nScaler: KeyboardInterrupt. Shutting down...")
+        log_to_file("INFO,KeyboardInterrupt. Shutting down...")
+    finally:
+        log("Final cleanup. Draining all workers...")
+        while active_worker_processes_info:
+            worker_info = active_worker_processes_info.pop()
+            log(f"Worker {worker_info['id_str']} stopped after {stop_worker(worker_info):.2f}s.")
+        print("Dynamic Scaler (Redis) stopped."); log_to_file("INFO,Dynamic Scaler (Redis) stopped.")
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, signal.default_int_handler) # SIGTERM cleans up like Ctrl+C
+    with open(SCALER_LOG_FILE, "w") as f: # Create/overwrite log file
+        f.write(f"Scaler Log Initialized at {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Config: MIN_W={MIN_WORKERS}, MAX_W={MAX_WORKERS}, POLL_I={POLL_INTERVAL}s, COOLDOWN={SCALE_COOLDOWN_PERIOD}s, POLICY={SCALING_POLICY}\n")
+        f.write(f"Formula: C_cap={C_WORKER_CAPACITY}rps until measured, Tr_target={Tr_TARGET_RESPONSE_TIME}s, Lambda_est={LAMBDA_ESTIMATED_ARRIVAL_RATE}rps\n")
+
+    try:
+        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+        r.ping()
+    except redis.exceptions.ConnectionError as e:
+        sys.exit(f"Scaler: Could not connect to Redis at {REDIS_HOST}:{REDIS_PORT}: {e}")
+    scaler_loop(r)
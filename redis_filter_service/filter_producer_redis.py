@@ -2,6 +2,12 @@
 import redis
 import time
 import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.task_envelope import encode_task
 
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
@@ -31,7 +37,7 @@ def main():
 
     for text_content in texts_to_send:
         try:
-            r.rpush(TASK_QUEUE_NAME, text_content) # RPUSH the text string
+            r.rpush(TASK_QUEUE_NAME, encode_task(text_content)) # RPUSH the task (id + enqueue time + text)
             print(f"  [x] Sent task: '{text_content[:50]}...'")
             time.sleep(0.5) 
         except Exception as e:
@@ -2,6 +2,13 @@
 import redis
 import json
 import time
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.task_envelope import TaskTimingSummary, format_timings
 
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
@@ -26,18 +33,25 @@ def main():
             return
 
         print(f"Found {len(raw_results)} results:")
+        timings = TaskTimingSummary()
         for i, raw_item in enumerate(raw_results):
             try:
                 item = json.loads(raw_item) # Decode JSON string back to dictionary
+                timings.add(item)
                 print(f"\nResult {i+1}:")
+                print(f"  Task ID  : {item.get('task_id') or 'N/A'}")
                 print(f"  Original : '{item.get('original', 'N/A')}'")
                 print(f"  Filtered : '{item.get('filtered', 'N/A')}'")
                 print(f"  Worker ID: {item.get('worker_id', 'N/A')}")
                 print(f"  Timestamp: {time.ctime(item.get('timestamp', 0))}")
+                print(f"  Timings  : {format_timings(item)}")
             except json.JSONDecodeError:
                 print(f"  Could not decode result item: {raw_item}")
             except Exception as e:
                 print(f"  Error processing result item '{raw_item}': {e}")
+
+        print()
+        timings.print_summary()
                 
     except Exception as e:
         print(f"An error occurred while retrieving results: {e}")
@@ -1,19 +1,64 @@
 # filter_worker_redis.py
 import redis
+import functools
 import time
-import re
 import signal
 import os 
 import json 
 import random
+import socket
+import sys
 
-REDIS_HOST = 'localhost'
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.profiling import WorkerProfiler
+from common.readiness import signal_ready
+from common.censor_matcher import CensorMatcher
+from common.insult_dictionary import DictionarySubscriber, LiveDictionary
+from common.result_cache import SharedResultCache
+from common.task_envelope import decode_task, result_record
+from common.text_normalizer import TextNormalizer
+
+REDIS_HOST = os.environ.get("REDIS_HOST", 'localhost') # Set on other nodes to reach the shared Redis
 REDIS_PORT = 6379
 TASK_QUEUE_NAME = 'filter_work_queue'     # Queue to get tasks from
 RESULTS_LIST_NAME = 'filtered_texts_results' # List to store results
 
 KNOWN_INSULTS = {"stupid", "idiot", "dummy", "moron", "lame", "darn", "heck"} # Lowercased
 
+# --- Heartbeat (read by dynamic_scaler_redis.py) ---
+# Every HEARTBEAT_INTERVAL the worker refreshes filter_worker_heartbeat:<host>:<pid> (expires
+# after HEARTBEAT_TTL) with its task count, busy seconds and the size of the batch it just popped
+# ("in_flight"); removed on exit. The host keeps pids of different nodes apart.
+HEARTBEAT_KEY_PREFIX = 'filter_worker_heartbeat:'
+HOSTNAME = socket.gethostname()
+HEARTBEAT_INTERVAL = 1.0 # Seconds
+HEARTBEAT_TTL = 5 # Seconds without a refresh before a worker counts as gone
+
+# --- Batching and the shared result cache (common/result_cache.py) ---
+# FILTER_WORKER_BATCH=N: after each BLPOP, also take up to N-1 more queued tasks (LPOP with a
+# count, Redis >= 6.2), look them all up in the cache with one MGET and store their results with
+# one RPUSH. FILTER_SHARED_CACHE=1 turns the shared cache on.
+BATCH_SIZE = max(1, int(os.environ.get("FILTER_WORKER_BATCH", "1")))
+shared_cache = SharedResultCache.from_env()
+
+# --- Live dictionary (common/insult_dictionary.py) ---
+# KNOWN_INSULTS until a published dictionary arrives; with FILTER_DICTIONARY_UPDATES=1 a background
+# thread swaps in each new version. A batch is filtered (and cached) under the version it started with.
+# FILTER_NORMALIZE=1: also match obfuscated spellings ("1D10T", "i.d.i.o.t"; common/text_normalizer.py)
+normalizer = TextNormalizer.from_env()
+dictionary = LiveDictionary(KNOWN_INSULTS, build_matcher=functools.partial(CensorMatcher, normalizer=normalizer),
+                            prefix=f"Worker {os.getpid()}:")
+
+# --- Metrics (served on METRICS_PORT if set) ---
+tasks_received = metrics.counter("filter_tasks_received_total", "Tasks popped from the queue.")
+tasks_processed = metrics.counter("filter_tasks_processed_total", "Tasks filtered and stored.")
+task_errors = metrics.counter("filter_task_errors_total", "Errors in the worker loop.")
+service_time = metrics.histogram("filter_service_seconds", "Time to filter and store one task; the sum is the busy time.")
+queue_wait = metrics.histogram("filter_queue_wait_seconds", "Enqueue-to-dequeue time of enveloped tasks.")
+
 # --- Shutdown ---
 shutdown_flag = False
 def signal_handler(signum, frame):
@@ -24,55 +69,104 @@ def signal_handler(signum, frame):
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
-def filter_text_logic(original_text, known_insults_set):
-    """The actual filtering logic."""
-    words = re.split(r'(\W+)', original_text) # Splits the sentences into individual words for procecssing
-    censored_words = []
-    for word in words:
-        if word.lower() in known_insults_set:
-            censored_words.append("CENSORED")
-        else:
-            censored_words.append(word)
-    return "".join(censored_words)
+def filter_text_logic(original_text, matcher):
+    """The actual filtering logic: every dictionary word or phrase becomes CENSORED (whole words,
+    any case; see common/censor_matcher.py)."""
+    return matcher.censor(original_text)
+
+def send_heartbeat(r, worker_id, in_flight):
+    r.setex(f"{HEARTBEAT_KEY_PREFIX}{HOSTNAME}:{worker_id}", HEARTBEAT_TTL, json.dumps({
+        "worker_id": worker_id, "host": HOSTNAME, "processed": tasks_processed.value,
+        "busy_seconds": service_time.snapshot()["sum"], "in_flight": in_flight, "timestamp": time.time()}))
+
+def process_batch(r, queue_name, raw_tasks, worker_id, profiler):
+    """Filters popped tasks (shared cache first, if on) and stores their results in one RPUSH."""
+    tasks = []
+    for raw_task in raw_tasks:
+        with profiler.phase("decode"):
+            task = decode_task(raw_task) # Envelope or plain text; stamps dequeued_at
+        tasks_received.inc()
+        if task["enqueued_at"] is not None:
+            queue_wait.observe(max(0.0, task["dequeued_at"] - task["enqueued_at"]))
+        print(f"\nWorker {worker_id}: Received task {task['task_id']} from '{queue_name}': '{task['text'][:50]}...'")
+        tasks.append(task)
+
+    current = dictionary.current() # One dictionary for the whole batch, even if a swap lands meanwhile
+    if shared_cache is not None:
+        with profiler.phase("cache lookup"):
+            cached = shared_cache.get_many([task["text"] for task in tasks], current.fingerprint)
+    else:
+        cached = [(None, None)] * len(tasks)
+    results, computed = [], []
+    for task, (filtered_text, source) in zip(tasks, cached):
+        if filtered_text is None:
+            started = time.perf_counter()
+            with profiler.phase("filter"):
+                filtered_text = filter_text_logic(task["text"], current.matcher)
+            computed.append((task["text"], filtered_text, time.perf_counter() - started))
+        print(f"Worker {worker_id}: Filtered result{f' ({source} cache)' if source else ''}: '{filtered_text[:50]}...'")
+        # Structured result (with the task's id and timestamps) for the results list
+        extra = {"cached": source} if source else {}
+        with profiler.phase("encode"):
+            results.append(json.dumps(result_record(task, filtered_text, worker_id=worker_id, **extra)))
+    if shared_cache is not None:
+        with profiler.phase("cache store"):
+            shared_cache.put_many(computed, current.fingerprint)
+
+    with profiler.phase("rpush"):
+        r.rpush(RESULTS_LIST_NAME, *results)
+    print(f"Worker {worker_id}: Stored {len(results)} result(s) to '{RESULTS_LIST_NAME}'.")
+    for task in tasks:
+        service_time.observe(time.time() - task["dequeued_at"])
+        tasks_processed.inc()
+        profiler.task_done()
 
 def main():
     worker_id = os.getpid() # Get process ID for unique worker identification
     print(f"Filter Worker {worker_id}: Starting...")
+    metrics.set_labels(component="filter_worker_redis", worker=worker_id)
+    metrics.start_http_server_from_env(prefix=f"Worker {worker_id}:")
+    # FILTER_PROFILE=1 or SIGUSR1: per-phase timings + stack samples, dumped on exit
+    profiler = WorkerProfiler.from_env(f"filter_worker_redis_{worker_id}", prefix=f"Worker {worker_id}:")
     
     try:
         # Using decode_responses=True for receiving strings
         r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+        r.ping() # The client connects lazily; make "connected" true before reporting ready
         print(f"Worker {worker_id}: Connected to Redis. Waiting for tasks on '{TASK_QUEUE_NAME}'.")
+        signal_ready(f"{REDIS_HOST}:{REDIS_PORT}")
     except redis.exceptions.ConnectionError as e:
         print(f"Worker {worker_id}: Error connecting to Redis: {e}. Exiting.")
         return
+    subscriber = DictionarySubscriber.start_from_env(dictionary, prefix=f"Worker {worker_id}:")
 
+    last_heartbeat = 0.0
     while not shutdown_flag:
         try:
             # BLPOP from task queue (Blocking Left Pop)
             # Returns a tuple: (queue_name, task_data) or None if timeout occurs
             # timeout=0 means block indefinitely. Use a small timeout to check shutdown_flag.
-            task_tuple = r.blpop(TASK_QUEUE_NAME, timeout=1) 
+            with profiler.phase("blpop (wait)"):
+                task_tuple = r.blpop(TASK_QUEUE_NAME, timeout=1) 
 
+            raw_tasks = []
             if task_tuple:
-                queue_name, original_text = task_tuple
-                print(f"\nWorker {worker_id}: Received task from '{queue_name}': '{original_text[:50]}...'")
-                
-                filtered_text = filter_text_logic(original_text, KNOWN_INSULTS)
-                print(f"Worker {worker_id}: Filtered result: '{filtered_text[:50]}...'")
-
-                # Store structured result in the results list
-                result_data = {
-                    "original": original_text,
-                    "filtered": filtered_text,
-                    "worker_id": worker_id,
-                    "timestamp": time.time()
-                }
-                # Use rpush to add to the results list. Encode to JSON string.
-                r.rpush(RESULTS_LIST_NAME, json.dumps(result_data))
-                print(f"Worker {worker_id}: Stored result to '{RESULTS_LIST_NAME}'.")
+                queue_name, raw_task = task_tuple
+                raw_tasks = [raw_task]
+                if BATCH_SIZE > 1: # Whatever else is queued, up to a batch, without blocking
+                    with profiler.phase("lpop batch"):
+                        raw_tasks += r.lpop(TASK_QUEUE_NAME, BATCH_SIZE - 1) or []
+
+            if time.time() - last_heartbeat >= HEARTBEAT_INTERVAL: # After the pop: reports the batch we hold
+                send_heartbeat(r, worker_id, len(raw_tasks))
+                last_heartbeat = time.time()
+
+            if raw_tasks:
+                process_batch(r, queue_name, raw_tasks, worker_id, profiler)
+            # A task popped before a shutdown signal is still finished above: stopping is drain-safe
                 
         except redis.exceptions.ConnectionError as e:
+            task_errors.inc()
             print(f"Worker {worker_id}: Redis connection error: {e}. Retrying in 5s...")
             time.sleep(5)
             # Re-establish connection
@@ -83,9 +177,17 @@ def main():
                 print(f"Worker {worker_id}: Failed to reconnect. Will try again.")
         except Exception as e:
             if not shutdown_flag: # Avoid error message if we are shutting down
+                task_errors.inc()
                 print(f"Worker {worker_id}: An unexpected error occurred: {e}")
                 time.sleep(1) # Brief pause before continuing loop
 
+    try:
+        r.delete(f"{HEARTBEAT_KEY_PREFIX}{HOSTNAME}:{worker_id}") # Gone now, not after HEARTBEAT_TTL
+    except redis.exceptions.RedisError:
+        pass
+    if subscriber is not None:
+        subscriber.stop()
+    profiler.stop_and_dump()
     print(f"Filter Worker {worker_id}: Exiting.")
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+# dictionary_publisher_redis.py
+# Mirrors the insult store into the filter workers' live dictionary (common/insult_dictionary.py):
+# whenever the stored insults change, publishes the filter's base words plus every stored insult
+# as a new dictionary version. Workers started with FILTER_DICTIONARY_UPDATES=1 swap it in
+# without stopping.
+#
+# Sources are Redis sets: 'insults_set' (insult_adder_redis.py) and the RabbitMQ processor's
+# Redis checkpoints ('rabbit_insults_set', one per shard, with INSULT_CHECKPOINT_BACKEND=redis).
+# Insults are only ever added, so a change of any set's SCARD is what triggers a publish.
+#
+# Usage: python dictionary_publisher_redis.py [--source KEY_OR_PATTERN ...] [--once]
+#        python dictionary_publisher_redis.py --synthetic 100000   (one synthetic dictionary, for tests)
+import argparse
+import signal
+import json
+import time
+import sys
+import os
+
+import redis
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.insult_dictionary import DICTIONARY_KEY, publish_dictionary
+from common.result_cache import dictionary_version
+
+REDIS_HOST = os.environ.get("REDIS_HOST", 'localhost')
+REDIS_PORT = 6379
+DEFAULT_SOURCES = ['insults_set', 'rabbit_insults_set*']
+BASE_INSULTS = {"stupid", "idiot", "dummy", "moron", "lame", "darn", "heck"} # The workers' KNOWN_INSULTS
+POLL_INTERVAL = 1.0 # Seconds between checks of the sources
+
+shutdown_flag = False
+def signal_handler(signum, frame):
+    global shutdown_flag
+    print("\nPublisher: Shutdown signal received, stopping...")
+    shutdown_flag = True
+
+def resolve_sources(r, sources):
+    """The set keys behind the configured names; names with glob characters are patterns."""
+    keys = []
+    for source in sources:
+        if any(c in source for c in "*?["):
+            keys += sorted(r.scan_iter(match=source, count=1000))
+        else:
+            keys.append(source)
+    return keys
+
+def current_insults(r, keys):
+    insults = set(BASE_INSULTS)
+    if keys:
+        insults.update(insult.lower() for insult in r.sunion(keys))
+    return insults
+
+def synthetic_insults(count):
+    return {f"insult{i:07d}" for i in range(count)} | BASE_INSULTS
+
+def publish(r, insults):
+    started = time.perf_counter()
+    version = publish_dictionary(r, insults)
+    print(f"Publisher: Published dictionary v{version} ({len(insults)} insults) "
+          f"in {(time.perf_counter() - started) * 1000:.1f}ms.")
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publishes the insult store as the filter workers' dictionary.")
+    parser.add_argument("--source", action="append", default=None,
+                        help=f"Redis set key or glob pattern to mirror (repeatable; default: {' '.join(DEFAULT_SOURCES)})")
+    parser.add_argument("--once", action="store_true", help="Publish the current insults and exit")
+    parser.add_argument("--synthetic", type=int, default=0, help="Publish this many synthetic insults and exit")
+    args = parser.parse_args()
+    sources = args.source or DEFAULT_SOURCES
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+    try:
+        r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+        r.ping()
+    except redis.exceptions.ConnectionError as e:
+        sys.exit(f"Publisher: Error connecting to Redis at {REDIS_HOST}:{REDIS_PORT}: {e}")
+
+    if args.synthetic:
+        publish(r, synthetic_insults(args.synthetic))
+        sys.exit(0)
+
+    published = None # Fingerprint of the dictionary in the channel's snapshot
+    snapshot = r.get(DICTIONARY_KEY)
+    if snapshot is not None:
+        published = dictionary_version(json.loads(snapshot)["insults"])
+    print(f"Publisher: Mirroring {sources} into the filter dictionary every {POLL_INTERVAL}s.")
+    sizes = None
+    while not shutdown_flag:
+        try:
+            keys = resolve_sources(r, sources)
+            pipe = r.pipeline(transaction=False)
+            for key in keys:
+                pipe.scard(key)
+            new_sizes = dict(zip(keys, pipe.execute()))
+            if new_sizes != sizes:
+                insults = current_insults(r, keys)
+                fingerprint = dictionary_version(insults)
+                if fingerprint != published: # Restarts and no-op changes publish nothing
+                    publish(r, insults)
+                    published = fingerprint
+                sizes = new_sizes
+            if args.once:
+                break
+        except redis.exceptions.RedisError as e:
+            print(f"Publisher: Redis error: {e}. Retrying...")
+        time.sleep(POLL_INTERVAL)
+    print("Publisher: Exiting.")
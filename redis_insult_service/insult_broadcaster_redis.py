@@ -3,12 +3,53 @@ import redis
 import time
 import random
 import signal
+import os
+import socket
+import uuid
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.broadcast_payload import encode_broadcast
+from common.broadcast_scheduler import BroadcastScheduler
 
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
 INSULTS_SET_KEY = 'insults_set'
 BROADCAST_CHANNEL = 'insult_broadcast_channel'
 
+# --- Optional leader election (hot-standby broadcasters) ---
+# Several broadcasters can run at once; only the holder of LEADER_LOCK_KEY publishes.
+# The lock is taken with SET NX PX and renewed every LEADER_LEASE_MS / 3, so a dead
+# leader is replaced within roughly one lease.
+LEADER_ELECTION = os.environ.get("BROADCASTER_LEADER_ELECTION", "0") == "1"
+LEADER_LEASE_MS = int(os.environ.get("BROADCASTER_LEASE_MS", 3000))
+LEADER_LOCK_KEY = 'insult_broadcaster_leader'
+LAST_BROADCAST_KEY = 'insult_broadcaster_last_broadcast' # Lets a new leader keep the old leader's cadence
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Only touch the lock if we still own it (value check + action must be atomic)
+RENEW_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# --- Metrics (served on METRICS_PORT if set) ---
+broadcasts_published = metrics.counter("broadcasts_published_total", "Broadcast messages published.")
+broadcast_errors = metrics.counter("broadcast_errors_total", "Failed reads or publishes.")
+broadcast_receivers = metrics.gauge("broadcast_receivers", "Subscribers that received the last broadcast.")
+is_leader_gauge = metrics.gauge("broadcaster_is_leader", "1 while this instance holds the leader lease.")
+
 # --- Graceful shutdown handling ---
 shutdown_flag = False
 def signal_handler(signum, frame):
@@ -19,47 +60,144 @@ def signal_handler(signum, frame):
 signal.signal(signal.SIGINT, signal_handler)  # Handle Ctrl+C
 signal.signal(signal.SIGTERM, signal_handler) # Handle kill
 
+
+class LeaderLease:
+    """Lease-based leadership on a single Redis key."""
+    def __init__(self, r, key, instance_id, lease_ms):
+        self.r = r
+        self.key = key
+        self.instance_id = instance_id
+        self.lease_ms = lease_ms
+        self._renew = r.register_script(RENEW_LEASE_SCRIPT)
+        self._release = r.register_script(RELEASE_LEASE_SCRIPT)
+        self._valid_until = 0.0 # Local monotonic deadline of our lease
+
+    def refresh(self):
+        """Acquires or renews the lease. Returns True if we are the leader."""
+        attempt_started = time.monotonic()
+        was_leader = self.is_leader()
+        try:
+            if self._renew(keys=[self.key], args=[self.instance_id, self.lease_ms]) or \
+                    self.r.set(self.key, self.instance_id, nx=True, px=self.lease_ms):
+                self._valid_until = attempt_started + self.lease_ms / 1000.0
+                if not was_leader:
+                    print(f"Broadcaster {self.instance_id}: Became leader.")
+            else:
+                self._valid_until = 0.0
+                if was_leader:
+                    print(f"Broadcaster {self.instance_id}: Lost leadership.")
+        except redis.exceptions.RedisError as e:
+            # Keep the local deadline: if Redis is unreachable our lease simply runs out
+            print(f"Broadcaster {self.instance_id}: Error refreshing lease: {e}")
+        return self.is_leader()
+
+    def is_leader(self):
+        # Measured from before the SET/PEXPIRE was sent, so we always stop
+        # publishing before Redis can hand the key to somebody else.
+        return time.monotonic() < self._valid_until
+
+    def release(self):
+        if self._valid_until:
+            try:
+                self._release(keys=[self.key], args=[self.instance_id])
+            except redis.exceptions.RedisError:
+                pass # The lease will just expire
+        self._valid_until = 0.0
+
+
+def delay_after_takeover(r_reader, interval):
+    """When taking over, continue from the previous leader's last broadcast instead of publishing right away."""
+    try:
+        last_broadcast = r_reader.get(LAST_BROADCAST_KEY)
+    except redis.exceptions.RedisError:
+        last_broadcast = None
+    if not last_broadcast:
+        return 0.0
+    elapsed = time.time() - float(last_broadcast)
+    return max(0.0, interval - elapsed)
+
+def read_batches(r_reader, slots, batch_size):
+    """Returns up to `slots` batches of `batch_size` random insults with a single SRANDMEMBER."""
+    try:
+        # A negative count allows repeats, so small sets still fill whole batches.
+        # If the set is empty, it returns an empty list.
+        insults = r_reader.srandmember(INSULTS_SET_KEY, -slots * batch_size)
+    except redis.exceptions.RedisError as e:
+        broadcast_errors.inc()
+        print(f"Broadcaster: Error reading from Redis set '{INSULTS_SET_KEY}': {e}")
+        return []
+    return [insults[i:i + batch_size] for i in range(0, len(insults), batch_size)]
+
 def broadcast_insults():
-    print(f"Insult Broadcaster started. Publishing to channel '{BROADCAST_CHANNEL}'. Press Ctrl+C to stop.")
+    scheduler = BroadcastScheduler.from_env() # Rate/batch from BROADCAST_* env vars, 5s default
+    print(f"Insult Broadcaster started. Publishing to channel '{BROADCAST_CHANNEL}' at {scheduler.describe()}. Press Ctrl+C to stop.")
+    if LEADER_ELECTION:
+        print(f"Leader election enabled: instance {INSTANCE_ID}, lease {LEADER_LEASE_MS}ms.")
+    else:
+        is_leader_gauge.set(1)
+    metrics.set_labels(component="insult_broadcaster_redis", instance=INSTANCE_ID)
+    metrics.start_http_server_from_env(prefix="Broadcaster:")
     r_publisher = None # Initialize to None
+    lease = None
     try:
         # Connection for reading insults
         r_reader = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
         # Connection for publishing messages
         r_publisher = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
 
+        if LEADER_ELECTION:
+            lease = LeaderLease(r_reader, LEADER_LOCK_KEY, INSTANCE_ID, LEADER_LEASE_MS)
+        lease_check_interval = LEADER_LEASE_MS / 3000.0
+        next_lease_check = time.monotonic()
+        was_leader = not LEADER_ELECTION
+
         while not shutdown_flag:
-            insult_to_send = None
-            try:
-                # SRANDMEMBER picks a random element from the set.
-                # If the set is empty, it returns None.
-                insult_to_send = r_reader.srandmember(INSULTS_SET_KEY)
-            except redis.exceptions.RedisError as e:
-                print(f"Broadcaster: Error reading from Redis set '{INSULTS_SET_KEY}': {e}")
-                time.sleep(5) # Wait before retrying on Redis error
-                continue # Skip this broadcast iteration
-
-            if insult_to_send:
+            now = time.monotonic()
+            if lease and now >= next_lease_check:
+                is_leader = lease.refresh()
+                if is_leader and not was_leader:
+                    scheduler.defer(delay_after_takeover(r_reader, 1.0 / scheduler.rate))
+                was_leader = is_leader
+                is_leader_gauge.set(int(is_leader))
+                next_lease_check = now + lease_check_interval
+
+            slots = scheduler.available_slots() if (not lease or lease.is_leader()) else 0
+            batches = read_batches(r_reader, slots, scheduler.batch_size) if slots else []
+            if batches:
                 try:
-                    # Publish the insult to the channel
+                    # All publishes of this round go out in one round trip.
                     # PUBLISH returns the number of clients that received the message
-                    num_clients = r_publisher.publish(BROADCAST_CHANNEL, insult_to_send)
-                    print(f"Broadcasted: '{insult_to_send}' (to {num_clients} subscribers on channel '{BROADCAST_CHANNEL}')")
+                    pipe = r_publisher.pipeline(transaction=False)
+                    for batch in batches:
+                        pipe.publish(BROADCAST_CHANNEL, encode_broadcast(batch))
+                    if lease:
+                        pipe.set(LAST_BROADCAST_KEY, time.time())
+                    num_clients = pipe.execute()[0]
+                    broadcasts_published.add(len(batches))
+                    broadcast_receivers.set(num_clients)
+                    if scheduler.verbose:
+                        for batch in batches:
+                            print(f"Broadcasted: '{batch[0] if len(batch) == 1 else batch}' (to {num_clients} subscribers on channel '{BROADCAST_CHANNEL}')")
+                    summary = scheduler.periodic_summary()
+                    if summary:
+                        print(f"Broadcaster: {summary} (to {num_clients} subscribers on channel '{BROADCAST_CHANNEL}')")
                 except redis.exceptions.RedisError as e:
+                     broadcast_errors.inc()
                      print(f"Broadcaster: Error publishing to Redis channel '{BROADCAST_CHANNEL}': {e}")
 
-            # Wait for 5 seconds before the next broadcast
-            # Check shutdown_flag more frequently for responsiveness
-            for _ in range(50): # 50 * 0.1s = 5s
-                if shutdown_flag:
-                    break
-                time.sleep(0.1)
+            # Wake up often enough to renew the lease and stay responsive to shutdown
+            sleep_for = scheduler.time_until_next_slot()
+            if lease:
+                sleep_for = min(sleep_for, next_lease_check - time.monotonic())
+            time.sleep(min(0.1, max(0.0, sleep_for)))
         
     except redis.exceptions.ConnectionError as e:
         print(f"Broadcaster Error: Could not connect to Redis at {REDIS_HOST}:{REDIS_PORT} - {e}")
     except Exception as e:
         print(f"Broadcaster: An unexpected error occurred: {e}")
     finally:
+        if lease:
+            lease.release() # Lets a standby take over immediately instead of after the lease
         print("Insult Broadcaster is shutting down.")
 
 
@@ -1,6 +1,13 @@
 # insult_subscriber_redis.py
 import redis
 import signal
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.broadcast_payload import decode_broadcast
 
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
@@ -41,7 +48,9 @@ def listen_for_insults():
             if shutdown_flag: # Check flag if listen() yields for any reason (e.g. unsubscribe)
                 break
             if message and message['type'] == 'message':
-                print(f"\n[SUBSCRIBER] >>> Received Insult: {message['data']}")
+                insults, _ = decode_broadcast(message['data']) # One insult or a batch
+                for insult in insults:
+                    print(f"\n[SUBSCRIBER] >>> Received Insult: {insult}")
             elif message and message['type'] == 'subscribe':
                 print(f"(Subscribed to channel: {message['channel'].decode() if isinstance(message['channel'], bytes) else message['channel']})")
    
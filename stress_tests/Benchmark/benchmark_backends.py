@@ -0,0 +1,149 @@
+# benchmark_backends.py
+# Backend plugins for benchmark_runner.py. Each plugin opens its own connection inside a
+# client process (open), sends one request per call() and raises on failure, so the runner
+# can time and count every request the same way for all middlewares.
+# Client libraries are imported in open(), so a scenario only needs the ones it uses.
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.insult_shards import declare_insult_queues, insult_route, shard_count_from_env
+
+FANOUT_DIR = os.path.join(PROJECT_ROOT, "stress_tests", "Broadcast_Fanout")
+
+REQUEST_OPERATIONS = ("add_insult", "submit_filter") # Closed-loop request/response operations
+BROADCAST_OPERATION = "broadcast" # Measured with the Broadcast_Fanout subscribers instead
+
+
+class RequestFailed(Exception):
+    """The service answered, but not with a success response."""
+
+
+class XmlRpcBackend:
+    name = "xmlrpc"
+    INSULT_SERVER_URL = "http://127.0.0.1:8000/RPC2"
+    FILTER_SERVER_URL = "http://127.0.0.1:8001/RPC2"
+    fanout_module = "xmlrpc_broadcast_fanout"
+    fanout_functions = ("start_xmlrpc_server", "host_xmlrpc_subscribers", None)
+
+    def open(self, operation):
+        import xmlrpc.client
+        url = self.INSULT_SERVER_URL if operation == "add_insult" else self.FILTER_SERVER_URL
+        self.proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+
+    def call(self, operation, payload):
+        if operation == "add_insult":
+            self.proxy.add_insult(payload)
+        else:
+            response = self.proxy.submit_text_for_filtering(payload)
+            if not (isinstance(response, str) and "submitted successfully" in response):
+                raise RequestFailed(f"Unexpected response: {response!r}")
+
+    def close(self):
+        self.proxy = None
+
+
+class PyroBackend:
+    name = "pyro"
+    INSULT_SERVICE_NAME = "example.insult.service"
+    FILTER_DISPATCHER_NAME = "example.filter.dispatcher"
+    CALL_TIMEOUT = 10 # Seconds
+    fanout_module = "pyro_broadcast_fanout"
+    fanout_functions = ("start_pyro_server", "host_pyro_subscribers", None)
+
+    def open(self, operation):
+        import Pyro4
+        name = self.INSULT_SERVICE_NAME if operation == "add_insult" else self.FILTER_DISPATCHER_NAME
+        self.proxy = Pyro4.Proxy(f"PYRONAME:{name}")
+        self.proxy._pyroTimeout = self.CALL_TIMEOUT
+
+    def call(self, operation, payload):
+        if operation == "add_insult":
+            response = self.proxy.add_insult(payload)
+            if "successfully" not in response and "already exists" not in response:
+                raise RequestFailed(f"Unexpected response: {response!r}")
+        else:
+            response = self.proxy.submit_text_for_filtering(payload)
+            if not (isinstance(response, dict) and response.get("status") == "success"):
+                raise RequestFailed(f"Unexpected response: {response!r}")
+
+    def close(self):
+        self.proxy._pyroRelease()
+
+
+class RedisBackend:
+    name = "redis"
+    REDIS_HOST = 'localhost'
+    REDIS_PORT = 6379
+    INSULTS_SET_KEY = 'insults_set'
+    TASK_QUEUE_NAME = 'filter_work_queue'
+    fanout_module = "redis_broadcast_fanout"
+    fanout_functions = ("start_redis_broadcaster", "host_redis_subscribers", "seed_insult")
+
+    def open(self, operation):
+        import redis
+        self.r = redis.Redis(host=self.REDIS_HOST, port=self.REDIS_PORT, db=0, decode_responses=True)
+        self.r.ping()
+
+    def call(self, operation, payload):
+        if operation == "add_insult":
+            self.r.sadd(self.INSULTS_SET_KEY, payload)
+        else:
+            self.r.rpush(self.TASK_QUEUE_NAME, payload)
+
+    def close(self):
+        self.r.close()
+
+
+class RabbitMQBackend:
+    name = "rabbitmq"
+    RABBITMQ_HOST = 'localhost'
+    TASK_QUEUE_NAME = 'filter_task_work_queue'
+    fanout_module = "rabbitmq_broadcast_fanout"
+    fanout_functions = ("start_rabbitmq_broadcaster", "host_rabbitmq_subscribers", "seed_insult")
+
+    def open(self, operation):
+        import pika
+        self.pika = pika
+        self.shard_count = shard_count_from_env() if operation == "add_insult" else 1
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=self.RABBITMQ_HOST))
+        self.channel = self.connection.channel()
+        if operation == "add_insult":
+            declare_insult_queues(self.channel, self.shard_count) # Sharded: every shard queue, bound
+        else:
+            self.channel.queue_declare(queue=self.TASK_QUEUE_NAME, durable=True)
+
+    def call(self, operation, payload):
+        if operation == "add_insult":
+            exchange, routing_key = insult_route(payload, self.shard_count)
+        else:
+            exchange, routing_key = '', self.TASK_QUEUE_NAME
+        self.channel.basic_publish(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=payload,
+            properties=self.pika.BasicProperties(delivery_mode=self.pika.spec.PERSISTENT_DELIVERY_MODE)
+        )
+
+    def close(self):
+        if self.connection.is_open:
+            self.connection.close()
+
+
+BACKENDS = {backend.name: backend for backend in (XmlRpcBackend, PyroBackend, RedisBackend, RabbitMQBackend)}
+
+def get_backend(name):
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown backend '{name}'. Available: {', '.join(BACKENDS)}") from None
+
+def load_fanout_functions(backend_cls):
+    """Returns (start_broadcaster, host_function, prepare) from the backend's Broadcast_Fanout script."""
+    import importlib
+    if FANOUT_DIR not in sys.path:
+        sys.path.insert(0, FANOUT_DIR) # The fan-out scripts import fanout_common as a sibling
+    module = importlib.import_module(backend_cls.fanout_module)
+    return tuple(getattr(module, fn) if fn else None for fn in backend_cls.fanout_functions)
@@ -0,0 +1,252 @@
+# benchmark_runner.py
+# Runs a declarative benchmark scenario (JSON) against any of the four middlewares and writes
+# machine-readable results (JSON + CSV) so runs can be compared over time.
+#
+# Usage: python benchmark_runner.py [scenario.json]   (default: scenarios/single_node.json)
+import multiprocessing
+import subprocess
+import platform
+import socket
+import random
+import json
+import time
+import csv
+import sys
+import os
+
+from benchmark_backends import (BACKENDS, BROADCAST_OPERATION, PROJECT_ROOT, REQUEST_OPERATIONS,
+                                get_backend, load_fanout_functions)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.latency_histogram import LatencyHistogram
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCENARIO_FILE = os.path.join(BENCHMARK_DIR, "scenarios", "single_node.json")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+
+# Anything a scenario leaves out falls back to these (same as the Single_Node scripts)
+DEFAULT_SCENARIO = {
+    "name": "unnamed",
+    "backends": list(BACKENDS),
+    "operations": list(REQUEST_OPERATIONS),
+    "concurrency_levels": [1, 2, 5, 10, 20],
+    "requests": 10000, # Measured requests per concurrency level, split over the client processes
+    "warmup_requests": 100, # Untimed requests per client process before measuring
+    "pause_between_runs": 2, # Seconds
+    # Weighted payload templates per operation; {i} and {pid} make every payload unique
+    "payloads": {
+        "add_insult": [{"text": "Benchmark insult {i} by {pid}: you benchmark like a sloth.", "weight": 1}],
+        "submit_filter": [
+            {"text": "This is a stupid example text with some bad words like idiot. ({pid})", "weight": 1},
+            {"text": "A perfectly clean and fine statement about a moron. ({pid})", "weight": 1},
+            {"text": "What a LAME thing to say, you dummy! ({pid})", "weight": 1},
+            {"text": "The quick brown fox jumps over the lazy dog. ({pid})", "weight": 1},
+        ],
+    },
+    # For the broadcast operation, concurrency levels are subscriber counts
+    "broadcast": {"rate": 10, "duration": 10},
+}
+
+CSV_FIELDS = ["backend", "operation", "concurrency", "requests", "successes", "failures", "errors",
+              "duration_s", "throughput_per_sec", "mean_ms", "p50_ms", "p90_ms", "p95_ms", "p99_ms",
+              "p99.9_ms", "max_ms"]
+LATENCY_PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+def load_scenario(path):
+    with open(path) as f:
+        scenario = json.load(f)
+    merged = dict(DEFAULT_SCENARIO, **scenario)
+    merged["payloads"] = dict(DEFAULT_SCENARIO["payloads"], **scenario.get("payloads", {}))
+    merged["broadcast"] = dict(DEFAULT_SCENARIO["broadcast"], **scenario.get("broadcast", {}))
+    for backend in merged["backends"]:
+        get_backend(backend) # Fail early on typos
+    for operation in merged["operations"]:
+        if operation not in REQUEST_OPERATIONS and operation != BROADCAST_OPERATION:
+            raise ValueError(f"Unknown operation '{operation}'.")
+    return merged
+
+def split_requests(total, workers):
+    """Same split as the Single_Node scripts: the remainder goes to the first workers."""
+    requests_per_worker = [total // workers] * workers
+    for i in range(total % workers):
+        requests_per_worker[i] += 1
+    return requests_per_worker
+
+
+# --- Client process (closed loop: next request only after the previous one returned) ---
+def run_client(args):
+    backend_name, operation, num_requests, warmup_requests, payload_mix = args
+    pid = multiprocessing.current_process().pid
+    texts = [entry["text"] for entry in payload_mix]
+    weights = [entry.get("weight", 1) for entry in payload_mix]
+    histogram = LatencyHistogram()
+    errors = {}
+    backend = get_backend(backend_name)()
+    try:
+        backend.open(operation)
+    except Exception as e:
+        return {"histogram": histogram, "failures": num_requests, "errors": {type(e).__name__: num_requests},
+                "setup_error": str(e)}
+
+    try:
+        for i in range(warmup_requests):
+            try:
+                backend.call(operation, random.choices(texts, weights)[0].format(i=f"warmup-{i}", pid=pid))
+            except Exception:
+                pass
+
+        start = time.time()
+        for i in range(num_requests):
+            payload = random.choices(texts, weights)[0].format(i=i, pid=pid)
+            sent_at = time.perf_counter()
+            try:
+                backend.call(operation, payload)
+                histogram.record(time.perf_counter() - sent_at)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+        end = time.time()
+    finally:
+        try:
+            backend.close()
+        except Exception:
+            pass
+    return {"histogram": histogram, "failures": sum(errors.values()), "errors": errors,
+            "start": start, "end": end}
+
+def run_request_level(scenario, backend_name, operation, concurrency):
+    payload_mix = scenario["payloads"][operation]
+    work = [(backend_name, operation, n, scenario["warmup_requests"], payload_mix)
+            for n in split_requests(scenario["requests"], concurrency)]
+    with multiprocessing.Pool(processes=concurrency) as pool:
+        client_results = pool.map(run_client, work)
+
+    for r in client_results:
+        if "setup_error" in r:
+            print(f"  Client reported setup error: {r['setup_error']}")
+    histogram = LatencyHistogram.merged(r["histogram"] for r in client_results)
+    errors = {}
+    for r in client_results:
+        for name, count in r["errors"].items():
+            errors[name] = errors.get(name, 0) + count
+    measured = [r for r in client_results if "start" in r]
+    # Wall time of the measured phase, from the first client's start to the last client's end
+    duration = (max(r["end"] for r in measured) - min(r["start"] for r in measured)) if measured else 0.0
+    return {
+        "backend": backend_name,
+        "operation": operation,
+        "concurrency": concurrency,
+        "requests": scenario["requests"],
+        "successes": histogram.count,
+        "failures": sum(r["failures"] for r in client_results),
+        "errors": errors,
+        "duration_s": duration,
+        "throughput_per_sec": (histogram.count / duration) if duration > 0 else 0.0,
+        "mean_ms": histogram.mean() * 1000,
+        **{f"p{p:g}_ms": histogram.percentile(p) * 1000 for p in LATENCY_PERCENTILES},
+        "max_ms": (histogram.max * 1000) if histogram.count else float('nan'),
+        "histogram": histogram.to_dict(), # JSON only: lets later tooling merge or re-slice runs
+    }
+
+def run_broadcast_level(scenario, backend_name, num_subscribers):
+    """Delegates to the Broadcast_Fanout driver; successes are deliveries, failures missed deliveries."""
+    start_broadcaster, host_function, prepare = load_fanout_functions(get_backend(backend_name))
+    import fanout_common # On sys.path once the backend's fan-out script is loaded
+    rate = scenario["broadcast"]["rate"]
+    fanout_common.MEASURE_DURATION = scenario["broadcast"]["duration"]
+    broadcaster = None
+    try:
+        if prepare:
+            prepare()
+        broadcaster = start_broadcaster(rate)
+        res = fanout_common.run_fanout_level(host_function, num_subscribers, rate)
+    finally:
+        fanout_common.stop_process(broadcaster)
+    errors = {"SubscriberError": len(res["errors"])} if res["errors"] else {}
+    return {
+        "backend": backend_name,
+        "operation": BROADCAST_OPERATION,
+        "concurrency": num_subscribers,
+        "requests": int(res["expected"]),
+        "successes": res["delivered"],
+        "failures": max(0, int(res["expected"]) - res["delivered"]),
+        "errors": errors,
+        "duration_s": fanout_common.MEASURE_DURATION,
+        "throughput_per_sec": res["delivered_per_sec"],
+        "mean_ms": float('nan'),
+        "p50_ms": res["p50_ms"],
+        "p90_ms": float('nan'),
+        "p95_ms": res["p95_ms"],
+        "p99_ms": res["p99_ms"],
+        "p99.9_ms": float('nan'),
+        "max_ms": res["max_ms"],
+    }
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARK_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def write_results(scenario, rows, started_at, csv_fields=CSV_FIELDS):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    base_name = os.path.join(RESULTS_DIR, f"{scenario['name']}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(started_at))}")
+    with open(base_name + ".json", "w") as f:
+        json.dump({
+            "scenario": scenario,
+            "started_at": started_at,
+            "host": socket.gethostname(),
+            "python": platform.python_version(),
+            "git_revision": git_revision(),
+            "results": rows,
+        }, f, indent=2)
+    with open(base_name + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=csv_fields, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, errors=";".join(f"{k}={v}" for k, v in row["errors"].items())))
+    return base_name
+
+
+# --- Main Benchmark Execution ---
+if __name__ == "__main__":
+    scenario_file = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SCENARIO_FILE
+    scenario = load_scenario(scenario_file)
+    print(f"Starting benchmark scenario '{scenario['name']}' ({scenario_file}).")
+    print(f"Backends: {scenario['backends']}, operations: {scenario['operations']}, "
+          f"concurrency levels: {scenario['concurrency_levels']}")
+    print("Ensure the services under test are running (see README).")
+    print("-" * 70)
+
+    started_at = time.time()
+    rows = []
+    for backend_name in scenario["backends"]:
+        for operation in scenario["operations"]:
+            for concurrency in scenario["concurrency_levels"]:
+                print(f"\n[{backend_name}] {operation} with concurrency {concurrency}...")
+                try:
+                    if operation == BROADCAST_OPERATION:
+                        row = run_broadcast_level(scenario, backend_name, concurrency)
+                    else:
+                        row = run_request_level(scenario, backend_name, operation, concurrency)
+                except Exception as e:
+                    print(f"  Error during run: {e}")
+                    continue
+                rows.append(row)
+                print(f"  {row['successes']}/{row['requests']} ok, {row['failures']} failed, "
+                      f"{row['throughput_per_sec']:.2f}/sec, p50: {row['p50_ms']:.2f}ms, "
+                      f"p95: {row['p95_ms']:.2f}ms, p99: {row['p99_ms']:.2f}ms, p99.9: {row['p99.9_ms']:.2f}ms")
+                time.sleep(scenario["pause_between_runs"])
+
+    base_name = write_results(scenario, rows, started_at)
+    print("\n" + "=" * 70)
+    print(f"Benchmark Summary ({scenario['name']}):")
+    print("Backend  | Operation     | Conc | Ok/Req        | Thr/sec    | p50 ms   | p95 ms   | p99 ms")
+    print("---------|---------------|------|---------------|------------|----------|----------|---------")
+    for row in rows:
+        print(f"{row['backend']:<8} | {row['operation']:<13} | {row['concurrency']:<4} | "
+              f"{str(row['successes']) + '/' + str(row['requests']):<13} | {row['throughput_per_sec']:<10.2f} | "
+              f"{row['p50_ms']:<8.2f} | {row['p95_ms']:<8.2f} | {row['p99_ms']:.2f}")
+    print("=" * 70)
+    print(f"Results written to {base_name}.json and {base_name}.csv")
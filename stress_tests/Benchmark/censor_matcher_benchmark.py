@@ -0,0 +1,99 @@
+# censor_matcher_benchmark.py
+# Dictionary size against throughput for the filter's censor matcher (common/censor_matcher.py),
+# next to the old word-set filter, which cannot match phrases.
+#
+# Dictionaries: N made-up entries, --phrase-share of them phrases of 2-4 words. Texts: --words
+# words each, drawn from everyday words, with probability --insult-rate an entry instead (so the
+# censoring path runs too). Throughput is single-threaded, over --seconds per size.
+#
+# Usage: python censor_matcher_benchmark.py [--sizes 1000,10000,100000,1000000] [--words 40]
+import argparse
+import random
+import time
+import sys
+import re
+
+from benchmark_backends import PROJECT_ROOT
+from benchmark_runner import write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.censor_matcher import CensorMatcher
+
+WORDS = ["the", "chat", "server", "message", "quick", "brown", "fox", "jumps", "over", "lazy", "dog",
+         "really", "what", "a", "day", "again", "filter", "queue", "you", "were", "be", "flour"]
+CSV_FIELDS = ["size", "phrases", "build_s", "memory_mb", "tasks_per_s", "mb_per_s", "set_tasks_per_s",
+              "vs_set", "censored_share", "errors"]
+
+
+def set_filter(original_text, known_insults_set): # The workers' filter before the matcher
+    return "".join("CENSORED" if word.lower() in known_insults_set else word
+                   for word in re.split(r'(\W+)', original_text))
+
+def make_dictionary(size, phrase_share, rng):
+    entries = []
+    for i in range(size):
+        if rng.random() < phrase_share:
+            entries.append(" ".join(f"w{rng.randrange(size)}" for _ in range(rng.randint(2, 4))) + f" p{i}")
+        else:
+            entries.append(f"Insult{i}")
+    return entries
+
+def make_texts(entries, count, words, insult_rate, rng):
+    return [" ".join(rng.choice(entries) if rng.random() < insult_rate else rng.choice(WORDS)
+                     for _ in range(words)) for _ in range(count)]
+
+def throughput(filter_one, texts, seconds):
+    done, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for text in texts:
+            filter_one(text)
+        done += len(texts)
+    return done / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Censor matcher throughput against dictionary size.")
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--phrase-share", type=float, default=0.3)
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--insult-rate", type=float, default=0.02, help="Share of text words that are entries")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--name", default="censor_matcher_benchmark")
+    args = parser.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",")]
+
+    print(f"Censor matcher benchmark: sizes {sizes}, {args.phrase_share:.0%} phrases, {args.words}-word texts, "
+          f"{args.insult_rate:.0%} insults.")
+    started_at = time.time()
+    rows = []
+    for size in sizes:
+        rng = random.Random(args.seed)
+        entries = make_dictionary(size, args.phrase_share, rng)
+        texts = make_texts(entries, args.texts, args.words, args.insult_rate, rng)
+        started = time.perf_counter()
+        matcher = CensorMatcher(entries)
+        build = time.perf_counter() - started
+        known_insults = {entry.lower() for entry in entries}
+        rate = throughput(matcher.censor, texts, args.seconds)
+        set_rate = throughput(lambda text: set_filter(text, known_insults), texts, args.seconds)
+        censored = sum(1 for text in texts if matcher.spans(text)) / len(texts)
+        mean_bytes = sum(len(text.encode()) for text in texts) / len(texts)
+        row = {"size": size, "phrases": sum(1 for entry in entries if " " in entry), "build_s": build,
+               "memory_mb": matcher.memory_bytes() / 2**20, "tasks_per_s": rate, "mb_per_s": rate * mean_bytes / 2**20,
+               "set_tasks_per_s": set_rate, "vs_set": rate / set_rate if set_rate else None,
+               "censored_share": censored, "errors": {}}
+        print(f"  {size:>8} entries: build {build:.2f}s, {row['memory_mb']:.1f}MB, {rate:.0f} tasks/s "
+              f"({row['mb_per_s']:.1f}MB/s), word set {set_rate:.0f} tasks/s")
+        rows.append(row)
+
+    base_name = write_results({"name": args.name, "sizes": sizes, "phrase_share": args.phrase_share,
+                               "words": args.words, "insult_rate": args.insult_rate, "texts": args.texts,
+                               "seconds": args.seconds, "seed": args.seed}, rows, started_at, csv_fields=CSV_FIELDS)
+    print("Entries  | Build s | Memory MB | Tasks/s  | MB/s  | Word set tasks/s | vs set | Censored")
+    for row in rows:
+        print(f"{row['size']:<8} | {row['build_s']:>7.2f} | {row['memory_mb']:>9.1f} | {row['tasks_per_s']:>8.0f} | "
+              f"{row['mb_per_s']:>5.1f} | {row['set_tasks_per_s']:>16.0f} | {row['vs_set']:>5.2f}x | "
+              f"{row['censored_share']:>7.0%}")
+    print(f"Results written to {base_name}.json and {base_name}.csv")
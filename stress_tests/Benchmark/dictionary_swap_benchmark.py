@@ -0,0 +1,180 @@
+# dictionary_swap_benchmark.py
+# Cost of a live dictionary update (common/insult_dictionary.py) for a filter worker: how long the
+# background build and the swap take, and how much a consuming thread's throughput drops while the
+# build runs (it shares the GIL with it).
+#
+# In-process: one thread filters texts back to back with LiveDictionary.current(), as the workers
+# do, while --updates new dictionaries of each size are applied from another thread. Throughput is
+# reported for the --window seconds before each update, during its build and after the swap.
+# --matcher automaton (default, the workers' common/censor_matcher.py) or set (the old word set).
+# With --redis, each dictionary is instead published through Redis to --subscribers
+# DictionarySubscribers, adding the publish-to-swap propagation time of every subscriber.
+#
+# Usage: python dictionary_swap_benchmark.py [--sizes 1000,10000,100000] [--updates 3] [--matcher set] [--redis]
+import threading
+import argparse
+import random
+import time
+import sys
+import re
+
+from benchmark_backends import PROJECT_ROOT
+from benchmark_runner import write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.censor_matcher import CensorMatcher
+from common.insult_dictionary import DictionarySubscriber, LiveDictionary, publish_dictionary
+
+KNOWN_INSULTS = {"stupid", "idiot", "dummy", "moron", "lame", "darn", "heck"} # The workers' built-in list
+WORDS = ["the", "chat", "server", "message", "quick", "brown", "fox", "jumps", "over", "lazy", "dog",
+         "really", "what", "a", "day", "again", "filter", "queue", "stupid", "idiot", "lame", "heck"]
+PROPAGATION_TIMEOUT = 30
+CSV_FIELDS = ["size", "update", "build_ms", "swap_us", "propagation_ms", "tasks_per_s_before",
+              "tasks_per_s_during", "tasks_per_s_after", "during_vs_before", "errors"]
+
+
+def set_filter(original_text, known_insults_set): # The workers' filter before the censor matcher
+    return "".join("CENSORED" if word.lower() in known_insults_set else word
+                   for word in re.split(r'(\W+)', original_text))
+
+MATCHERS = {"automaton": (CensorMatcher, lambda text, matcher: matcher.censor(text)),
+            "set": (frozenset, set_filter)} # name -> (build_matcher, filter function)
+
+def dictionary_of(size, update):
+    """`size` insults, different for every update so each one is a real change."""
+    return {f"insult{update}x{i}" for i in range(size - len(KNOWN_INSULTS))} | KNOWN_INSULTS
+
+
+class Consumer(threading.Thread):
+    """Filters texts in a loop, recording when each task finished."""
+    def __init__(self, live, texts, filter_one):
+        super().__init__(daemon=True)
+        self.live, self.texts, self.filter_one = live, texts, filter_one
+        self.finished = [] # perf_counter times
+        self.stop = False
+
+    def run(self):
+        i = 0
+        while not self.stop:
+            current = self.live.current() # Per task, like the workers
+            self.filter_one(self.texts[i % len(self.texts)], current.matcher)
+            self.finished.append(time.perf_counter())
+            i += 1
+
+    def rate(self, start, end):
+        if end <= start:
+            return 0.0
+        return sum(1 for t in self.finished if start <= t < end) / (end - start)
+
+
+def apply_locally(live, version, insults):
+    """Builds and swaps in this thread: (build, swap, propagation) seconds."""
+    build, swap = live.apply(version, insults)
+    return build, swap, None
+
+def apply_via_redis(client, subscribers, insults):
+    """Publishes and waits until every subscriber has swapped: (build, swap, propagation) seconds,
+    build and swap as seen by the first subscriber (the consumer's)."""
+    live = subscribers[0].live
+    build_before = live.build_time.snapshot()["sum"]
+    started = time.perf_counter()
+    version = publish_dictionary(client, insults)
+    deadline = time.time() + PROPAGATION_TIMEOUT
+    while any(s.live.current().version < version for s in subscribers) and time.time() < deadline:
+        time.sleep(0.0005)
+    propagated = time.perf_counter()
+    lagging = sum(1 for s in subscribers if s.live.current().version < version)
+    if lagging:
+        raise RuntimeError(f"v{version} did not reach {lagging} subscriber(s) in {PROPAGATION_TIMEOUT}s")
+    return live.build_time.snapshot()["sum"] - build_before, None, propagated - started
+
+def run(args, consumer, size, update, apply):
+    time.sleep(args.window) # Baseline window
+    insults = dictionary_of(size, update)
+    started = time.perf_counter()
+    build, swap, propagation = apply(insults)
+    swapped = time.perf_counter()
+    time.sleep(args.window)
+    before = consumer.rate(started - args.window, started)
+    # A build shorter than a couple of GIL switch intervals says nothing about the consumer's rate
+    during = consumer.rate(started, swapped) if swapped - started >= 2 * sys.getswitchinterval() else None
+    after = consumer.rate(swapped, swapped + args.window)
+    print(f"  {size:>7} insults, update {update}: build {build * 1000:.1f}ms, "
+          f"{f'{during:.0f}' if during is not None else '-'} tasks/s during vs {before:.0f} before, {after:.0f} after")
+    return {"size": size, "update": update, "build_ms": build * 1000,
+            "swap_us": swap * 1e6 if swap is not None else None,
+            "propagation_ms": propagation * 1000 if propagation is not None else None,
+            "tasks_per_s_before": before, "tasks_per_s_during": during, "tasks_per_s_after": after,
+            "during_vs_before": during / before if before and during is not None else None, "errors": {}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build/swap time of live dictionary updates and throughput during them.")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--updates", type=int, default=3, help="Updates per size")
+    parser.add_argument("--window", type=float, default=1.0, help="Seconds measured before and after each update")
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--matcher", choices=list(MATCHERS), default="automaton")
+    parser.add_argument("--redis", action="store_true", help="Propagate through Redis pub/sub")
+    parser.add_argument("--redis-host", default="localhost")
+    parser.add_argument("--subscribers", type=int, default=4)
+    parser.add_argument("--name", default="dictionary_swap_benchmark")
+    args = parser.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",")]
+
+    rng = random.Random(1)
+    texts = [" ".join(rng.choice(WORDS) for _ in range(args.words)) for _ in range(1000)]
+    build_matcher, filter_one = MATCHERS[args.matcher]
+    live = LiveDictionary(KNOWN_INSULTS, build_matcher=build_matcher, prefix="Benchmark:")
+    subscribers = []
+    if args.redis:
+        import redis
+        client = redis.Redis(host=args.redis_host, port=6379, db=0, decode_responses=True)
+        client.ping()
+        # The consumer uses the first subscriber's dictionary; the others only add propagation load
+        subscribers = [DictionarySubscriber(live if i == 0 else LiveDictionary(KNOWN_INSULTS, build_matcher, prefix=f"Subscriber {i}:"),
+                                            redis.Redis(host=args.redis_host, port=6379, db=0, decode_responses=True),
+                                            prefix=f"Subscriber {i}:") for i in range(args.subscribers)]
+        for subscriber in subscribers:
+            subscriber.start()
+        time.sleep(1.0) # Subscribed and caught up with any snapshot already published
+    consumer = Consumer(live, texts, filter_one)
+    consumer.start()
+
+    print(f"Dictionary swap benchmark: {args.matcher} matcher, sizes {sizes}, {args.updates} updates each, "
+          f"{'Redis with ' + str(args.subscribers) + ' subscribers' if args.redis else 'in-process'}.")
+    started_at = time.time()
+    rows, version = [], live.current().version
+    try:
+        for size in sizes:
+            for update in range(args.updates):
+                version += 1
+                try:
+                    if args.redis:
+                        apply = lambda insults: apply_via_redis(client, subscribers, insults)
+                    else:
+                        apply = lambda insults: apply_locally(live, version, insults)
+                    row = run(args, consumer, size, update, apply)
+                except Exception as e:
+                    print(f"  size {size} update {update} failed: {e}")
+                    rows.append({"size": size, "update": update, "errors": {type(e).__name__: 1}})
+                    continue
+                rows.append(row)
+    finally:
+        consumer.stop = True
+        for subscriber in subscribers:
+            subscriber.stop()
+
+    base_name = write_results({"name": args.name, "sizes": sizes, "updates": args.updates, "window": args.window,
+                               "words": args.words, "matcher": args.matcher, "redis": args.redis, "subscribers": len(subscribers)},
+                              rows, started_at, csv_fields=CSV_FIELDS)
+    print("Size    | Build ms | Swap us | Propagation ms | Tasks/s before | during  | after   | During/before")
+    for row in rows:
+        if row["errors"]:
+            continue
+        fmt = lambda value, spec: format(value, spec) if value is not None else format("-", spec.split(".")[0])
+        print(f"{row['size']:<7} | {fmt(row['build_ms'], '>8.1f')} | {fmt(row['swap_us'], '>7.1f')} | "
+              f"{fmt(row['propagation_ms'], '>14.1f')} | {row['tasks_per_s_before']:>14.0f} | "
+              f"{fmt(row['tasks_per_s_during'], '>7.0f')} | {row['tasks_per_s_after']:>7.0f} | "
+              f"{fmt(row['during_vs_before'], '>12.2f')}")
+    print(f"Results written to {base_name}.json and {base_name}.csv")
@@ -0,0 +1,75 @@
+# metrics_overhead.py
+# Measures the hot-path cost of common/metrics.py, and checks that concurrent increments
+# from several threads are not lost. Exits non-zero if Counter.inc() costs 1us or more.
+#
+# Usage: python metrics_overhead.py [iterations]   (default: 2,000,000)
+import threading
+import timeit
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.metrics import MetricsRegistry
+
+DEFAULT_ITERATIONS = 2_000_000
+REPEATS = 5 # Best of N, to keep scheduler noise out of the per-op figure
+COUNTER_BUDGET_NS = 1000 # The "well under a microsecond" target for counter increments
+THREADS = 4
+
+
+def time_per_op(statement, setup_globals, iterations):
+    """Best-of-REPEATS nanoseconds per execution of `statement`, minus an empty loop."""
+    timer = timeit.Timer(statement, globals=setup_globals)
+    empty = timeit.Timer("pass", globals=setup_globals)
+    best = min(timer.repeat(repeat=REPEATS, number=iterations))
+    baseline = min(empty.repeat(repeat=REPEATS, number=iterations))
+    return max(0.0, best - baseline) / iterations * 1e9
+
+def check_concurrent_increments(counter, per_thread):
+    def work():
+        inc = counter.inc
+        for _ in range(per_thread):
+            inc()
+    threads = [threading.Thread(target=work) for _ in range(THREADS)]
+    before = counter.value
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return counter.value - before
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_ITERATIONS
+    registry = MetricsRegistry()
+    names = {
+        "counter": registry.counter("bench_counter_total"),
+        "gauge": registry.gauge("bench_gauge"),
+        "histogram": registry.histogram("bench_seconds"),
+    }
+    names["inc"] = names["counter"].inc # What a hot loop would hoist
+
+    print(f"Metrics overhead, {iterations} iterations, best of {REPEATS} (empty loop subtracted):")
+    results = {}
+    for label, statement in (("Counter.inc()", "counter.inc()"),
+                             ("Counter.inc() (bound)", "inc()"),
+                             ("Gauge.set(v)", "gauge.set(3)"),
+                             ("Gauge.inc()", "gauge.inc()"),
+                             ("Histogram.observe(v)", "histogram.observe(0.0004)")):
+        results[label] = time_per_op(statement, names, iterations)
+        print(f"  {label:<22}: {results[label]:8.1f} ns/op")
+
+    per_thread = max(1, iterations // THREADS)
+    counted = check_concurrent_increments(names["counter"], per_thread)
+    expected = per_thread * THREADS
+    print(f"  Concurrent increments ({THREADS} threads): {counted}/{expected} counted"
+          f" {'(none lost)' if counted == expected else '(LOST UPDATES)'}")
+
+    scrape_ns = time_per_op("registry.render_prometheus()", {"registry": registry}, 10_000)
+    print(f"  Prometheus scrape of {len(registry.snapshot()) - 2} metrics: {scrape_ns / 1000:.1f} us")
+
+    ok = results["Counter.inc()"] < COUNTER_BUDGET_NS and counted == expected
+    print(f"Result: {'PASS' if ok else 'FAIL'} (counter budget {COUNTER_BUDGET_NS} ns/op)")
+    sys.exit(0 if ok else 1)
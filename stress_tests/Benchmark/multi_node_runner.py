@@ -0,0 +1,377 @@
+# multi_node_runner.py
+# Multi-node static scaling test: places N filter workers on several nodes through their
+# worker_agent.py, pushes the same workload through the shared broker for every N, and
+# reports time, throughput, speedup and parallel efficiency curves.
+#
+# Usage:
+#   python multi_node_runner.py --backend redis --agents node-a:9101,node-b:9101 --broker-host 10.0.0.5
+#   python multi_node_runner.py --backend redis --local-agents 4   # Simulated nodes: 4 agents on local ports
+# The broker (Redis / RabbitMQ, or the Pyro name server + filter dispatcher) must already run.
+import xmlrpc.client
+import subprocess
+import threading
+import argparse
+import random
+import time
+import sys
+import os
+
+from benchmark_backends import PROJECT_ROOT
+from benchmark_runner import write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.task_envelope import encode_task
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENT_SCRIPT = os.path.join(BENCHMARK_DIR, "worker_agent.py")
+DEFAULT_WORKER_COUNTS = [1, 2, 4, 8, 16, 32]
+LOCAL_AGENT_BASE_PORT = 9101
+WAKEUP_INTERVAL = 1.0 # Max seconds a blocking result wait sleeps before re-checking the deadline
+RESULTS_PREFETCH = 500 # RabbitMQ results pushed to the runner ahead of its acks
+READY_TIMEOUT = 30 # Seconds to wait for the workers of one run to be ready
+PAUSE_BETWEEN_RUNS = 2 # Seconds
+CSV_FIELDS = ["backend", "workers", "agents", "requests", "completed", "duration_s", "throughput_per_sec",
+              "speedup", "efficiency", "worker_cpu_s", "cpu_utilization"]
+
+SAMPLE_TEXTS = [
+    "Multi-node scaling test: stupid text example.",
+    "Multi-node scaling test: another LAME example from a moron.",
+    "Multi-node scaling test: this is a heck of a clean text, not dense at all.",
+]
+
+
+# --- Backend targets: clear state, produce the workload, wait for completions ---
+# wait_complete(total, deadline) blocks on the broker's own delivery (BLPOP, basic_consume) rather
+# than polling a length, and returns (completed, perf_counter time of the last completion).
+class RedisTarget:
+    name = "redis"
+    TASK_QUEUE_NAME = 'filter_work_queue'
+    RESULTS_LIST_NAME = 'filtered_texts_results'
+    PRODUCE_CHUNK = 1000 # Tasks per pipelined round trip
+
+    def __init__(self, broker_host):
+        import redis
+        self.broker_host = broker_host
+        self.r = redis.Redis(host=broker_host, port=6379, db=0)
+        self.r.ping()
+
+    def worker_env(self):
+        return {"REDIS_HOST": self.broker_host}
+
+    def prepare(self, previous_workers):
+        self.r.delete(self.TASK_QUEUE_NAME, self.RESULTS_LIST_NAME)
+
+    def wait_ready(self, num_workers):
+        return True # The agents already waited for every worker's "connected" signal
+
+    def produce(self, texts):
+        for i in range(0, len(texts), self.PRODUCE_CHUNK):
+            pipe = self.r.pipeline(transaction=False)
+            for text in texts[i:i + self.PRODUCE_CHUNK]:
+                pipe.rpush(self.TASK_QUEUE_NAME, encode_task(text))
+            pipe.execute()
+
+    def wait_complete(self, total, deadline):
+        done, finished_at = 0, None
+        while done < total and time.time() < deadline:
+            popped = self.r.blpop([self.RESULTS_LIST_NAME], timeout=WAKEUP_INTERVAL)
+            if popped:
+                done += 1
+                finished_at = time.perf_counter()
+        return done, finished_at
+
+    def close(self):
+        self.r.close()
+
+
+class RabbitMQTarget:
+    name = "rabbitmq"
+    TASK_QUEUE_NAME = 'filter_task_work_queue'
+    RESULTS_QUEUE_NAME = 'filter_results_data_queue'
+
+    def __init__(self, broker_host):
+        import pika
+        self.pika = pika
+        self.broker_host = broker_host
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=broker_host))
+        self.channel = self.connection.channel()
+        for queue in (self.TASK_QUEUE_NAME, self.RESULTS_QUEUE_NAME):
+            self.channel.queue_declare(queue=queue, durable=True)
+
+    def worker_env(self):
+        return {"RABBITMQ_HOST": self.broker_host}
+
+    def prepare(self, previous_workers):
+        for queue in (self.TASK_QUEUE_NAME, self.RESULTS_QUEUE_NAME):
+            self.channel.queue_purge(queue=queue)
+
+    def wait_ready(self, num_workers):
+        """Ready once every worker is consuming from the task queue."""
+        deadline = time.time() + READY_TIMEOUT
+        while time.time() < deadline:
+            consumers = self.channel.queue_declare(queue=self.TASK_QUEUE_NAME, passive=True).method.consumer_count
+            if consumers >= num_workers:
+                return True
+            time.sleep(0.2)
+        return False
+
+    def produce(self, texts):
+        properties = self.pika.BasicProperties(delivery_mode=self.pika.spec.PERSISTENT_DELIVERY_MODE)
+        for text in texts:
+            self.channel.basic_publish(exchange='', routing_key=self.TASK_QUEUE_NAME,
+                                       body=encode_task(text), properties=properties)
+
+    def wait_complete(self, total, deadline):
+        done, finished_at = 0, None
+        self.channel.basic_qos(prefetch_count=RESULTS_PREFETCH)
+        for method_frame, _, _ in self.channel.consume(self.RESULTS_QUEUE_NAME, inactivity_timeout=WAKEUP_INTERVAL):
+            if method_frame:
+                done += 1
+                finished_at = time.perf_counter()
+                if done % (RESULTS_PREFETCH // 5) == 0 or done >= total:
+                    self.channel.basic_ack(delivery_tag=method_frame.delivery_tag, multiple=True)
+            if done >= total or time.time() >= deadline:
+                break
+        self.channel.cancel() # Requeues anything delivered but unacked; prepare() purges it
+        return done, finished_at
+
+    def close(self):
+        if self.connection.is_open:
+            self.connection.close()
+
+
+class PyroTarget:
+    """The Pyro dispatcher is synchronous, so the producer keeps 2 requests in flight per worker."""
+    name = "pyro"
+    DISPATCHER_NAME = "example.filter.dispatcher"
+    IN_FLIGHT_PER_WORKER = 2
+
+    def __init__(self, broker_host):
+        import Pyro4
+        self.Pyro4 = Pyro4
+        self.broker_host = broker_host
+        self.dispatcher = Pyro4.Proxy(f"PYRONAME:{self.DISPATCHER_NAME}@{broker_host}")
+        self.dispatcher.get_metrics() # Fail early if the dispatcher is not running
+        self._done = 0
+        self._finished_at = None
+        self._lock = threading.Lock()
+        self._num_workers = 1
+
+    def worker_env(self):
+        return {"PYRO_NS_HOST": self.broker_host}
+
+    def _registered(self):
+        return self.dispatcher.get_metrics()["filter_workers_registered"]
+
+    def prepare(self, previous_workers):
+        # Stopped workers unregister on SIGINT; wait so no stale worker gets a task
+        deadline = time.time() + READY_TIMEOUT
+        while self._registered() > 0 and time.time() < deadline:
+            time.sleep(0.2)
+        self._done = 0
+        self._finished_at = None
+
+    def wait_ready(self, num_workers):
+        self._num_workers = num_workers
+        deadline = time.time() + READY_TIMEOUT
+        while time.time() < deadline:
+            if self._registered() >= num_workers:
+                return True
+            time.sleep(0.2)
+        return False
+
+    def produce(self, texts):
+        threads = max(1, self._num_workers * self.IN_FLIGHT_PER_WORKER)
+        chunks = [texts[i::threads] for i in range(threads)]
+
+        def submit_all(chunk):
+            proxy = self.Pyro4.Proxy(f"PYRONAME:{self.DISPATCHER_NAME}@{self.broker_host}")
+            for text in chunk:
+                try:
+                    response = proxy.submit_text_for_filtering(text)
+                except Exception:
+                    continue
+                if isinstance(response, dict) and response.get("status") == "success":
+                    with self._lock:
+                        self._done += 1
+                        self._finished_at = time.perf_counter()
+            proxy._pyroRelease()
+        workers = [threading.Thread(target=submit_all, args=(chunk,)) for chunk in chunks]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+
+    def wait_complete(self, total, deadline):
+        return self._done, self._finished_at # produce() only returns once every call has been answered
+
+    def close(self):
+        self.dispatcher._pyroRelease()
+
+
+TARGETS = {target.name: target for target in (RedisTarget, RabbitMQTarget, PyroTarget)}
+
+
+# --- Agents ---
+def start_local_agents(count):
+    """Simulated multi-node setup: `count` agents on consecutive local ports, each its own 'node'."""
+    procs, endpoints = [], []
+    for i in range(count):
+        port = LOCAL_AGENT_BASE_PORT + i
+        procs.append(subprocess.Popen([sys.executable, AGENT_SCRIPT, "--port", str(port), "--name", f"local-{i}"]))
+        endpoints.append(f"127.0.0.1:{port}")
+    return procs, endpoints
+
+def connect_agents(endpoints, timeout=10):
+    agents = []
+    for endpoint in endpoints:
+        proxy = xmlrpc.client.ServerProxy(f"http://{endpoint}/RPC2", allow_none=True)
+        deadline = time.time() + timeout
+        while True:
+            try:
+                info = proxy.ping()
+                break
+            except (ConnectionError, OSError):
+                if time.time() > deadline:
+                    raise RuntimeError(f"Agent at {endpoint} is not reachable.")
+                time.sleep(0.2)
+        print(f"  Agent {info['agent']} on {info['host']} ({info['cpus']} CPUs) at {endpoint}")
+        agents.append((endpoint, info))
+    return agents
+
+def distribute(num_workers, num_agents):
+    """Round-robin placement: per-agent worker counts differ by at most one."""
+    return [num_workers // num_agents + (1 if i < num_workers % num_agents else 0) for i in range(num_agents)]
+
+def call_agents(agents, method, *args_per_agent):
+    """Calls `method` on every agent in parallel (fresh proxy per thread); returns results in agent order."""
+    results = [None] * len(agents)
+    def call(i, endpoint, args):
+        proxy = xmlrpc.client.ServerProxy(f"http://{endpoint}/RPC2", allow_none=True)
+        try:
+            results[i] = getattr(proxy, method)(*args)
+        except Exception as e:
+            results[i] = {"error": str(e)}
+    threads = [threading.Thread(target=call, args=(i, endpoint, args_per_agent[i] if args_per_agent else ()))
+               for i, (endpoint, _) in enumerate(agents)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+# --- One scaling level ---
+def run_level(target, agents, num_workers, num_requests, timeout):
+    placement = distribute(num_workers, len(agents))
+    used_agents = sum(1 for n in placement if n)
+    print(f"\nTesting with {num_workers} worker(s) on {used_agents} node(s): {placement}")
+    target.prepare(num_workers)
+    start_results = call_agents(agents, "start_workers",
+                                *[(target.name, n, target.worker_env()) for n in placement])
+    try:
+        # Agents return once their workers signal ready (common/readiness.py), not after a fixed sleep
+        ready = sum(r.get("ready", 0) for r in start_results if r)
+        if ready < num_workers:
+            raise RuntimeError(f"Only {ready}/{num_workers} workers became ready: {start_results}")
+        print(f"  Workers ready after {max(r.get('startup_s', 0.0) for r in start_results if r):.2f}s")
+        if not target.wait_ready(num_workers):
+            raise RuntimeError(f"Workers did not become ready within {READY_TIMEOUT}s.")
+        cpu_before = sum(s.get("cpu_seconds") or 0.0 for s in call_agents(agents, "get_stats"))
+
+        texts = [random.choice(SAMPLE_TEXTS) + f" task_{i}" for i in range(num_requests)]
+        start = time.perf_counter()
+        target.produce(texts)
+        done, finished_at = target.wait_complete(num_requests, time.time() + timeout)
+        # Stop the clock at the last completion, not at whenever the wait loop noticed it
+        duration = (finished_at if finished_at is not None and done >= num_requests else time.perf_counter()) - start
+
+        stats = call_agents(agents, "get_stats")
+        cpu_seconds = sum(s.get("cpu_seconds") or 0.0 for s in stats) - cpu_before
+    finally:
+        call_agents(agents, "stop_workers")
+
+    if done < num_requests:
+        print(f"  TIMEOUT: only {done}/{num_requests} tasks completed in {timeout}s.")
+    print(f"  {done}/{num_requests} tasks in {duration:.3f}s ({done / duration:.1f} tasks/sec), "
+          f"worker CPU {cpu_seconds:.2f}s")
+    return {"backend": target.name, "workers": num_workers, "agents": used_agents, "placement": placement,
+            "requests": num_requests, "completed": done, "duration_s": duration,
+            "throughput_per_sec": done / duration if duration > 0 else 0.0,
+            "worker_cpu_s": cpu_seconds,
+            # Share of the workers' wall time spent on CPU: low values mean they waited on I/O or the broker
+            "cpu_utilization": cpu_seconds / (duration * num_workers) if duration > 0 else 0.0,
+            "agent_stats": stats, "errors": {} if done >= num_requests else {"Timeout": num_requests - done}}
+
+def add_scaling_columns(rows):
+    """Speedup and efficiency against the smallest complete run (normally 1 worker)."""
+    complete = [row for row in rows if row["completed"] >= row["requests"]]
+    if not complete:
+        for row in rows:
+            row["speedup"] = row["efficiency"] = float('nan')
+        return
+    base = min(complete, key=lambda row: row["workers"])
+    for row in rows:
+        if row["completed"] >= row["requests"]:
+            row["speedup"] = base["duration_s"] / row["duration_s"] * base["workers"]
+            row["efficiency"] = row["speedup"] / row["workers"]
+        else:
+            row["speedup"] = row["efficiency"] = float('nan')
+
+
+# --- Main ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-node static scaling test for the filter service.")
+    parser.add_argument("--backend", choices=list(TARGETS), default="redis")
+    parser.add_argument("--agents", default="", help="Comma-separated host:port of running worker_agent.py")
+    parser.add_argument("--local-agents", type=int, default=0, help="Start this many agents locally instead")
+    parser.add_argument("--broker-host", default="127.0.0.1", help="Redis/RabbitMQ/Pyro NS host as seen from the nodes")
+    parser.add_argument("--workers", default=",".join(map(str, DEFAULT_WORKER_COUNTS)))
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds per level")
+    parser.add_argument("--name", default=None, help="Results file name (default multi_node_<backend>)")
+    args = parser.parse_args()
+
+    worker_counts = [int(n) for n in args.workers.split(",") if n.strip()]
+    local_procs = []
+    if args.local_agents:
+        local_procs, endpoints = start_local_agents(args.local_agents)
+    else:
+        endpoints = [e.strip() for e in args.agents.split(",") if e.strip()]
+    if not endpoints:
+        parser.error("Give --agents host:port,... or --local-agents N.")
+
+    print(f"Starting multi-node scaling test ({args.backend}, workers {worker_counts}, {args.requests} tasks per level).")
+    started_at = time.time()
+    rows = []
+    target = None
+    try:
+        agents = connect_agents(endpoints)
+        target = TARGETS[args.backend](args.broker_host)
+        for num_workers in worker_counts:
+            try:
+                rows.append(run_level(target, agents, num_workers, args.requests, args.timeout))
+            except Exception as e:
+                print(f"  Error during run with {num_workers} workers: {e}")
+            time.sleep(PAUSE_BETWEEN_RUNS)
+    finally:
+        if target:
+            target.close()
+        for proc in local_procs:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    add_scaling_columns(rows)
+    scenario = {"name": args.name or f"multi_node_{args.backend}", "backend": args.backend, "agents": endpoints,
+                "broker_host": args.broker_host, "worker_counts": worker_counts, "requests": args.requests}
+    base_name = write_results(scenario, rows, started_at, csv_fields=CSV_FIELDS)
+
+    print("\n" + "=" * 70)
+    print(f"Multi-Node Scaling Summary ({args.backend}, {len(endpoints)} node(s)):")
+    print("Workers | Nodes | Time (s) | Tasks/sec  | Speedup | Efficiency | CPU util")
+    print("--------|-------|----------|------------|---------|------------|---------")
+    for row in rows:
+        print(f"{row['workers']:<7} | {row['agents']:<5} | {row['duration_s']:<8.2f} | {row['throughput_per_sec']:<10.1f} | "
+              f"{row['speedup']:<7.2f} | {row['efficiency'] * 100:<9.1f}% | {row['cpu_utilization'] * 100:.1f}%")
+    print("=" * 70)
+    print(f"Results written to {base_name}.json and {base_name}.csv")
@@ -0,0 +1,122 @@
+# normalization_benchmark.py
+# Cost of the censor matcher's normalization stage (common/text_normalizer.py) against the
+# baseline matcher, on plain texts and on texts whose insults are obfuscated, with how many of
+# those insults each engine catches.
+#
+# Dictionary: --size made-up alphabetic insults. Texts: --words words each, with probability
+# --insult-rate an insult instead of an everyday word; in the obfuscated workload each insult is
+# written one of OBFUSCATIONS ways at random. Throughput is single-threaded, over --seconds, for
+# the plain and obfuscated workloads; catch rates are also reported per obfuscation.
+#
+# The obfuscations are written the way people write them, not derived from the normalizer's own
+# tables: the leet variants include substitutions it does not undo ("1" for "l", "+" for "t",
+# "0" for "u"), and spelled-out words use mixed separators. Misses there are real misses.
+#
+# Usage: python normalization_benchmark.py [--size 10000] [--words 40] [--insult-rate 0.05]
+import argparse
+import string
+import random
+import time
+import sys
+
+from benchmark_backends import PROJECT_ROOT
+from benchmark_runner import write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.censor_matcher import REPLACEMENT, CensorMatcher
+from common.text_normalizer import TextNormalizer
+
+WORDS = ["the", "chat", "server", "message", "quick", "brown", "fox", "jumps", "over", "lazy", "dog",
+         "really", "what", "day", "again", "filter", "queue", "you", "were", "be", "flour", "2024"]
+# Common substitutes per letter, several of which the normalizer maps differently or not at all
+LEET_VARIANTS = {"a": "4@", "b": "8", "e": "3", "g": "9", "i": "1!|", "l": "1|", "o": "0", "s": "5$",
+                 "t": "7+", "u": "0v", "z": "2"}
+SEPARATORS = [".", "-", "_", " ", "*", ". ", " - "]
+OBFUSCATIONS = { # (word, rng) -> obfuscated word
+    "plain": lambda word, rng: word,
+    "upper": lambda word, rng: word.upper(),
+    "leet": lambda word, rng: "".join(rng.choice(LEET_VARIANTS[c]) if c in LEET_VARIANTS and rng.random() < 0.5 else c
+                                      for c in word),
+    "zero-for-u": lambda word, rng: word.replace("u", "0"), # "stupid" -> "st0pid"
+    "spelled": lambda word, rng: "".join(c + rng.choice(SEPARATORS) for c in word[:-1]) + word[-1],
+    "full-width": lambda word, rng: "".join(chr(ord(c) + 0xFEE0) for c in word),
+    "accents": lambda word, rng: "".join(c + "\u0301" if c in "aeiou" else c for c in word),
+}
+ENGINES = {"baseline": lambda: None, "normalized": lambda: TextNormalizer(),
+           "normalized-no-leet": lambda: TextNormalizer(leet=False)}
+CSV_FIELDS = ["workload", "engine", "tasks_per_s", "cost_vs_baseline", "caught", "inserted", "caught_share", "errors"]
+
+
+def make_dictionary(size, rng):
+    entries = set()
+    while len(entries) < size:
+        entries.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 9))))
+    return sorted(entries)
+
+def make_texts(entries, count, words, insult_rate, obfuscations, rng):
+    """Texts and the number of insults put in them, each written one of `obfuscations` ways."""
+    texts, inserted = [], 0
+    for _ in range(count):
+        parts = []
+        for _ in range(words):
+            if rng.random() < insult_rate:
+                word = rng.choice(entries)
+                parts.append(OBFUSCATIONS[rng.choice(obfuscations)](word, rng))
+                inserted += 1
+            else:
+                parts.append(rng.choice(WORDS))
+        texts.append(" ".join(parts))
+    return texts, inserted
+
+def throughput(filter_one, texts, seconds):
+    done, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for text in texts:
+            filter_one(text)
+        done += len(texts)
+    return done / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Censor matcher throughput with and without normalization.")
+    parser.add_argument("--size", type=int, default=10000, help="Dictionary entries")
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--insult-rate", type=float, default=0.05)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--name", default="normalization_benchmark")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    entries = make_dictionary(args.size, rng)
+    matchers = {name: CensorMatcher(entries, normalizer=make()) for name, make in ENGINES.items()}
+    print(f"Normalization benchmark: {args.size} insults, {args.words}-word texts, {args.insult_rate:.0%} insults.")
+    started_at = time.time()
+    rows = []
+    # Throughput on the first two; the single-obfuscation workloads only measure catch rates
+    workloads = [("plain", ["plain"], True), ("obfuscated", list(OBFUSCATIONS), True)]
+    workloads += [(name, [name], False) for name in OBFUSCATIONS if name != "plain"]
+    for workload, obfuscations, timed in workloads:
+        texts, inserted = make_texts(entries, args.texts, args.words, args.insult_rate, obfuscations, random.Random(args.seed))
+        baseline = None
+        for engine, matcher in matchers.items():
+            rate = throughput(matcher.censor, texts, args.seconds) if timed else None
+            caught = sum(matcher.censor(text).count(REPLACEMENT) for text in texts)
+            if engine == "baseline":
+                baseline = rate
+            row = {"workload": workload, "engine": engine, "tasks_per_s": rate,
+                   "cost_vs_baseline": baseline / rate if rate else None, "caught": caught, "inserted": inserted,
+                   "caught_share": caught / inserted if inserted else None, "errors": {}}
+            print(f"  {workload:<10} {engine:<18}: {f'{rate:>8.0f} tasks/s, ' if timed else ''}caught {caught}/{inserted}")
+            rows.append(row)
+
+    base_name = write_results({"name": args.name, "size": args.size, "words": args.words,
+                               "insult_rate": args.insult_rate, "texts": args.texts, "seconds": args.seconds,
+                               "seed": args.seed}, rows, started_at, csv_fields=CSV_FIELDS)
+    print("Workload   | Engine             | Tasks/s  | Time vs baseline | Caught")
+    for row in rows:
+        rate = f"{row['tasks_per_s']:>8.0f}" if row["tasks_per_s"] is not None else f"{'-':>8}"
+        cost = f"{row['cost_vs_baseline']:>15.2f}x" if row["cost_vs_baseline"] is not None else f"{'-':>16}"
+        print(f"{row['workload']:<10} | {row['engine']:<18} | {rate} | {cost} | {row['caught_share']:>6.0%}")
+    print(f"Results written to {base_name}.json and {base_name}.csv")
@@ -0,0 +1,279 @@
+# open_loop_runner.py
+# Open-loop (fixed arrival rate) load generator. Requests are scheduled at their intended send
+# times whatever the service does, and latency is measured from the intended send time, so
+# queueing delay is counted instead of hidden (no coordinated omission).
+#
+# Usage: python open_loop_runner.py [scenario.json]   (default: scenarios/open_loop_sweep.json)
+#
+# Profiles:
+#   constant / poisson: {"rate": r, "duration": d}, or "rates": [...] to sweep several rates
+#                       (one run each) and locate the saturation knee
+#   step:               {"rates": [...], "step_duration": d}, one run, one phase per rate
+#   burst:              {"phases": [{"burst": n}, {"pause": s}, {"rate": r, "duration": d}, ...]}
+import multiprocessing
+import itertools
+import threading
+import random
+import json
+import time
+import sys
+import os
+
+from benchmark_backends import PROJECT_ROOT, REQUEST_OPERATIONS, get_backend
+from benchmark_runner import BENCHMARK_DIR, write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.latency_histogram import LatencyHistogram
+
+DEFAULT_SCENARIO_FILE = os.path.join(BENCHMARK_DIR, "scenarios", "open_loop_sweep.json")
+START_DELAY = 2.0 # Seconds for the sender processes to connect before the first arrival
+KNEE_THROUGHPUT_RATIO = 0.95 # Below this fraction of the target rate, the service is saturated
+KNEE_P99_FACTOR = 10 # ...or when p99 grows beyond this multiple of the lowest rate's p99
+
+# Same shape as dynamic_filter_producer_rabbit.py: Burst 1, pause, Burst 2, pause, steady load
+DEFAULT_BURST_PHASES = [{"burst": 3000}, {"pause": 30}, {"burst": 6000}, {"pause": 20},
+                        {"rate": 50, "duration": 60}]
+
+DEFAULT_SCENARIO = {
+    "name": "open_loop",
+    "backend": "redis",
+    "operation": "submit_filter",
+    "profile": "constant",
+    "rate": 100, # Requests per second for a single constant/poisson run
+    "duration": 20, # Seconds per constant/poisson run
+    "sender_processes": 4,
+    "threads_per_process": 16, # Max outstanding requests = sender_processes * threads_per_process
+    "payloads": [{"text": "Open loop: what a LAME thing to say, you dummy! ({i})", "weight": 1}],
+    "pause_between_runs": 5,
+}
+
+CSV_FIELDS = ["backend", "operation", "profile", "phase", "target_rate", "intended", "successes",
+              "failures", "errors", "achieved_per_sec", "p50_ms", "p90_ms", "p99_ms", "p99.9_ms",
+              "max_ms", "service_p50_ms", "service_p99_ms", "send_lag_p99_ms"]
+
+
+# --- Arrival schedules ---
+def constant_arrivals(rate, duration, start=0.0):
+    return [start + i / rate for i in range(int(rate * duration))]
+
+def poisson_arrivals(rate, duration, start=0.0):
+    arrivals, t = [], random.expovariate(rate)
+    while t < duration:
+        arrivals.append(start + t)
+        t += random.expovariate(rate)
+    return arrivals
+
+def build_phases(scenario, rate=None):
+    """Returns [(label, target_rate, [arrival offsets in seconds])] for one run."""
+    profile = scenario["profile"]
+    if profile in ("constant", "poisson"):
+        rate = rate or scenario["rate"]
+        make = constant_arrivals if profile == "constant" else poisson_arrivals
+        return [(f"{rate:g}/s", rate, make(rate, scenario["duration"]))]
+    if profile == "step":
+        phases, start = [], 0.0
+        for rate in scenario["rates"]:
+            phases.append((f"step {rate:g}/s", rate, constant_arrivals(rate, scenario["step_duration"], start)))
+            start += scenario["step_duration"]
+        return phases
+    if profile == "burst":
+        phases, start = [], 0.0
+        for i, phase in enumerate(scenario.get("phases", DEFAULT_BURST_PHASES)):
+            if "burst" in phase:
+                # All sent at once, like send_batch(): arrivals are as early as they can be
+                phases.append((f"{i}: burst {phase['burst']}", None, [start] * phase["burst"]))
+            elif "pause" in phase:
+                start += phase["pause"]
+            else:
+                phases.append((f"{i}: {phase['rate']:g}/s", phase["rate"],
+                               constant_arrivals(phase["rate"], phase["duration"], start)))
+                start += phase["duration"]
+        return phases
+    raise ValueError(f"Unknown profile '{profile}'.")
+
+
+# --- Sender process ---
+class PhaseStats:
+    def __init__(self):
+        self.latency = LatencyHistogram() # From the intended send time
+        self.service = LatencyHistogram() # From the actual send time
+        self.send_lag = LatencyHistogram() # How late the request actually left
+        self.errors = {}
+        self.last_completion = 0.0
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.service.merge(other.service)
+        self.send_lag.merge(other.send_lag)
+        for name, n in other.errors.items():
+            self.errors[name] = self.errors.get(name, 0) + n
+        self.last_completion = max(self.last_completion, other.last_completion)
+        return self
+
+def _sender_thread(backend_name, operation, payload_mix, arrivals, next_arrival, start_epoch, stats):
+    texts = [entry["text"] for entry in payload_mix]
+    weights = [entry.get("weight", 1) for entry in payload_mix]
+    backend = get_backend(backend_name)()
+    try:
+        backend.open(operation)
+    except Exception as e:
+        print(f"  Sender thread could not connect: {e}")
+        return # The other threads pick up this thread's share of the arrivals
+    try:
+        while True:
+            k = next(next_arrival) # itertools.count: atomic under the GIL
+            if k >= len(arrivals):
+                break
+            phase, offset = arrivals[k]
+            intended = start_epoch + offset
+            delay = intended - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            payload = random.choices(texts, weights)[0].format(i=k, pid=os.getpid())
+            phase_stats = stats.get(phase)
+            if phase_stats is None:
+                phase_stats = stats[phase] = PhaseStats()
+            sent_at = time.time()
+            try:
+                backend.call(operation, payload)
+                done = time.time()
+                phase_stats.latency.record(done - intended)
+                phase_stats.service.record(done - sent_at)
+                phase_stats.send_lag.record(max(0.0, sent_at - intended))
+                phase_stats.last_completion = max(phase_stats.last_completion, done)
+            except Exception as e:
+                phase_stats.errors[type(e).__name__] = phase_stats.errors.get(type(e).__name__, 0) + 1
+    finally:
+        try:
+            backend.close()
+        except Exception:
+            pass
+
+def run_sender_process(args):
+    backend_name, operation, payload_mix, arrivals, start_epoch, num_threads = args
+    next_arrival = itertools.count()
+    thread_stats = [{} for _ in range(num_threads)] # Per-thread, merged at the end: no locking
+    threads = [threading.Thread(target=_sender_thread, daemon=True,
+                                args=(backend_name, operation, payload_mix, arrivals, next_arrival,
+                                      start_epoch, thread_stats[t]))
+               for t in range(num_threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    merged = {}
+    for stats in thread_stats:
+        for phase, phase_stats in stats.items():
+            merged.setdefault(phase, PhaseStats()).merge(phase_stats)
+    return merged
+
+
+# --- One run (one schedule) ---
+def run_schedule(scenario, phases):
+    num_processes = scenario["sender_processes"]
+    arrivals = sorted((offset, index) for index, (_, _, offsets) in enumerate(phases) for offset in offsets)
+    # Round-robin over the processes keeps every process's share evenly spread in time
+    per_process = [[(index, offset) for offset, index in arrivals[p::num_processes]] for p in range(num_processes)]
+    start_epoch = time.time() + START_DELAY
+    work = [(scenario["backend"], scenario["operation"], scenario["payloads"], share, start_epoch,
+             scenario["threads_per_process"]) for share in per_process]
+    with multiprocessing.Pool(processes=num_processes) as pool:
+        process_results = pool.map(run_sender_process, work)
+
+    rows = []
+    for index, (label, target_rate, offsets) in enumerate(phases):
+        stats = PhaseStats()
+        for merged in process_results:
+            if index in merged:
+                stats.merge(merged[index])
+        not_sent = len(offsets) - stats.latency.count - sum(stats.errors.values())
+        if not_sent:
+            stats.errors["NotSent"] = not_sent # No sender thread of some process managed to connect
+        failures = sum(stats.errors.values())
+        phase_start = start_epoch + (offsets[0] if offsets else 0.0)
+        span = stats.last_completion - phase_start
+        rows.append({
+            "backend": scenario["backend"],
+            "operation": scenario["operation"],
+            "profile": scenario["profile"],
+            "phase": label,
+            "target_rate": target_rate,
+            "intended": len(offsets),
+            "successes": stats.latency.count,
+            "failures": failures,
+            "errors": stats.errors,
+            "achieved_per_sec": (stats.latency.count / span) if span > 0 else 0.0,
+            **{f"p{p:g}_ms": stats.latency.percentile(p) * 1000 for p in (50, 90, 99, 99.9)},
+            "max_ms": (stats.latency.max * 1000) if stats.latency.count else float('nan'),
+            "service_p50_ms": stats.service.percentile(50) * 1000,
+            "service_p99_ms": stats.service.percentile(99) * 1000,
+            "send_lag_p99_ms": stats.send_lag.percentile(99) * 1000,
+            "histogram": stats.latency.to_dict(),
+        })
+    return rows
+
+def find_knee(rows):
+    """First swept rate where throughput falls behind the target or p99 explodes; None if none did."""
+    baseline_p99 = rows[0]["p99_ms"] if rows else float('nan')
+    for row in rows:
+        if row["achieved_per_sec"] < KNEE_THROUGHPUT_RATIO * row["target_rate"] or \
+                row["p99_ms"] > KNEE_P99_FACTOR * baseline_p99:
+            return row["target_rate"]
+    return None
+
+def load_scenario(path):
+    with open(path) as f:
+        scenario = dict(DEFAULT_SCENARIO, **json.load(f))
+    get_backend(scenario["backend"]) # Fail early on typos
+    if scenario["operation"] not in REQUEST_OPERATIONS:
+        raise ValueError(f"Open-loop runs support {REQUEST_OPERATIONS}, not '{scenario['operation']}'.")
+    return scenario
+
+def print_row(row):
+    print(f"  [{row['phase']}] {row['successes']}/{row['intended']} ok, {row['failures']} failed, "
+          f"{row['achieved_per_sec']:.1f}/sec achieved, latency p50: {row['p50_ms']:.2f}ms, "
+          f"p99: {row['p99_ms']:.2f}ms, p99.9: {row['p99.9_ms']:.2f}ms, max: {row['max_ms']:.2f}ms "
+          f"(service p99: {row['service_p99_ms']:.2f}ms, send lag p99: {row['send_lag_p99_ms']:.2f}ms)")
+
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    scenario_file = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SCENARIO_FILE
+    scenario = load_scenario(scenario_file)
+    print(f"Starting open-loop scenario '{scenario['name']}' ({scenario_file}).")
+    print(f"Backend: {scenario['backend']}, operation: {scenario['operation']}, profile: {scenario['profile']}, "
+          f"max outstanding: {scenario['sender_processes'] * scenario['threads_per_process']}")
+    print("Ensure the service under test is running (see README).")
+    print("-" * 70)
+
+    started_at = time.time()
+    rows = []
+    sweep = scenario["profile"] in ("constant", "poisson") and "rates" in scenario
+    runs = [build_phases(scenario, rate) for rate in scenario["rates"]] if sweep else [build_phases(scenario)]
+    for phases in runs:
+        print(f"\nRunning {', '.join(label for label, _, _ in phases)}...")
+        try:
+            run_rows = run_schedule(scenario, phases)
+        except Exception as e:
+            print(f"  Error during run: {e}")
+            continue
+        for row in run_rows:
+            print_row(row)
+        rows.extend(run_rows)
+        if sweep:
+            time.sleep(scenario["pause_between_runs"]) # Let the backlog drain between rates
+
+    base_name = write_results(scenario, rows, started_at, CSV_FIELDS)
+    print("\n" + "=" * 70)
+    print(f"Open-loop Summary ({scenario['name']}, {scenario['backend']} {scenario['operation']}):")
+    print("Phase            | Target/s | Achieved/s | p50 ms    | p99 ms    | p99.9 ms  | Fail")
+    print("-----------------|----------|------------|-----------|-----------|-----------|------")
+    for row in rows:
+        target = f"{row['target_rate']:g}" if row["target_rate"] else "burst"
+        print(f"{row['phase']:<16} | {target:<8} | {row['achieved_per_sec']:<10.1f} | {row['p50_ms']:<9.2f} | "
+              f"{row['p99_ms']:<9.2f} | {row['p99.9_ms']:<9.2f} | {row['failures']}")
+    if sweep:
+        knee = find_knee(rows)
+        print(f"Saturation knee: {f'~{knee:g} requests/sec' if knee else 'not reached, try higher rates'}")
+    print("=" * 70)
+    print(f"Results written to {base_name}.json and {base_name}.csv")
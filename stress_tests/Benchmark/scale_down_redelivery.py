@@ -0,0 +1,136 @@
+# scale_down_redelivery.py
+# Redeliveries caused by scaling down one RabbitMQ filter worker mid-backlog, with and without
+# the worker's drain protocol (FILTER_WORKER_DRAIN=1 / 0).
+#
+# Each trial starts N workers with a raised prefetch, queues a backlog, stops one worker (SIGTERM,
+# as the dynamic scaler does) once a share of the backlog is done, then collects every result and
+# counts results flagged as redelivered and duplicate task ids (work done twice).
+#
+# Usage: python scale_down_redelivery.py [--workers 3] [--prefetch 50] [--tasks 5000] [--trials 3]
+# RabbitMQ must be running; nothing else should consume the filter queues during the run.
+import subprocess
+import argparse
+import json
+import time
+import sys
+import os
+
+from benchmark_backends import PROJECT_ROOT
+from benchmark_runner import write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+from common.task_envelope import encode_task
+
+PYTHON_EXECUTABLE = os.environ.get("PYTHON_EXECUTABLE", sys.executable)
+WORKER_SCRIPT = os.path.join(PROJECT_ROOT, "rabbitmq_filter_service", "filter_worker_rabbit.py")
+TASK_QUEUE_NAME = 'filter_task_work_queue'
+RESULTS_QUEUE_NAME = 'filter_results_data_queue'
+STOP_AT_FRACTION = 0.3 # Share of the backlog finished before one worker is stopped
+READY_TIMEOUT = 30
+STOP_TIMEOUT = 30 # Seconds for the stopped worker to exit before SIGKILL
+COLLECT_TIMEOUT = 120
+CSV_FIELDS = ["mode", "trial", "workers", "prefetch", "tasks", "results", "redelivered", "duplicates",
+              "lost", "stop_s", "errors"]
+
+
+def result_count(channel):
+    return channel.queue_declare(queue=RESULTS_QUEUE_NAME, durable=True, passive=True).method.message_count
+
+def stop(proc, timeout):
+    proc.terminate()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def run_trial(pika, channel, args, drain, trial):
+    for queue in (TASK_QUEUE_NAME, RESULTS_QUEUE_NAME):
+        channel.queue_declare(queue=queue, durable=True)
+        channel.queue_purge(queue=queue)
+    env = dict(os.environ, RABBITMQ_HOST=args.broker_host, RABBITMQ_PREFETCH=str(args.prefetch),
+               FILTER_WORKER_DRAIN="1" if drain else "0")
+    readiness = ReadinessPipe()
+    workers = [readiness.popen([PYTHON_EXECUTABLE, WORKER_SCRIPT], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT) for _ in range(args.workers)]
+    try:
+        if readiness.wait(args.workers, READY_TIMEOUT, workers) < args.workers:
+            raise RuntimeError("workers did not become ready")
+        properties = pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
+        for i in range(args.tasks):
+            channel.basic_publish(exchange='', routing_key=TASK_QUEUE_NAME, properties=properties,
+                                  body=encode_task(f"Scale-down test: a stupid task number {i}"))
+
+        while result_count(channel) < args.tasks * STOP_AT_FRACTION:
+            time.sleep(0.01)
+        stop_started = time.perf_counter()
+        stop(workers[0], STOP_TIMEOUT) # Same signal the dynamic scaler sends
+        stop_seconds = time.perf_counter() - stop_started
+
+        seen, duplicates, redelivered, results = set(), 0, 0, 0
+        deadline = time.time() + COLLECT_TIMEOUT
+        channel.basic_qos(prefetch_count=500)
+        for method_frame, _, body in channel.consume(RESULTS_QUEUE_NAME, auto_ack=True, inactivity_timeout=1.0):
+            if method_frame:
+                record = json.loads(body)
+                results += 1
+                redelivered += bool(record.get("redelivered"))
+                if record.get("task_id") in seen:
+                    duplicates += 1
+                seen.add(record.get("task_id"))
+            if len(seen) >= args.tasks or time.time() > deadline:
+                break
+        channel.cancel()
+    finally:
+        for proc in workers:
+            if proc.poll() is None:
+                stop(proc, 5)
+        readiness.close()
+
+    lost = args.tasks - len(seen)
+    mode = "drain" if drain else "immediate"
+    print(f"  {mode:<9} trial {trial + 1}: {results} results, {redelivered} redelivered, {duplicates} duplicates, "
+          f"{lost} missing; stopped worker exited in {stop_seconds:.2f}s")
+    return {"mode": mode, "trial": trial + 1, "workers": args.workers, "prefetch": args.prefetch, "tasks": args.tasks,
+            "results": results, "redelivered": redelivered, "duplicates": duplicates, "lost": lost,
+            "stop_s": stop_seconds, "errors": {} if lost == 0 else {"Missing": lost}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Redeliveries caused by a scale-down, with and without draining.")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--prefetch", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--broker-host", default=os.environ.get("RABBITMQ_HOST", "localhost"))
+    parser.add_argument("--name", default="scale_down_redelivery")
+    args = parser.parse_args()
+
+    import pika
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=args.broker_host))
+    channel = connection.channel()
+    print(f"Scale-down redelivery test: {args.workers} workers, prefetch {args.prefetch}, {args.tasks} tasks, "
+          f"one worker stopped at {STOP_AT_FRACTION:.0%} of the backlog.")
+    started_at = time.time()
+    rows = []
+    try:
+        for drain in (False, True):
+            for trial in range(args.trials):
+                try:
+                    rows.append(run_trial(pika, channel, args, drain, trial))
+                except Exception as e:
+                    print(f"  Trial failed: {e}")
+    finally:
+        connection.close()
+
+    base_name = write_results({"name": args.name, "workers": args.workers, "prefetch": args.prefetch,
+                               "tasks": args.tasks, "trials": args.trials}, rows, started_at, csv_fields=CSV_FIELDS)
+    print("Mode      | Redelivered (avg) | Duplicates (avg) | Stop time (avg s)")
+    for mode in ("immediate", "drain"):
+        mode_rows = [row for row in rows if row["mode"] == mode]
+        if mode_rows:
+            n = len(mode_rows)
+            print(f"{mode:<9} | {sum(r['redelivered'] for r in mode_rows) / n:>17.1f} | "
+                  f"{sum(r['duplicates'] for r in mode_rows) / n:>16.1f} | {sum(r['stop_s'] for r in mode_rows) / n:>8.2f}")
+    print(f"Results written to {base_name}.json and {base_name}.csv")
@@ -0,0 +1,123 @@
+# scale_up_latency.py
+# Time to capacity of one scale-up step for the RabbitMQ filter workers: from the scaler's
+# decision until the broker sees one more consumer on the task queue.
+#   cold: Popen a new worker (interpreter start, imports, AMQP handshake, basic_consume)
+#   warm: SIGUSR2 to a standby worker from the warm pool (just basic_consume)
+#
+# Usage: python scale_up_latency.py [--trials 10] [--broker-host localhost] [--name scale_up_latency]
+# RabbitMQ must be running; no other consumers should join the task queue during the run.
+import subprocess
+import argparse
+import statistics
+import signal
+import time
+import sys
+import os
+
+from benchmark_backends import PROJECT_ROOT
+from benchmark_runner import write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+
+PYTHON_EXECUTABLE = os.environ.get("PYTHON_EXECUTABLE", sys.executable)
+WORKER_SCRIPT = os.path.join(PROJECT_ROOT, "rabbitmq_filter_service", "filter_worker_rabbit.py")
+TASK_QUEUE_NAME = 'filter_task_work_queue'
+CONSUMER_POLL = 0.002 # Seconds between consumer-count checks (the measurement's resolution)
+CAPACITY_TIMEOUT = 30 # Seconds before a trial counts as failed
+CSV_FIELDS = ["mode", "trials", "completed", "min_ms", "median_ms", "p90_ms", "max_ms", "errors"]
+
+
+def consumer_count(channel):
+    return channel.queue_declare(queue=TASK_QUEUE_NAME, durable=True, passive=True).method.consumer_count
+
+def wait_for_consumers(channel, target, timeout=CAPACITY_TIMEOUT):
+    """perf_counter time the queue reached `target` consumers, or None on timeout."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if consumer_count(channel) >= target:
+            return time.perf_counter()
+        time.sleep(CONSUMER_POLL)
+    return None
+
+def stop_worker(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def worker_env(broker_host, standby):
+    return dict(os.environ, RABBITMQ_HOST=broker_host, FILTER_WORKER_STANDBY="1" if standby else "0")
+
+def cold_trial(channel, broker_host):
+    base = consumer_count(channel)
+    start = time.perf_counter()
+    proc = subprocess.Popen([PYTHON_EXECUTABLE, WORKER_SCRIPT], env=worker_env(broker_host, False),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    reached = wait_for_consumers(channel, base + 1)
+    stop_worker(proc)
+    return (reached - start) if reached else None
+
+def warm_trial(channel, broker_host):
+    with ReadinessPipe() as readiness:
+        proc = readiness.popen([PYTHON_EXECUTABLE, WORKER_SCRIPT], env=worker_env(broker_host, True),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+        if readiness.wait(1, CAPACITY_TIMEOUT, [proc]) < 1: # Pool warm-up is not part of the timing
+            stop_worker(proc)
+            return None
+    base = consumer_count(channel)
+    start = time.perf_counter()
+    os.kill(proc.pid, signal.SIGUSR2)
+    reached = wait_for_consumers(channel, base + 1)
+    stop_worker(proc)
+    return (reached - start) if reached else None
+
+def summarize(mode, samples, trials):
+    done = sorted(s * 1000 for s in samples if s is not None)
+    row = {"mode": mode, "trials": trials, "completed": len(done), "samples_ms": done,
+           "errors": {} if len(done) == trials else {"Timeout": trials - len(done)}}
+    if done:
+        row.update({"min_ms": done[0], "median_ms": statistics.median(done),
+                    "p90_ms": done[min(len(done) - 1, int(len(done) * 0.9))], "max_ms": done[-1]})
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start vs warm-pool activation latency of RabbitMQ filter workers.")
+    parser.add_argument("--trials", type=int, default=10)
+    parser.add_argument("--broker-host", default=os.environ.get("RABBITMQ_HOST", "localhost"))
+    parser.add_argument("--name", default="scale_up_latency")
+    args = parser.parse_args()
+    if not hasattr(signal, "SIGUSR2"):
+        sys.exit("Warm-pool activation needs SIGUSR2 (POSIX only).")
+
+    import pika
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=args.broker_host))
+    channel = connection.channel()
+    channel.queue_declare(queue=TASK_QUEUE_NAME, durable=True)
+
+    print(f"Scale-up latency, {args.trials} trials per mode (decision -> broker sees the new consumer):")
+    started_at = time.time()
+    rows = []
+    try:
+        for mode, trial in (("cold", cold_trial), ("warm", warm_trial)):
+            samples = []
+            for i in range(args.trials):
+                samples.append(trial(channel, args.broker_host))
+                time.sleep(0.2) # Let the broker drop the stopped consumer
+            rows.append(summarize(mode, samples, args.trials))
+    finally:
+        connection.close()
+
+    base_name = write_results({"name": args.name, "broker_host": args.broker_host, "trials": args.trials},
+                              rows, started_at, csv_fields=CSV_FIELDS)
+    print("Mode | Done  | Min ms   | Median ms | p90 ms   | Max ms")
+    for row in rows:
+        if row["completed"]:
+            print(f"{row['mode']:<4} | {row['completed']:>2}/{row['trials']:<2} | {row['min_ms']:>8.1f} | "
+                  f"{row['median_ms']:>9.1f} | {row['p90_ms']:>8.1f} | {row['max_ms']:>8.1f}")
+        else:
+            print(f"{row['mode']:<4} | 0/{row['trials']} | (no trial reached capacity)")
+    print(f"Results written to {base_name}.json and {base_name}.csv")
@@ -0,0 +1,186 @@
+# scaling_policy_replay.py
+# Offline comparison of the dynamic scaler's policies (common/scaling_policies.py): replays one
+# arrival trace through a simulated queue + scaler per policy and reports SLA misses against the
+# worker-seconds spent.
+#
+# Traces:
+#   --log dynamic_scaler_log.csv   a recorded scaler log. Arrivals come from its Arrival_Rate column
+#                                  when present, otherwise they are inferred from backlog changes and
+#                                  the active workers' capacity (idle periods then replay as no load).
+#   --trace producer [--repeat N]  the burst/pause/steady scenario of dynamic_filter_producer_rabbit.py,
+#                                  N times back to back (a repeating pattern the holt policy can learn
+#                                  with --season-length auto).
+#
+# Usage: python scaling_policy_replay.py --trace producer --repeat 4 --season-length auto
+#        python scaling_policy_replay.py --log ../../rabbitmq_filter_service/dynamic_scaler_log.csv
+import argparse
+import datetime
+import math
+import csv
+import sys
+import os
+
+from benchmark_backends import PROJECT_ROOT
+from benchmark_runner import write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.scaling_policies import ArrivalRateEstimator, POLICIES, make_policy
+
+DEFAULT_LOG = os.path.join(PROJECT_ROOT, "rabbitmq_filter_service", "dynamic_scaler_log.csv")
+SIM_STEP = 0.5 # Seconds per simulation step inside a poll interval
+PRODUCER_SEND_RATE = 2000 # Messages/second the producer publishes a batch at
+CSV_FIELDS = ["policy", "worker_seconds", "sla_miss_seconds", "late_tasks", "late_share", "max_backlog",
+              "mean_workers", "scale_actions", "errors"]
+
+# Defaults mirror dynamic_scaler_rabbit.py
+DEFAULTS = {"capacity": math.ceil(1 / (15.25 / 10000)), "min_workers": 1, "max_workers": 3,
+            "target_response_time": 2.0, "arrival_rate_estimate": 150, "interval": 5.0,
+            "cooldown": 15.0, "lead_time": 2.0}
+
+
+# --- Traces: lists of (seconds, arrivals) per poll interval ---
+def producer_trace(interval, repeat=1):
+    """dynamic_filter_producer_rabbit.py: burst 3000, 30s pause, burst 6000, 20s pause,
+    then 100 messages every 2s for 60s, then 30s idle, rounded up to a whole number of polls."""
+    events = [] # (time, messages) at PRODUCER_SEND_RATE
+    t = 0.0
+    for _ in range(repeat):
+        for messages, pause in ((3000, 30), (6000, 20)):
+            events.append((t, messages))
+            t += messages / PRODUCER_SEND_RATE + pause
+        for _ in range(30):
+            events.append((t, 100))
+            t += 100 / PRODUCER_SEND_RATE + 2
+        t += 30 # Idle tail before the next cycle
+        t = math.ceil(t / interval) * interval # Cycles start on a poll, so a seasonal model can line them up
+    per_step = {}
+    for start, messages in events: # Spread each batch over its send time
+        steps = max(1, math.ceil(messages / PRODUCER_SEND_RATE / SIM_STEP))
+        for k in range(steps):
+            per_step[int(start / SIM_STEP) + k] = per_step.get(int(start / SIM_STEP) + k, 0) + messages / steps
+    steps_per_poll = int(round(interval / SIM_STEP))
+    polls = math.ceil((t / SIM_STEP) / steps_per_poll)
+    return [(interval, [per_step.get(p * steps_per_poll + k, 0.0) for k in range(steps_per_poll)]) for p in range(polls)]
+
+def read_scaler_log(path):
+    """(time, backlog, active_workers, arrival_rate or None) rows of a scaler log; other lines skipped."""
+    rows = []
+    with open(path, newline="") as f:
+        for fields in csv.reader(f):
+            if len(fields) < 5 or not fields[1].strip().lstrip("-").isdigit():
+                continue # Header, config, INFO/ERROR lines
+            try:
+                when = datetime.datetime.strptime(fields[0], "%Y-%m-%d %H:%M:%S").timestamp()
+            except ValueError:
+                continue
+            rate = float(fields[5]) if len(fields) > 5 and fields[5].strip() else None
+            rows.append((when, int(fields[1]), int(fields[2]), rate))
+    return rows
+
+def log_trace(rows, capacity):
+    """Per-interval arrivals from a scaler log, spread evenly over each interval."""
+    estimator = ArrivalRateEstimator()
+    intervals = []
+    previous_time, previous_workers = None, rows[0][2]
+    for when, backlog, workers, logged_rate in rows:
+        inferred = estimator.update(when, backlog, service_capacity=previous_workers * capacity)
+        if previous_time is not None and when > previous_time:
+            rate = logged_rate if logged_rate is not None else (inferred or 0.0)
+            seconds = when - previous_time
+            steps = max(1, int(round(seconds / SIM_STEP)))
+            intervals.append((seconds, [rate * seconds / steps] * steps))
+        previous_time, previous_workers = when, workers
+    return intervals
+
+
+# --- Simulation ---
+def simulate(policy, trace, params, initial_backlog=0.0):
+    """Fluid queue with the scaler's rules: one worker added/removed per decision, a cooldown
+    between actions, and lead_time before a started worker serves (it is paid for meanwhile)."""
+    capacity = params["capacity"]
+    backlog, workers, starting = initial_backlog, params["min_workers"], [] # starting: ready-at times
+    estimator = ArrivalRateEstimator()
+    now, completed, last_action = 0.0, 0.0, -math.inf
+    worker_seconds = miss_seconds = late = total = 0.0
+    max_backlog, actions, worker_time = backlog, 0, 0.0
+    for seconds, arrivals in trace:
+        rate = estimator.update(now, backlog, completed)
+        desired = policy.desired_workers(int(backlog), rate)
+        planned = workers + len(starting)
+        if now - last_action >= params["cooldown"] and desired != planned:
+            if desired > planned:
+                starting.append(now + params["lead_time"])
+            elif workers > params["min_workers"]:
+                workers -= 1
+            last_action, actions = now, actions + 1
+        step = seconds / len(arrivals)
+        for arrived in arrivals:
+            now += step
+            workers += sum(1 for ready in starting if ready <= now)
+            starting = [ready for ready in starting if ready > now]
+            backlog += arrived
+            served = min(backlog, workers * capacity * step)
+            backlog -= served
+            completed += served
+            total += arrived
+            worker_seconds += (workers + len(starting)) * step
+            worker_time += workers * step
+            max_backlog = max(max_backlog, backlog)
+            # Expected wait of a task arriving now: the backlog ahead of it at the current service rate
+            if backlog > 0 and (workers == 0 or backlog / (workers * capacity) > params["target_response_time"]):
+                miss_seconds += step
+                late += arrived
+    duration = sum(seconds for seconds, _ in trace)
+    return {"policy": policy.name, "worker_seconds": worker_seconds, "sla_miss_seconds": miss_seconds,
+            "late_tasks": late, "late_share": late / total if total else 0.0, "max_backlog": max_backlog,
+            "mean_workers": worker_time / duration if duration else 0.0, "scale_actions": actions,
+            "tasks": total, "errors": {}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays a load trace through each scaling policy.")
+    parser.add_argument("--log", default=None, help=f"Scaler log to replay (default trace: {DEFAULT_LOG})")
+    parser.add_argument("--trace", choices=["log", "producer"], default="log")
+    parser.add_argument("--repeat", type=int, default=1, help="Producer scenario cycles")
+    parser.add_argument("--policies", default=",".join(POLICIES))
+    parser.add_argument("--season-length", default="0", help="Holt-Winters season in polls, or 'auto' (one producer cycle)")
+    for name, value in DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--name", default="scaling_policy_replay")
+    args = parser.parse_args()
+    params = {name: getattr(args, name) for name in DEFAULTS}
+
+    if args.trace == "producer":
+        trace = producer_trace(args.interval, args.repeat)
+        source = f"producer scenario x{args.repeat}"
+        cycle_polls = len(producer_trace(args.interval, 1))
+    else:
+        log_path = args.log or DEFAULT_LOG
+        rows = read_scaler_log(log_path)
+        if len(rows) < 2:
+            sys.exit(f"No scaler rows found in {log_path}.")
+        trace = log_trace(rows, params["capacity"])
+        source = f"{os.path.basename(log_path)} ({len(rows)} polls)"
+        cycle_polls = 0
+    season_length = cycle_polls if args.season_length == "auto" else int(args.season_length)
+    total_tasks = sum(sum(arrivals) for _, arrivals in trace)
+    if total_tasks == 0:
+        print("Note: the trace has no arrivals beyond what one worker absorbed; all policies will tie.")
+
+    print(f"Replaying {source}: {sum(s for s, _ in trace):.0f}s, {total_tasks:.0f} tasks, "
+          f"C={params['capacity']}/s per worker, SLA {params['target_response_time']}s, workers "
+          f"{params['min_workers']}-{params['max_workers']}, season {season_length} polls")
+    results = []
+    for name in [p.strip() for p in args.policies.split(",") if p.strip()]:
+        policy_params = {key: value for key, value in params.items() if key != "capacity"}
+        policy = make_policy(name, params["capacity"], season_length=season_length, **policy_params)
+        results.append(simulate(policy, trace, params))
+
+    scenario = dict(params, name=args.name, source=source, season_length=season_length)
+    base_name = write_results(scenario, results, datetime.datetime.now().timestamp(), csv_fields=CSV_FIELDS)
+    print("Policy   | Worker-s | SLA miss s | Late tasks      | Max backlog | Mean workers | Actions")
+    for row in results:
+        print(f"{row['policy']:<8} | {row['worker_seconds']:>8.0f} | {row['sla_miss_seconds']:>10.1f} | "
+              f"{row['late_tasks']:>7.0f} ({row['late_share'] * 100:>4.1f}%) | {row['max_backlog']:>11.0f} | "
+              f"{row['mean_workers']:>12.2f} | {row['scale_actions']:>7}")
+    print(f"Results written to {base_name}.json and {base_name}.csv")
@@ -0,0 +1,155 @@
+# shared_cache_benchmark.py
+# Throughput of the Redis filter workers with the shared result cache off, L2 only (Redis) and
+# L1 + L2, at several repeat ratios of the submitted texts.
+#
+# Workload: --tasks texts of --words words each (some of them insults). With repeat ratio r, each
+# text is, with probability r, a repeat of an earlier distinct text of Zipf-distributed rank
+# (rank k, oldest first, with probability ~1/k: a few hot texts and a long tail, as in chat
+# traffic), otherwise a new text. Each run starts from an empty cache.
+#
+# Usage: python shared_cache_benchmark.py [--workers 4] [--batch 16] [--tasks 20000] [--words 40]
+#        [--repeat-ratios 0,0.5,0.9,0.99]
+# Redis (>= 6.2 for --batch > 1) must be running; nothing else should use the filter queues.
+import subprocess
+import argparse
+import random
+import json
+import time
+import sys
+import os
+
+from benchmark_backends import PROJECT_ROOT
+from benchmark_runner import write_results
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+from common.result_cache import SHARED_KEY_PREFIX
+from common.task_envelope import encode_task
+
+PYTHON_EXECUTABLE = os.environ.get("PYTHON_EXECUTABLE", sys.executable)
+WORKER_SCRIPT = os.path.join(PROJECT_ROOT, "redis_filter_service", "filter_worker_redis.py")
+TASK_QUEUE_NAME = 'filter_work_queue'
+RESULTS_LIST_NAME = 'filtered_texts_results'
+MODES = {"off": {"FILTER_SHARED_CACHE": "0"},
+         "l2": {"FILTER_SHARED_CACHE": "1", "FILTER_CACHE_MB": "0"},
+         "l1+l2": {"FILTER_SHARED_CACHE": "1"}}
+WORDS = ["the", "chat", "server", "message", "quick", "brown", "fox", "jumps", "over", "lazy", "dog",
+         "really", "what", "a", "day", "again", "filter", "queue", "stupid", "idiot", "lame", "heck"]
+READY_TIMEOUT = 30
+COLLECT_TIMEOUT = 300
+CSV_FIELDS = ["mode", "repeat_ratio", "tasks", "distinct_texts", "seconds", "tasks_per_s", "l1_hits", "l2_hits",
+              "computed", "speedup_vs_off", "errors"]
+
+
+def make_workload(tasks, words, repeat_ratio, seed):
+    rng = random.Random(seed)
+    texts, distinct = [], []
+    for i in range(tasks):
+        if distinct and rng.random() < repeat_ratio:
+            texts.append(distinct[int(len(distinct) ** rng.random()) - 1]) # Log-uniform rank: P(k) ~ 1/k
+        else:
+            distinct.append(" ".join(rng.choice(WORDS) for _ in range(words)) + f" #{i}")
+            texts.append(distinct[-1])
+    return texts
+
+def clear(r):
+    r.delete(TASK_QUEUE_NAME, RESULTS_LIST_NAME)
+    keys = list(r.scan_iter(match=f"{SHARED_KEY_PREFIX}*", count=1000))
+    for i in range(0, len(keys), 1000):
+        r.delete(*keys[i:i + 1000])
+
+def stop(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def run(r, args, mode, repeat_ratio, texts):
+    clear(r)
+    env = dict(os.environ, REDIS_HOST=args.redis_host, FILTER_WORKER_BATCH=str(args.batch), **MODES[mode])
+    readiness = ReadinessPipe()
+    workers = [readiness.popen([PYTHON_EXECUTABLE, WORKER_SCRIPT], env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.STDOUT) for _ in range(args.workers)]
+    sources, received = {}, 0
+    try:
+        if readiness.wait(args.workers, READY_TIMEOUT, workers) < args.workers:
+            raise RuntimeError("workers did not become ready")
+        encoded = [encode_task(text) for text in texts]
+        started = time.perf_counter()
+        pipe = r.pipeline(transaction=False)
+        for i in range(0, len(encoded), 1000):
+            pipe.rpush(TASK_QUEUE_NAME, *encoded[i:i + 1000])
+        pipe.execute()
+        finished = started
+        deadline = time.time() + COLLECT_TIMEOUT
+        while received < len(texts) and time.time() < deadline:
+            item = r.blpop(RESULTS_LIST_NAME, timeout=1)
+            if item:
+                finished = time.perf_counter()
+                received += 1
+                source = json.loads(item[1]).get("cached") or "computed"
+                sources[source] = sources.get(source, 0) + 1
+    finally:
+        for proc in workers:
+            stop(proc)
+        readiness.close()
+
+    seconds = finished - started
+    row = {"mode": mode, "repeat_ratio": repeat_ratio, "tasks": len(texts), "distinct_texts": len(set(texts)),
+           "seconds": seconds, "tasks_per_s": received / seconds if seconds > 0 else 0.0,
+           "l1_hits": sources.get("l1", 0), "l2_hits": sources.get("l2", 0), "computed": sources.get("computed", 0),
+           "errors": {} if received == len(texts) else {"Missing": len(texts) - received}}
+    print(f"  {mode:<6} repeat {repeat_ratio:<5}: {row['tasks_per_s']:>8.0f} tasks/s, L1 {row['l1_hits']}, "
+          f"L2 {row['l2_hits']}, computed {row['computed']}")
+    return row
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Redis filter workers with and without the shared result cache.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--words", type=int, default=40)
+    parser.add_argument("--repeat-ratios", default="0,0.5,0.9,0.99")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--redis-host", default=os.environ.get("REDIS_HOST", "localhost"))
+    parser.add_argument("--name", default="shared_cache_benchmark")
+    args = parser.parse_args()
+
+    import redis
+    r = redis.Redis(host=args.redis_host, port=6379, db=0, decode_responses=True)
+    ratios = [float(x) for x in args.repeat_ratios.split(",")]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    print(f"Shared cache benchmark: {args.workers} workers, batch {args.batch}, {args.tasks} tasks of "
+          f"{args.words} words, repeat ratios {ratios}.")
+    started_at = time.time()
+    rows = []
+    try:
+        for ratio in ratios:
+            texts = make_workload(args.tasks, args.words, ratio, args.seed)
+            baseline = None
+            for mode in modes:
+                try:
+                    row = run(r, args, mode, ratio, texts)
+                except Exception as e:
+                    print(f"  {mode} at repeat {ratio} failed: {e}")
+                    continue
+                if mode == "off":
+                    baseline = row["tasks_per_s"]
+                row["speedup_vs_off"] = row["tasks_per_s"] / baseline if baseline else None
+                rows.append(row)
+    finally:
+        clear(r)
+
+    base_name = write_results({"name": args.name, "workers": args.workers, "batch": args.batch, "tasks": args.tasks,
+                               "words": args.words, "repeat_ratios": ratios, "seed": args.seed},
+                              rows, started_at, csv_fields=CSV_FIELDS)
+    print("Repeat | Mode   | Tasks/s  | vs off | L1 hits | L2 hits | Computed")
+    for row in rows:
+        speedup = f"{row['speedup_vs_off']:.2f}x" if row.get("speedup_vs_off") else "  -  "
+        print(f"{row['repeat_ratio']:<6} | {row['mode']:<6} | {row['tasks_per_s']:>8.0f} | {speedup:>6} | "
+              f"{row['l1_hits']:>7} | {row['l2_hits']:>7} | {row['computed']:>8}")
+    print(f"Results written to {base_name}.json and {base_name}.csv")
@@ -0,0 +1,153 @@
+# worker_agent.py
+# Node agent for multi_node_runner.py: runs on every host that should take part in a
+# multi-node scaling test and starts/stops filter worker processes on request (XML-RPC).
+#
+# Usage (on each node, from a checkout of this repo):
+#   python worker_agent.py [--host 0.0.0.0] [--port 9101] [--name node-a] [--worker-log DIR]
+# Workers inherit this agent's environment plus whatever the orchestrator sends
+# (REDIS_HOST / RABBITMQ_HOST / PYRO_NS_HOST... pointing at the shared broker).
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+import subprocess
+import threading
+import argparse
+import signal
+import socket
+import time
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+
+PYTHON_EXECUTABLE = os.environ.get("PYTHON_EXECUTABLE", sys.executable)
+WORKER_SCRIPTS = {
+    "redis": os.path.join(PROJECT_ROOT, "redis_filter_service", "filter_worker_redis.py"),
+    "rabbitmq": os.path.join(PROJECT_ROOT, "rabbitmq_filter_service", "filter_worker_rabbit.py"),
+    "pyro": os.path.join(PROJECT_ROOT, "pyro_filter_service", "filter_worker_pyro.py"),
+}
+READY_TIMEOUT = 30 # Seconds for launched workers to report ready (connected / registered)
+STOP_TIMEOUT = 5 # Seconds to wait after SIGINT before SIGKILL
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class RequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/RPC2',)
+    def log_message(self, format, *args):
+        pass # One line per orchestrator call is just noise
+
+
+def restore_sigint():
+    """In the child: an agent started in the background ignores SIGINT, and children would inherit that."""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+def process_cpu_seconds(pid):
+    """User + system CPU time of a process from /proc (Linux); None elsewhere or once it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS # utime, stime
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class WorkerAgent:
+    def __init__(self, name, worker_log_dir=None):
+        self.name = name
+        self.worker_log_dir = worker_log_dir
+        self._workers = [] # (Popen, log file or None)
+        self._lock = threading.Lock()
+
+    def ping(self):
+        with self._lock:
+            alive = sum(1 for proc, _ in self._workers if proc.poll() is None)
+        return {"agent": self.name, "host": socket.gethostname(), "cpus": os.cpu_count(), "workers": alive}
+
+    def start_workers(self, backend, count, env_overrides):
+        """Launches `count` workers of `backend` and blocks until they report ready (or READY_TIMEOUT)."""
+        if backend not in WORKER_SCRIPTS:
+            return {"error": f"Unknown backend '{backend}'"}
+        env = dict(os.environ, **{key: str(value) for key, value in env_overrides.items()})
+        started = []
+        readiness = ReadinessPipe()
+        launched_at = time.perf_counter()
+        with self._lock:
+            for i in range(count):
+                log_file = None
+                if self.worker_log_dir:
+                    os.makedirs(self.worker_log_dir, exist_ok=True)
+                    log_file = open(os.path.join(self.worker_log_dir, f"{self.name}_{backend}_{len(self._workers)}.log"), "w")
+                # Workers print a few lines per task; that console I/O must not be what we measure
+                proc = readiness.popen([PYTHON_EXECUTABLE, WORKER_SCRIPTS[backend]], env=env,
+                                       stdout=log_file or subprocess.DEVNULL, stderr=subprocess.STDOUT,
+                                       preexec_fn=restore_sigint if os.name == "posix" else None)
+                self._workers.append((proc, log_file))
+                started.append(proc)
+        ready = readiness.wait(len(started), READY_TIMEOUT, started)
+        startup_seconds = time.perf_counter() - launched_at
+        readiness.close()
+        alive = [proc.pid for proc in started if proc.poll() is None]
+        print(f"[Agent {self.name}] Started {len(started)} {backend} worker(s), {ready} ready after {startup_seconds:.2f}s, "
+              f"{len(alive)} alive.")
+        return {"started": len(started), "ready": ready, "alive": len(alive), "pids": alive, "startup_s": startup_seconds}
+
+    def get_stats(self):
+        """Per-worker liveness and CPU seconds, for the orchestrator's efficiency report."""
+        with self._lock:
+            workers = list(self._workers)
+        stats = []
+        for proc, _ in workers:
+            stats.append({"pid": proc.pid, "alive": proc.poll() is None, "returncode": proc.returncode,
+                          "cpu_seconds": process_cpu_seconds(proc.pid)})
+        cpu = [s["cpu_seconds"] for s in stats if s["cpu_seconds"] is not None]
+        return {"agent": self.name, "workers": stats, "alive": sum(1 for s in stats if s["alive"]),
+                "cpu_seconds": sum(cpu) if cpu else None}
+
+    def stop_workers(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for proc, _ in workers:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGINT) # Like Ctrl+C: Pyro workers unregister from the dispatcher
+        for proc, log_file in workers:
+            try:
+                proc.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+            if log_file:
+                log_file.close()
+        print(f"[Agent {self.name}] Stopped {len(workers)} worker(s).")
+        return len(workers)
+
+
+def run_agent(host, port, name, worker_log_dir=None):
+    server = SimpleXMLRPCServer((host, port), requestHandler=RequestHandler, allow_none=True)
+    agent = WorkerAgent(name, worker_log_dir)
+    server.register_instance(agent)
+
+    def shutdown():
+        agent.stop_workers()
+        threading.Thread(target=server.shutdown, daemon=True).start() # Can't shut down from inside a request
+        return True
+    server.register_function(shutdown)
+
+    print(f"[Agent {name}] Listening on {host}:{port}/RPC2 (workers from {PROJECT_ROOT}).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n[Agent {name}] Shutting down...")
+    finally:
+        agent.stop_workers()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Starts filter workers on this node for multi_node_runner.py.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (0.0.0.0 for remote orchestrators)")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--name", default=None, help="Agent name in reports (default: hostname:port)")
+    parser.add_argument("--worker-log", default=None, help="Directory for worker output (default: discarded)")
+    args = parser.parse_args()
+    run_agent(args.host, args.port, args.name or f"{socket.gethostname()}:{args.port}", args.worker_log)
@@ -0,0 +1,181 @@
+# fanout_common.py
+# Shared driver for the *_broadcast_fanout.py benchmarks: starts the backend's broadcaster at a
+# given rate, hosts N lightweight subscribers spread over a few processes, and reports delivery
+# latency percentiles and delivered messages/sec.
+import multiprocessing
+import subprocess
+import time
+import os
+import sys
+
+PYTHON_EXECUTABLE = "python" # SET TO VENV PYTHON e.g., "/path/to/SD-env/bin/python"
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.broadcast_payload import decode_broadcast
+
+SUBSCRIBER_COUNTS = [1, 10, 100, 1000]
+BROADCAST_RATES = [1, 10, 50] # Broadcasts per second
+MEASURE_DURATION = 10 # Seconds of measurement per (subscribers, rate) run
+SUBSCRIBERS_PER_PROCESS = 100 # Subscribers hosted by each subscriber process
+BROADCASTER_STARTUP_WAIT = 3 # Seconds for the broadcaster to connect / register
+SUBSCRIBER_SETUP_TIMEOUT = 60 # Seconds for all subscriber processes to report ready
+DRAIN_GRACE = 5 # Seconds to keep listening after the window for late deliveries
+FANOUT_INSULT = "Fan-out benchmark insult: you scale like a for-loop over sockets."
+
+
+class LatencyRecorder:
+    """Collects per-delivery latencies for broadcasts sent inside the measurement window.
+
+    The window is a shared [start, end] array (epoch seconds) that the parent fills in
+    once every subscriber process is ready; until then both bounds are +inf.
+    """
+    def __init__(self, window):
+        self.window = window
+        self.latencies = [] # list.append is atomic, so subscriber threads can share one recorder
+        self.unstamped = 0
+
+    def on_message(self, payload):
+        received_at = time.time()
+        _, sent_at = decode_broadcast(payload)
+        if sent_at is None:
+            self.unstamped += 1
+        elif self.window[0] <= sent_at < self.window[1]:
+            self.latencies.append(received_at - sent_at)
+
+    def keep_listening(self):
+        """False once the window has closed and late deliveries had DRAIN_GRACE seconds to arrive."""
+        return time.time() < self.window[1] + DRAIN_GRACE
+
+
+def start_broadcaster_process(script_path, rate, extra_env=None):
+    """Starts a broadcaster script with a stamped payload at `rate` broadcasts per second."""
+    env = dict(os.environ, BROADCAST_RATE=str(rate), BROADCAST_TIMESTAMPS="1")
+    env.update(extra_env or {})
+    proc = subprocess.Popen([PYTHON_EXECUTABLE, script_path], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    time.sleep(BROADCASTER_STARTUP_WAIT)
+    if proc.poll() is not None:
+        raise Exception(f"Broadcaster {script_path} exited prematurely (code {proc.returncode}).")
+    return proc
+
+def stop_process(proc):
+    if proc and proc.poll() is None:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait(timeout=2)
+
+def _subscriber_process_main(host_function, first_index, count, window, ready_queue, results_queue):
+    recorder = LatencyRecorder(window)
+    try:
+        host_function(first_index, count, recorder, ready_queue)
+        results_queue.put({"latencies": recorder.latencies, "unstamped": recorder.unstamped})
+    except Exception as e:
+        ready_queue.put(f"error: {e}")
+        results_queue.put({"latencies": recorder.latencies, "unstamped": recorder.unstamped, "error": str(e)})
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def run_fanout_level(host_function, num_subscribers, rate):
+    """Hosts num_subscribers subscribers and measures the deliveries of one MEASURE_DURATION window.
+
+    host_function(first_index, count, recorder, ready_queue) must set up `count` subscribers,
+    put one "ready" item on ready_queue, feed every received payload to recorder.on_message
+    while recorder.keep_listening() and then tear them down.
+    """
+    num_processes = max(1, -(-num_subscribers // SUBSCRIBERS_PER_PROCESS))
+    ready_queue = multiprocessing.Queue()
+    results_queue = multiprocessing.Queue()
+    window = multiprocessing.RawArray('d', [float('inf'), float('inf')])
+
+    processes = []
+    first_index = 0
+    for i in range(num_processes):
+        count = min(SUBSCRIBERS_PER_PROCESS, num_subscribers - first_index)
+        proc = multiprocessing.Process(target=_subscriber_process_main,
+                                       args=(host_function, first_index, count, window,
+                                             ready_queue, results_queue), daemon=True)
+        proc.start()
+        processes.append(proc)
+        first_index += count
+
+    for _ in range(num_processes):
+        status = ready_queue.get(timeout=SUBSCRIBER_SETUP_TIMEOUT)
+        if status != "ready":
+            print(f"  Subscriber process failed to start: {status}")
+
+    # Everybody is subscribed: the measurement window opens one second from now
+    window_start = time.time() + 1.0
+    window[1] = window_start + MEASURE_DURATION
+    window[0] = window_start
+    worker_results = [results_queue.get(timeout=MEASURE_DURATION + DRAIN_GRACE + 60) for _ in processes]
+    for proc in processes:
+        proc.join(timeout=5)
+
+    latencies = sorted(l for r in worker_results for l in r["latencies"])
+    errors = [r["error"] for r in worker_results if "error" in r]
+    expected = rate * MEASURE_DURATION * num_subscribers
+    return {
+        "subscribers": num_subscribers,
+        "rate": rate,
+        "delivered": len(latencies),
+        "expected": expected,
+        "delivered_per_sec": len(latencies) / MEASURE_DURATION,
+        "delivery_ratio": (len(latencies) / expected) if expected else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] * 1000) if latencies else float('nan'),
+        "errors": errors,
+    }
+
+def run_fanout_benchmark(backend_name, start_broadcaster, host_function, prepare=None):
+    """Runs every (subscriber count, rate) combination and prints a summary table.
+
+    start_broadcaster(rate) returns a Popen for the running broadcaster; prepare(), if given,
+    is called before each run (e.g. to seed an insult or clear state).
+    """
+    print(f"Starting {backend_name} broadcast fan-out benchmark.")
+    print(f"Subscriber counts: {SUBSCRIBER_COUNTS}, rates: {BROADCAST_RATES}/s, window: {MEASURE_DURATION}s")
+    print("-" * 70)
+
+    results_summary = []
+    for rate in BROADCAST_RATES:
+        for num_subscribers in SUBSCRIBER_COUNTS:
+            print(f"\nTesting {num_subscribers} subscribers at {rate} broadcasts/sec...")
+            broadcaster = None
+            try:
+                if prepare:
+                    prepare()
+                broadcaster = start_broadcaster(rate)
+                res = run_fanout_level(host_function, num_subscribers, rate)
+                for err in res["errors"]:
+                    print(f"  Subscriber process reported error: {err}")
+                print(f"  Delivered: {res['delivered']}/{res['expected']:.0f} ({res['delivery_ratio'] * 100:.1f}%), "
+                      f"{res['delivered_per_sec']:.1f} msgs/sec")
+                print(f"  Latency p50: {res['p50_ms']:.2f}ms, p95: {res['p95_ms']:.2f}ms, "
+                      f"p99: {res['p99_ms']:.2f}ms, max: {res['max_ms']:.2f}ms")
+                results_summary.append(res)
+            except Exception as e:
+                print(f"  Error during run: {e}")
+            finally:
+                stop_process(broadcaster)
+                time.sleep(1)
+
+    print("\n" + "=" * 70)
+    print(f"Broadcast Fan-out Summary ({backend_name}):")
+    print("Subs  | Rate/s | Delivered msg/s | Ratio  | p50 ms  | p95 ms  | p99 ms  | max ms")
+    print("------|--------|-----------------|--------|---------|---------|---------|--------")
+    for res in results_summary:
+        print(f"{res['subscribers']:<5} | {res['rate']:<6} | {res['delivered_per_sec']:<15.1f} | "
+              f"{res['delivery_ratio'] * 100:5.1f}% | {res['p50_ms']:<7.2f} | {res['p95_ms']:<7.2f} | "
+              f"{res['p99_ms']:<7.2f} | {res['max_ms']:.2f}")
+    print("=" * 70)
+    return results_summary
@@ -0,0 +1,49 @@
+# pyro_broadcast_fanout.py
+import Pyro4
+import os
+from fanout_common import (PROJECT_ROOT, FANOUT_INSULT, run_fanout_benchmark,
+                           start_broadcaster_process)
+
+# --- Test Configuration ---
+PYRO_SERVICE_NAME = "example.insult.service"
+SERVER_SCRIPT = os.path.join(PROJECT_ROOT, "pyro_insult_service", "insult_server_pyro.py")
+
+@Pyro4.expose
+class RecordingNotificationReceiver:
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def receive_insult(self, insult_message):
+        self.recorder.on_message(insult_message)
+        return "ACK: Insult received."
+
+# --- Subscriber host (runs in each subscriber process) ---
+def host_pyro_subscribers(first_index, count, recorder, ready_queue):
+    """One daemon per process hosting `count` receiver objects, each registered with its own URI."""
+    daemon = Pyro4.Daemon(host="127.0.0.1")
+    insult_server = Pyro4.Proxy(f"PYRONAME:{PYRO_SERVICE_NAME}")
+    uris = []
+    try:
+        for _ in range(count):
+            uri = str(daemon.register(RecordingNotificationReceiver(recorder)))
+            insult_server.register_subscriber(uri)
+            uris.append(uri)
+        ready_queue.put("ready")
+        daemon.requestLoop(loopCondition=recorder.keep_listening)
+    finally:
+        for uri in uris:
+            try:
+                insult_server.unregister_subscriber(uri)
+            except Exception:
+                pass # Server may already be gone
+        daemon.close()
+
+def start_pyro_server(rate):
+    proc = start_broadcaster_process(SERVER_SCRIPT, rate)
+    Pyro4.Proxy(f"PYRONAME:{PYRO_SERVICE_NAME}").add_insult(FANOUT_INSULT)
+    return proc
+
+# --- Main Test Execution ---
+if __name__ == "__main__":
+    # Ensure the Pyro Name Server is running. The InsultServer is started by this script.
+    run_fanout_benchmark("Pyro4 receive_insult", start_pyro_server, host_pyro_subscribers)
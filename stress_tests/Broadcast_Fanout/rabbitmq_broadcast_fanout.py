@@ -0,0 +1,51 @@
+# rabbitmq_broadcast_fanout.py
+import pika
+import os
+from fanout_common import (PROJECT_ROOT, FANOUT_INSULT, run_fanout_benchmark,
+                           start_broadcaster_process)
+from common.insult_shards import declare_insult_queues, insult_queue_names, insult_route, shard_count_from_env
+
+# --- Test Configuration ---
+RABBITMQ_HOST = 'localhost'
+SHARD_COUNT = shard_count_from_env() # INSULT_SHARD_COUNT of the processors, if sharded
+BROADCAST_EXCHANGE_NAME = 'insult_broadcast_exchange'
+PROCESSOR_SCRIPT = os.path.join(PROJECT_ROOT, "rabbitmq_insult_service", "insult_processor_rabbit.py")
+
+# --- Subscriber host (runs in each subscriber process) ---
+def host_rabbitmq_subscribers(first_index, count, recorder, ready_queue):
+    """One connection per process; each subscriber is its own exclusive queue bound to the fanout."""
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
+    try:
+        channel = connection.channel()
+        channel.exchange_declare(exchange=BROADCAST_EXCHANGE_NAME, exchange_type='fanout')
+        for _ in range(count):
+            queue_name = channel.queue_declare(queue='', exclusive=True).method.queue
+            channel.queue_bind(exchange=BROADCAST_EXCHANGE_NAME, queue=queue_name)
+            channel.basic_consume(queue=queue_name, auto_ack=True,
+                                  on_message_callback=lambda ch, method, props, body: recorder.on_message(body))
+        ready_queue.put("ready")
+        while recorder.keep_listening():
+            connection.process_data_events(time_limit=0.2)
+    finally:
+        if connection.is_open:
+            connection.close()
+
+def start_rabbitmq_broadcaster(rate):
+    # No checkpoint: every run starts from just the seeded insult
+    return start_broadcaster_process(PROCESSOR_SCRIPT, rate, {"INSULT_CHECKPOINT_BACKEND": "none"})
+
+def seed_insult():
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
+    channel = connection.channel()
+    declare_insult_queues(channel, SHARD_COUNT)
+    for queue_name in insult_queue_names(SHARD_COUNT):
+        channel.queue_purge(queue=queue_name)
+    exchange, routing_key = insult_route(FANOUT_INSULT, SHARD_COUNT)
+    channel.basic_publish(exchange=exchange, routing_key=routing_key, body=FANOUT_INSULT,
+                          properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE))
+    connection.close()
+
+# --- Main Test Execution ---
+if __name__ == "__main__":
+    # Ensure RabbitMQ is running. The insult processor (broadcaster) is started by this script.
+    run_fanout_benchmark("RabbitMQ fanout", start_rabbitmq_broadcaster, host_rabbitmq_subscribers, prepare=seed_insult)
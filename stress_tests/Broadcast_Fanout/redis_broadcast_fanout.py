@@ -0,0 +1,45 @@
+# redis_broadcast_fanout.py
+import redis
+import os
+from fanout_common import (PROJECT_ROOT, FANOUT_INSULT, run_fanout_benchmark,
+                           start_broadcaster_process)
+
+# --- Test Configuration ---
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+INSULTS_SET_KEY = 'insults_set'
+BROADCAST_CHANNEL = 'insult_broadcast_channel'
+BROADCASTER_SCRIPT = os.path.join(PROJECT_ROOT, "redis_insult_service", "insult_broadcaster_redis.py")
+
+# --- Subscriber host (runs in each subscriber process) ---
+def host_redis_subscribers(first_index, count, recorder, ready_queue):
+    """Each subscriber is its own pub/sub connection, so Redis really fans out `count` copies."""
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+    pubsubs, threads = [], []
+    try:
+        for _ in range(count):
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{BROADCAST_CHANNEL: lambda message: recorder.on_message(message['data'])})
+            pubsubs.append(pubsub)
+            threads.append(pubsub.run_in_thread(sleep_time=0.05, daemon=True))
+        ready_queue.put("ready")
+        while recorder.keep_listening():
+            threads[0].join(timeout=0.2) # Just waiting; callbacks run in the pub/sub threads
+    finally:
+        for thread in threads:
+            thread.stop()
+        for pubsub in pubsubs:
+            pubsub.close()
+
+def start_redis_broadcaster(rate):
+    return start_broadcaster_process(BROADCASTER_SCRIPT, rate)
+
+def seed_insult():
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+    r.delete(INSULTS_SET_KEY) # One known insult keeps payload size constant
+    r.sadd(INSULTS_SET_KEY, FANOUT_INSULT)
+
+# --- Main Test Execution ---
+if __name__ == "__main__":
+    # Ensure Redis is running. The broadcaster is started by this script.
+    run_fanout_benchmark("Redis PUBLISH", start_redis_broadcaster, host_redis_subscribers, prepare=seed_insult)
@@ -0,0 +1,64 @@
+# xmlrpc_broadcast_fanout.py
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+import xmlrpc.client
+import threading
+import os
+from fanout_common import (PROJECT_ROOT, FANOUT_INSULT, run_fanout_benchmark,
+                           start_broadcaster_process)
+
+# --- Test Configuration ---
+XMLRPC_SERVER_URL = "http://127.0.0.1:8000/RPC2"
+SUBSCRIBER_HOST = "127.0.0.1"
+SUBSCRIBER_BASE_PORT = 9100 # Subscriber i listens on SUBSCRIBER_BASE_PORT + i
+SERVER_SCRIPT = os.path.join(PROJECT_ROOT, "xmlrpc_insult_service", "insult_server_xmlrpc.py")
+
+class SubscriberRequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/RPC2',)
+
+class RecordingNotificationHandler:
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def receive_insult_notification(self, insult_string):
+        self.recorder.on_message(insult_string)
+        return "Notification received."
+
+# --- Subscriber host (runs in each subscriber process) ---
+def host_xmlrpc_subscribers(first_index, count, recorder, ready_queue):
+    """Each subscriber is its own XML-RPC server on its own port, registered with the InsultService."""
+    server_proxy = xmlrpc.client.ServerProxy(XMLRPC_SERVER_URL, allow_none=True)
+    handler = RecordingNotificationHandler(recorder)
+    servers, urls = [], []
+    try:
+        for i in range(first_index, first_index + count):
+            port = SUBSCRIBER_BASE_PORT + i
+            server = SimpleXMLRPCServer((SUBSCRIBER_HOST, port), requestHandler=SubscriberRequestHandler,
+                                        allow_none=True, logRequests=False)
+            server.register_instance(handler)
+            threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.2}, daemon=True).start()
+            servers.append(server)
+            url = f"http://{SUBSCRIBER_HOST}:{port}/RPC2"
+            server_proxy.register_subscriber(url)
+            urls.append(url)
+        ready_queue.put("ready")
+        while recorder.keep_listening():
+            threading.Event().wait(0.2)
+    finally:
+        for url in urls:
+            try:
+                server_proxy.unregister_subscriber(url)
+            except Exception:
+                pass # Server may already be gone
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+def start_xmlrpc_server(rate):
+    proc = start_broadcaster_process(SERVER_SCRIPT, rate)
+    xmlrpc.client.ServerProxy(XMLRPC_SERVER_URL, allow_none=True).add_insult(FANOUT_INSULT)
+    return proc
+
+# --- Main Test Execution ---
+if __name__ == "__main__":
+    # The InsultService server (and its broadcaster thread) is started by this script on port 8000.
+    run_fanout_benchmark("XMLRPC callbacks", start_xmlrpc_server, host_xmlrpc_subscribers)
@@ -2,6 +2,13 @@ import Pyro4
 import multiprocessing
 import time
 import random
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.latency_histogram import LatencyHistogram
 
 # --- Test Configuration ---
 PYRO_SERVICE_NAME = "example.insult.service" # Name in Pyro Name Server
@@ -18,16 +25,19 @@ def pyro_add_insult_worker(num_requests_for_this_worker):
         insult_server = Pyro4.Proxy(f"PYRONAME:{PYRO_SERVICE_NAME}")
         insult_server._pyroTimeout = 5 # Set a timeout for calls
 
+        histogram = LatencyHistogram()
         success_count = 0
         failure_count = 0
         
         for i in range(num_requests_for_this_worker):
             insult_to_send = random.choice(SAMPLE_INSULTS) + f" (req {i} by {pid})"
+            request_start = time.perf_counter()
             try:
                 # Assuming add_insult returns a string indicating success/failure
                 response = insult_server.add_insult(insult_to_send)
                 if "successfully" in response or "already exists" in response: # Adjust if server response changes
                     success_count += 1
+                    histogram.record(time.perf_counter() - request_start)
                 else:
                     failure_count +=1 # Count non-successful but non-exception responses as failures
             except Pyro4.errors.CommunicationError: # Specific Pyro communication error
@@ -35,7 +45,7 @@ def pyro_add_insult_worker(num_requests_for_this_worker):
             except Exception: # Catch other Pyro errors or app-level errors
                 failure_count += 1
         
-        return {"success": success_count, "failure": failure_count}
+        return {"success": success_count, "failure": failure_count, "histogram": histogram}
 
     except Pyro4.errors.NamingError:
         return {"success": 0, "failure": num_requests_for_this_worker, "error": "NamingError"}
@@ -68,6 +78,7 @@ if __name__ == "__main__":
 
         total_successes = sum(r.get("success", 0) for r in worker_results)
         total_failures = sum(r.get("failure", 0) for r in worker_results)
+        histogram = LatencyHistogram.merged(r.get("histogram") for r in worker_results)
         
         # Check for major errors reported by workers
         for r in worker_results:
@@ -81,15 +92,18 @@ if __name__ == "__main__":
         print(f"  Total Successful Requests: {total_successes}")
         print(f"  Total Failed Requests: {total_failures}")
         print(f"  Throughput: {throughput:.2f} requests/sec")
+        print(f"  Latency: {histogram.format_summary()}")
         
         results_summary.append({
             "concurrency": concurrency, "time_taken": total_time_taken,
-            "throughput": throughput, "successes": total_successes, "failures": total_failures
+            "throughput": throughput, "successes": total_successes, "failures": total_failures,
+            "latency": histogram.summary_ms()
         })
         time.sleep(2)
 
     print("\n" + "=" * 50)
     print("Stress Test Summary (Pyro4 - Add Insult):")
     for res in results_summary:
-        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}")
+        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}, "
+              f"p50: {res['latency']['p50']:.2f}ms, p90: {res['latency']['p90']:.2f}ms, p99: {res['latency']['p99']:.2f}ms, p99.9: {res['latency']['p99.9']:.2f}ms, Max: {res['latency']['max']:.2f}ms")
     print("=" * 50)
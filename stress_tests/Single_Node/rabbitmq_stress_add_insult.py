@@ -2,10 +2,18 @@ import pika
 import multiprocessing
 import time
 import random
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.insult_shards import ADD_INSULT_QUEUE_NAME, declare_insult_queues, insult_route, shard_count_from_env
+from common.latency_histogram import LatencyHistogram
 
 # --- Test Configuration ---
 RABBITMQ_HOST = 'localhost'
-ADD_INSULT_QUEUE_NAME = 'add_insult_queue' # Queue listened to by insult_processor_rabbit.py
+SHARD_COUNT = shard_count_from_env() # INSULT_SHARD_COUNT of the processors under test
 TOTAL_REQUESTS = 10000
 CONCURRENCY_LEVELS = [1, 2, 5, 10, 20, 50]
 SAMPLE_INSULTS = [f"RabbitMQ insult {i} for stress test!" for i in range(100)]
@@ -18,24 +26,28 @@ def rabbitmq_add_insult_worker(num_requests_for_this_worker):
         # Each process creates its own connection and channel
         connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
         channel = connection.channel()
-        # Producer should declare the queue to ensure it exists; durable to match processor.
-        channel.queue_declare(queue=ADD_INSULT_QUEUE_NAME, durable=True)
+        # Producer should declare the queue(s) to ensure they exist; durable to match processor.
+        declare_insult_queues(channel, SHARD_COUNT)
 
+        histogram = LatencyHistogram()
         success_count = 0
         failure_count = 0
         
         for i in range(num_requests_for_this_worker):
             insult_to_send = random.choice(SAMPLE_INSULTS) + f" (req {i} by {pid})"
+            exchange, routing_key = insult_route(insult_to_send, SHARD_COUNT)
+            request_start = time.perf_counter() # Publish latency only: basic_publish returns once the frame is written
             try:
                 channel.basic_publish(
-                    exchange='', # Default exchange
-                    routing_key=ADD_INSULT_QUEUE_NAME,
+                    exchange=exchange,
+                    routing_key=routing_key,
                     body=insult_to_send,
                     properties=pika.BasicProperties(
                         delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
                     )
                 )
                 success_count += 1
+                histogram.record(time.perf_counter() - request_start)
             except pika.exceptions.AMQPConnectionError: # More specific error
                 failure_count += 1
                 # Attempt to reconnect (simplified for stress test worker)
@@ -43,13 +55,13 @@ def rabbitmq_add_insult_worker(num_requests_for_this_worker):
                     if connection and connection.is_open: connection.close()
                     connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
                     channel = connection.channel()
-                    channel.queue_declare(queue=ADD_INSULT_QUEUE_NAME, durable=True)
+                    declare_insult_queues(channel, SHARD_COUNT)
                 except: # If reconnect fails, continue failing this worker's requests
                     pass 
             except Exception:
                 failure_count += 1
         
-        return {"success": success_count, "failure": failure_count}
+        return {"success": success_count, "failure": failure_count, "histogram": histogram}
 
     except pika.exceptions.AMQPConnectionError:
         return {"success": 0, "failure": num_requests_for_this_worker, "error": "AMQPConnectionError"}
@@ -62,7 +74,8 @@ def rabbitmq_add_insult_worker(num_requests_for_this_worker):
 # --- Main Test Execution ---
 if __name__ == "__main__":
     print(f"Starting RabbitMQ InsultService 'add_insult' (publish to queue) stress test.")
-    print(f"Target RabbitMQ: {RABBITMQ_HOST}, Queue: {ADD_INSULT_QUEUE_NAME}")
+    print(f"Target RabbitMQ: {RABBITMQ_HOST}, Queue: {ADD_INSULT_QUEUE_NAME}"
+          + (f" ({SHARD_COUNT} shards)" if SHARD_COUNT > 1 else ""))
     print(f"Total Requests per concurrency level: {TOTAL_REQUESTS}")
     print("-" * 50)
 
@@ -85,6 +98,7 @@ if __name__ == "__main__":
 
         total_successes = sum(r.get("success", 0) for r in worker_results)
         total_failures = sum(r.get("failure", 0) for r in worker_results)
+        histogram = LatencyHistogram.merged(r.get("histogram") for r in worker_results)
         
         for r in worker_results:
             if "error" in r:
@@ -97,15 +111,18 @@ if __name__ == "__main__":
         print(f"  Total Successful Messages Sent: {total_successes}")
         print(f"  Total Failed Messages: {total_failures}")
         print(f"  Throughput: {throughput:.2f} messages/sec")
+        print(f"  Latency: {histogram.format_summary()}")
         
         results_summary.append({
             "concurrency": concurrency, "time_taken": total_time_taken,
-            "throughput": throughput, "successes": total_successes, "failures": total_failures
+            "throughput": throughput, "successes": total_successes, "failures": total_failures,
+            "latency": histogram.summary_ms()
         })
         time.sleep(2)
 
     print("\n" + "=" * 50)
     print("Stress Test Summary (RabbitMQ - Add Insult):")
     for res in results_summary:
-        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}")
+        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}, "
+              f"p50: {res['latency']['p50']:.2f}ms, p90: {res['latency']['p90']:.2f}ms, p99: {res['latency']['p99']:.2f}ms, p99.9: {res['latency']['p99.9']:.2f}ms, Max: {res['latency']['max']:.2f}ms")
     print("=" * 50)
@@ -2,6 +2,13 @@ import pika
 import multiprocessing
 import time
 import random
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.latency_histogram import LatencyHistogram
 
 # --- Test Configuration ---
 RABBITMQ_HOST = 'localhost'
@@ -24,11 +31,13 @@ def rabbitmq_submit_filter_worker(num_requests_for_this_worker):
         channel = connection.channel()
         channel.queue_declare(queue=TASK_QUEUE_NAME, durable=True)
 
+        histogram = LatencyHistogram()
         success_count = 0
         failure_count = 0
         
         for _ in range(num_requests_for_this_worker):
             text_to_filter = random.choice(SAMPLE_TEXTS) + f" (process {pid})"
+            request_start = time.perf_counter() # Publish latency only: basic_publish returns once the frame is written
             try:
                 channel.basic_publish(
                     exchange='',
@@ -37,6 +46,7 @@ def rabbitmq_submit_filter_worker(num_requests_for_this_worker):
                     properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
                 )
                 success_count += 1
+                histogram.record(time.perf_counter() - request_start)
             except pika.exceptions.AMQPConnectionError:
                 failure_count += 1
                 try: 
@@ -48,7 +58,7 @@ def rabbitmq_submit_filter_worker(num_requests_for_this_worker):
             except Exception:
                 failure_count += 1
         
-        return {"success": success_count, "failure": failure_count}
+        return {"success": success_count, "failure": failure_count, "histogram": histogram}
 
     except pika.exceptions.AMQPConnectionError:
         return {"success": 0, "failure": num_requests_for_this_worker, "error": "AMQPConnectionError"}
@@ -84,6 +94,7 @@ if __name__ == "__main__":
 
         total_successes = sum(r.get("success", 0) for r in worker_results)
         total_failures = sum(r.get("failure", 0) for r in worker_results)
+        histogram = LatencyHistogram.merged(r.get("histogram") for r in worker_results)
         
         for r in worker_results:
             if "error" in r:
@@ -96,15 +107,18 @@ if __name__ == "__main__":
         print(f"  Total Tasks Submitted: {total_successes}")
         print(f"  Total Failed Submissions: {total_failures}")
         print(f"  Throughput: {throughput:.2f} tasks/sec")
+        print(f"  Latency: {histogram.format_summary()}")
         
         results_summary.append({
             "concurrency": concurrency, "time_taken": total_time_taken,
-            "throughput": throughput, "successes": total_successes, "failures": total_failures
+            "throughput": throughput, "successes": total_successes, "failures": total_failures,
+            "latency": histogram.summary_ms()
         })
         time.sleep(2)
 
     print("\n" + "=" * 50)
     print("Stress Test Summary (RabbitMQ - Submit Filter Task):")
     for res in results_summary:
-        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}")
+        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}, "
+              f"p50: {res['latency']['p50']:.2f}ms, p90: {res['latency']['p90']:.2f}ms, p99: {res['latency']['p99']:.2f}ms, p99.9: {res['latency']['p99.9']:.2f}ms, Max: {res['latency']['max']:.2f}ms")
     print("=" * 50)
@@ -2,6 +2,13 @@ import redis
 import multiprocessing
 import time
 import random
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.latency_histogram import LatencyHistogram
 
 # --- Test Configuration ---
 REDIS_HOST = 'localhost'
@@ -19,18 +26,21 @@ def redis_add_insult_worker(num_requests_for_this_worker):
         r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
         r.ping() # Check connection
 
+        histogram = LatencyHistogram()
         success_count = 0 # SADD returns 1 if new, 0 if exists; both are "successful" operations
         failure_count = 0
         
         for i in range(num_requests_for_this_worker):
             insult_to_send = random.choice(SAMPLE_INSULTS) + f" (req {i} by {pid})"
+            request_start = time.perf_counter()
             try:
                 r.sadd(INSULTS_SET_KEY, insult_to_send)
-                success_count += 1 
+                success_count += 1
+                histogram.record(time.perf_counter() - request_start)
             except redis.exceptions.RedisError:
                 failure_count += 1
         
-        return {"success": success_count, "failure": failure_count}
+        return {"success": success_count, "failure": failure_count, "histogram": histogram}
 
     except redis.exceptions.ConnectionError:
         return {"success": 0, "failure": num_requests_for_this_worker, "error": "ConnectionError"}
@@ -63,6 +73,7 @@ if __name__ == "__main__":
 
         total_successes = sum(r.get("success", 0) for r in worker_results)
         total_failures = sum(r.get("failure", 0) for r in worker_results)
+        histogram = LatencyHistogram.merged(r.get("histogram") for r in worker_results)
         
         for r in worker_results:
             if "error" in r:
@@ -75,15 +86,18 @@ if __name__ == "__main__":
         print(f"  Total Successful Operations: {total_successes}")
         print(f"  Total Failed Operations: {total_failures}")
         print(f"  Throughput: {throughput:.2f} ops/sec")
+        print(f"  Latency: {histogram.format_summary()}")
         
         results_summary.append({
             "concurrency": concurrency, "time_taken": total_time_taken,
-            "throughput": throughput, "successes": total_successes, "failures": total_failures
+            "throughput": throughput, "successes": total_successes, "failures": total_failures,
+            "latency": histogram.summary_ms()
         })
         time.sleep(2)
 
     print("\n" + "=" * 50)
     print("Stress Test Summary (Redis - Add Insult):")
     for res in results_summary:
-        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}")
+        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}, "
+              f"p50: {res['latency']['p50']:.2f}ms, p90: {res['latency']['p90']:.2f}ms, p99: {res['latency']['p99']:.2f}ms, p99.9: {res['latency']['p99.9']:.2f}ms, Max: {res['latency']['max']:.2f}ms")
     print("=" * 50)
@@ -2,6 +2,13 @@ import xmlrpc.client
 import multiprocessing
 import time
 import random # For generating varied insults if needed
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.latency_histogram import LatencyHistogram
 
 # --- Test Configuration ---
 XMLRPC_SERVER_URL = "http://127.0.0.1:8000/RPC2" # From InsultService XMLRPC server
@@ -20,19 +27,22 @@ def xmlrpc_add_insult_worker(num_requests_for_this_worker):
         # Each process creates its own ServerProxy
         server_proxy = xmlrpc.client.ServerProxy(XMLRPC_SERVER_URL, allow_none=True)
         
+        histogram = LatencyHistogram()
         success_count = 0
         failure_count = 0
         
         for i in range(num_requests_for_this_worker):
             # Select a sample insult to send
             insult_to_send = random.choice(SAMPLE_INSULTS) + f" (req {i} by {pid})"
+            request_start = time.perf_counter()
             try:
                 response = server_proxy.add_insult(insult_to_send)
                 success_count += 1
+                histogram.record(time.perf_counter() - request_start)
             except Exception as e:
                 failure_count += 1
         
-        return {"success": success_count, "failure": failure_count}
+        return {"success": success_count, "failure": failure_count, "histogram": histogram}
 
     except Exception as e:
         return {"success": 0, "failure": num_requests_for_this_worker, "error": str(e)}
@@ -77,6 +87,7 @@ if __name__ == "__main__":
 
         total_successes = sum(r.get("success", 0) for r in worker_results)
         total_failures = sum(r.get("failure", 0) for r in worker_results)
+        histogram = LatencyHistogram.merged(r.get("histogram") for r in worker_results)
         
         if total_time_taken > 0:
             throughput = total_successes / total_time_taken # RPS based on successful requests
@@ -88,13 +99,15 @@ if __name__ == "__main__":
         print(f"  Total Successful Requests: {total_successes}")
         print(f"  Total Failed Requests: {total_failures}")
         print(f"  Throughput: {throughput:.2f} requests/sec")
+        print(f"  Latency: {histogram.format_summary()}")
         
         results_summary.append({
             "concurrency": concurrency,
             "time_taken": total_time_taken,
             "throughput": throughput,
             "successes": total_successes,
-            "failures": total_failures
+            "failures": total_failures,
+            "latency": histogram.summary_ms()
         })
         
         # Small pause before next concurrency level
@@ -103,6 +116,7 @@ if __name__ == "__main__":
     print("\n" + "=" * 50)
     print("Stress Test Summary:")
     for res in results_summary:
-        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}")
+        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}, "
+              f"p50: {res['latency']['p50']:.2f}ms, p90: {res['latency']['p90']:.2f}ms, p99: {res['latency']['p99']:.2f}ms, p99.9: {res['latency']['p99.9']:.2f}ms, Max: {res['latency']['max']:.2f}ms")
     print("=" * 50)
 
@@ -2,6 +2,13 @@ import xmlrpc.client
 import multiprocessing
 import time
 import random
+import sys
+import os
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.latency_histogram import LatencyHistogram
 
 # --- Test Configuration ---
 XMLRPC_FILTER_SERVER_URL = "http://127.0.0.1:8001/RPC2"
@@ -20,22 +27,25 @@ def xmlrpc_submit_filter_worker(num_requests_for_this_worker):
     pid = multiprocessing.current_process().pid
     try:
         server_proxy = xmlrpc.client.ServerProxy(XMLRPC_FILTER_SERVER_URL, allow_none=True)
+        histogram = LatencyHistogram()
         success_count = 0
         failure_count = 0
         
         for _ in range(num_requests_for_this_worker):
             text_to_filter = random.choice(SAMPLE_TEXTS) + f" (process {pid})"
+            request_start = time.perf_counter()
             try:
                 response = server_proxy.submit_text_for_filtering(text_to_filter)
                 # Assuming a simple string response indicating submission
                 if isinstance(response, str) and "submitted successfully" in response:
                     success_count += 1
+                    histogram.record(time.perf_counter() - request_start)
                 else:
                     failure_count += 1
             except Exception:
                 failure_count += 1
         
-        return {"success": success_count, "failure": failure_count}
+        return {"success": success_count, "failure": failure_count, "histogram": histogram}
     except Exception:
         return {"success": 0, "failure": num_requests_for_this_worker, "error": "WorkerConnectionOrSetupError"}
 
@@ -65,6 +75,7 @@ if __name__ == "__main__":
 
         total_successes = sum(r.get("success", 0) for r in worker_results)
         total_failures = sum(r.get("failure", 0) for r in worker_results)
+        histogram = LatencyHistogram.merged(r.get("histogram") for r in worker_results)
         
         for r in worker_results:
             if "error" in r:
@@ -77,15 +88,18 @@ if __name__ == "__main__":
         print(f"  Total Successful Submissions: {total_successes}")
         print(f"  Total Failed Submissions: {total_failures}")
         print(f"  Throughput: {throughput:.2f} submissions/sec")
+        print(f"  Latency: {histogram.format_summary()}")
         
         results_summary.append({
             "concurrency": concurrency, "time_taken": total_time_taken,
-            "throughput": throughput, "successes": total_successes, "failures": total_failures
+            "throughput": throughput, "successes": total_successes, "failures": total_failures,
+            "latency": histogram.summary_ms()
         })
         time.sleep(2)
 
     print("\n" + "=" * 50)
     print("Stress Test Summary (XMLRPC - Submit Filter Text):")
     for res in results_summary:
-        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}")
+        print(f"  Concurrency: {res['concurrency']:2d}, Time: {res['time_taken']:.2f}s, RPS: {res['throughput']:.2f}, Success: {res['successes']}, Fail: {res['failures']}, "
+              f"p50: {res['latency']['p50']:.2f}ms, p90: {res['latency']['p90']:.2f}ms, p99: {res['latency']['p99']:.2f}ms, p99.9: {res['latency']['p99.9']:.2f}ms, Max: {res['latency']['max']:.2f}ms")
     print("=" * 50)
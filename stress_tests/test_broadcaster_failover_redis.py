@@ -0,0 +1,114 @@
+# test_broadcaster_failover_redis.py
+import subprocess
+import threading
+import time
+import redis
+import os
+import signal
+
+# --- Configuration ---
+PYTHON_EXECUTABLE = "python" # SET TO VENV PYTHON e.g., "/path/to/SD-env/bin/python"
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "."))
+
+BROADCASTER_SCRIPT_REDIS = os.path.join(PROJECT_ROOT, "redis_insult_service", "insult_broadcaster_redis.py")
+
+REDIS_HOST = 'localhost'
+REDIS_PORT = 6379
+INSULTS_SET_KEY = 'insults_set'
+BROADCAST_CHANNEL = 'insult_broadcast_channel'
+LEADER_LOCK_KEY = 'insult_broadcaster_leader' # Must match the broadcaster
+
+NUM_BROADCASTERS = 3
+BROADCAST_INTERVAL = 0.5 # Seconds, short so the gap is measured with good resolution
+LEASE_MS = 2000
+OBSERVE_BEFORE_KILL = 5 # Seconds of normal operation before killing the leader
+OBSERVE_AFTER_KILL = 10 # Seconds to keep listening after the kill
+
+
+def record_broadcasts(arrivals, stop_event):
+    """Subscribes to the broadcast channel and records the arrival time of every message."""
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(BROADCAST_CHANNEL)
+    while not stop_event.is_set():
+        message = pubsub.get_message(timeout=0.1)
+        if message and message['type'] == 'message':
+            arrivals.append(time.time())
+    pubsub.close()
+
+def start_broadcaster(index):
+    env = dict(os.environ,
+               BROADCASTER_LEADER_ELECTION="1",
+               BROADCASTER_LEASE_MS=str(LEASE_MS),
+               BROADCAST_INTERVAL=str(BROADCAST_INTERVAL))
+    proc = subprocess.Popen([PYTHON_EXECUTABLE, BROADCASTER_SCRIPT_REDIS], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    print(f"  Started broadcaster {index + 1} (PID: {proc.pid}).")
+    return proc
+
+def find_leader_pid(r):
+    """The lock value is '<host>:<pid>:<nonce>'."""
+    holder = r.get(LEADER_LOCK_KEY)
+    if not holder:
+        return None
+    return int(holder.split(":")[1])
+
+
+if __name__ == "__main__":
+    print("Starting leader failover test for the Redis insult broadcaster")
+    print(f"Broadcasters: {NUM_BROADCASTERS}, interval: {BROADCAST_INTERVAL}s, lease: {LEASE_MS}ms")
+    print("Ensure Redis server is running.")
+    print("-" * 70)
+
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+    r.sadd(INSULTS_SET_KEY, "Failover test insult: you are as reliable as a single point of failure.")
+    r.delete(LEADER_LOCK_KEY)
+
+    arrivals = []
+    stop_event = threading.Event()
+    listener = threading.Thread(target=record_broadcasts, args=(arrivals, stop_event), daemon=True)
+    listener.start()
+
+    kill_time, new_leader_pid, broadcasts_before_kill = None, None, 0
+    procs = [start_broadcaster(i) for i in range(NUM_BROADCASTERS)]
+    try:
+        time.sleep(OBSERVE_BEFORE_KILL)
+        leader_pid = find_leader_pid(r)
+        if leader_pid is None:
+            raise Exception("No broadcaster holds the leader lock.")
+
+        broadcasts_before_kill = len(arrivals)
+        print(f"  Leader is PID {leader_pid}. Killing it with SIGKILL (no lease release)...")
+        kill_time = time.time()
+        os.kill(leader_pid, signal.SIGKILL)
+        time.sleep(OBSERVE_AFTER_KILL)
+        new_leader_pid = find_leader_pid(r)
+    finally:
+        stop_event.set()
+        listener.join(timeout=2)
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    gaps = [later - earlier for earlier, later in zip(arrivals, arrivals[1:])]
+    last_before_kill = max((t for t in arrivals if kill_time and t <= kill_time), default=None)
+    first_after_kill = min((t for t in arrivals if kill_time and t > kill_time), default=None)
+    # Two leaders at once would show up as gaps much shorter than the interval
+    double_publishes = sum(1 for gap in gaps if gap < BROADCAST_INTERVAL / 2)
+
+    print("\n" + "=" * 70)
+    print("Failover Test Summary (Redis - InsultBroadcaster):")
+    print(f"  Broadcasts received: {len(arrivals)} ({broadcasts_before_kill} before the kill)")
+    print(f"  New leader PID: {new_leader_pid}")
+    if last_before_kill and first_after_kill:
+        print(f"  Broadcast gap across failover: {first_after_kill - last_before_kill:.3f}s "
+              f"(normal interval {BROADCAST_INTERVAL}s, lease {LEASE_MS / 1000:.1f}s)")
+        print(f"  Time from kill to first broadcast by new leader: {first_after_kill - kill_time:.3f}s")
+    else:
+        print("  No broadcast received after the kill: failover FAILED.")
+    print(f"  Suspected double publishes (gap < interval/2): {double_publishes}")
+    print("=" * 70)
@@ -1,15 +1,19 @@
 # test_static_scaling_filter_pyro.py
 import multiprocessing
-import subprocess
 import time
 import Pyro4
 import os
 import signal
 import random 
+import sys
 
 # --- Configuration ---
 PYTHON_EXECUTABLE = "python" # SET TO VENV PYTHON e.g., "/path/to/SD-env/bin/python"
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+from common.task_envelope import TaskTimingSummary
 
 FILTER_DISPATCHER_SCRIPT = os.path.join(PROJECT_ROOT, "pyro_filter_service", "filter_dispatcher_pyro.py")
 FILTER_WORKER_SCRIPT_PYRO = os.path.join(PROJECT_ROOT, "pyro_filter_service", "filter_worker_pyro.py")
@@ -18,6 +22,7 @@ PYRO_DISPATCHER_NAME = "example.filter.dispatcher"
 
 TOTAL_REQUESTS = 5000
 WORKER_COUNTS = [1, 2, 3]
+READY_TIMEOUT = 30 # Seconds for the dispatcher / all workers of a run to report registered
 
 SAMPLE_TEXTS_FOR_PYRO_FILTER = [
     "Pyro scaling: This is a stupid example text with some bad words like idiot.",
@@ -27,13 +32,13 @@ SAMPLE_TEXTS_FOR_PYRO_FILTER = [
 
 
 # --- Helper to run a Pyro server (dispatcher or worker) ---
-def run_pyro_server_process(script_path, python_exec, title="Pyro Process"):
+def run_pyro_server_process(script_path, python_exec, readiness, title="Pyro Process"):
     # It's assumed the Name Server is already running independently.
     # Workers and Dispatcher will try to connect to it.
     print(f"  Starting {title} ({script_path})...")
-    # For Pyro, often better to let them print their own output for debugging registration
-    proc = subprocess.Popen([python_exec, script_path])
-    time.sleep(3) # Give server/worker time to start and register
+    # For Pyro, often better to let them print their own output for debugging registration.
+    # They signal on the readiness pipe once registered (dispatcher: in the NS; worker: with the dispatcher).
+    proc = readiness.popen([python_exec, script_path])
     if proc.poll() is not None: # Check if it exited immediately
         print(f"  ERROR: {title} at {script_path} exited prematurely. Check logs/Name Server.")
         return None
@@ -78,21 +83,24 @@ if __name__ == "__main__":
 
     try:
         # Start Dispatcher ONCE for all worker count tests
-        dispatcher_process = run_pyro_server_process(FILTER_DISPATCHER_SCRIPT, PYTHON_EXECUTABLE, "FilterDispatcher")
-        if not dispatcher_process or dispatcher_process.poll() is not None:
-            print("CRITICAL: FilterDispatcher failed to start. Aborting tests.")
-            exit()
-        print("FilterDispatcher started. Waiting for it to be available in Name Server...")
-        time.sleep(5) # Extra time for NS registration visibility
+        with ReadinessPipe() as dispatcher_readiness:
+            dispatcher_process = run_pyro_server_process(FILTER_DISPATCHER_SCRIPT, PYTHON_EXECUTABLE, dispatcher_readiness, "FilterDispatcher")
+            print("FilterDispatcher launched. Waiting for it to register in the Name Server...")
+            if not dispatcher_process or dispatcher_readiness.wait(1, READY_TIMEOUT, [dispatcher_process]) < 1:
+                print("CRITICAL: FilterDispatcher failed to start. Aborting tests.")
+                exit()
+        print("FilterDispatcher registered.")
 
         for num_workers in WORKER_COUNTS:
             print(f"\nTesting with {num_workers} Pyro worker(s)...")
             worker_procs_pyro = []
+            readiness = ReadinessPipe()
             
             try:
                 print(f"  Starting {num_workers} worker process(es)...")
+                startup_begin = time.perf_counter()
                 for i in range(num_workers):
-                    proc = run_pyro_server_process(FILTER_WORKER_SCRIPT_PYRO, PYTHON_EXECUTABLE, f"FilterWorker{i+1}")
+                    proc = run_pyro_server_process(FILTER_WORKER_SCRIPT_PYRO, PYTHON_EXECUTABLE, readiness, f"FilterWorker{i+1}")
                     if proc and proc.poll() is None:
                         worker_procs_pyro.append(proc)
                     else:
@@ -102,8 +110,11 @@ if __name__ == "__main__":
                     print(f"  ERROR: Expected {num_workers} workers, but only {len(worker_procs_pyro)} started. Skipping this run.")
                     raise Exception("Worker startup failure") # Go to finally for cleanup
                 
-                print(f"  All {num_workers} workers presumed started. Waiting for registrations...")
-                time.sleep(5 + num_workers * 2) # Allow workers time to register with dispatcher
+                print(f"  All {num_workers} workers launched. Waiting for their dispatcher registrations...")
+                ready = readiness.wait(num_workers, READY_TIMEOUT, worker_procs_pyro)
+                if ready < num_workers:
+                    raise Exception(f"Only {ready}/{num_workers} workers registered within {READY_TIMEOUT}s.")
+                print(f"  All {num_workers} workers registered after {time.perf_counter() - startup_begin:.2f}s.")
 
                 print(f"  Producer starting to send {TOTAL_REQUESTS} tasks...")
                 test_start_time = time.perf_counter()
@@ -113,24 +124,15 @@ if __name__ == "__main__":
                 
                 print(f"  Producer finished sending tasks. Now waiting for all results at dispatcher...")
 
-                # Monitor results at the dispatcher
+                # Block on the dispatcher until all results are in: it wakes us on the last one,
+                # so the measured time is not rounded up to a polling interval
                 dispatcher_monitor = Pyro4.Proxy(f"PYRONAME:{PYRO_DISPATCHER_NAME}")
                 results_collected_count = 0
                 max_wait_time_pyro = 60 + TOTAL_REQUESTS * 0.2 # Timeout
-                wait_start_pyro = time.time()
-
-                while results_collected_count < TOTAL_REQUESTS and (time.time() - wait_start_pyro) < max_wait_time_pyro:
-                    try:
-                        current_results = dispatcher_monitor.get_filtered_results()
-                        results_collected_count = len(current_results)
-                        if results_collected_count < TOTAL_REQUESTS:
-                            time.sleep(0.5)
-                        else:
-                            break
-                    except Exception as e_mon:
-                        print(f"    Error polling dispatcher for results: {e_mon}")
-                        time.sleep(1) # Wait and retry polling
-                        break # Or assume failure for this iteration
+                try:
+                    results_collected_count = dispatcher_monitor.wait_for_results(TOTAL_REQUESTS, max_wait_time_pyro)
+                except Exception as e_mon:
+                    print(f"    Error waiting for results at the dispatcher: {e_mon}")
 
                 test_end_time = time.perf_counter()
                 total_test_time_pyro = test_end_time - test_start_time
@@ -141,6 +143,10 @@ if __name__ == "__main__":
                 else:
                     print(f"  All {TOTAL_REQUESTS} tasks processed (results collected by dispatcher).")
                     print(f"  Total test time: {total_test_time_pyro:.4f} seconds")
+                    timings = TaskTimingSummary()
+                    for item in dispatcher_monitor.get_filtered_results(): # Outside the timed section
+                        timings.add(item)
+                    timings.print_summary(prefix="  ")
                     if num_workers == 1:
                         T1_pyro = total_test_time_pyro
                         overall_results_pyro.append({"workers": num_workers, "time": T1_pyro, "speedup": 1.0})
@@ -163,12 +169,14 @@ if __name__ == "__main__":
                         proc.terminate()
                         proc.wait(timeout=5)
                     except: pass
+                readiness.close()
                 print(f"  Workers for N={num_workers} terminated.")
                 # Clear dispatcher's results for next run
                 try:
-                    Pyro4.Proxy(f"PYRONAME:{PYRO_DISPATCHER_NAME}")._filtered_results = [] 
-                    print("  Dispatcher results cleared (attempted).")
-                except: pass
+                    cleared = Pyro4.Proxy(f"PYRONAME:{PYRO_DISPATCHER_NAME}").clear_filtered_results()
+                    print(f"  Dispatcher results cleared ({cleared}).")
+                except Exception as e_clear:
+                    print(f"  Could not clear dispatcher results: {e_clear}")
                 time.sleep(2) # Pause
 
     except Exception as e_main_test:
@@ -7,16 +7,24 @@ import json
 import os
 import signal
 import random
+import sys
 
 # --- Configuration ---
 PYTHON_EXECUTABLE = "python" # SET TO VENV PYTHON e.g., "/path/to/SD-env/bin/python"
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+from common.task_envelope import TaskTimingSummary, encode_task
 FILTER_WORKER_SCRIPT_RABBIT = os.path.join(PROJECT_ROOT, "rabbitmq_filter_service", "filter_worker_rabbit.py")
 
 RABBITMQ_HOST = 'localhost'
 TASK_QUEUE_NAME_RABBIT = 'filter_task_work_queue'
 RESULTS_QUEUE_NAME_RABBIT = 'filter_results_data_queue'
+RESULTS_PREFETCH = 500 # Results pushed to the collector ahead of its acks
+RESULTS_ACK_EVERY = 100 # One multiple-ack per this many results
+WORKER_READY_TIMEOUT = 30 # Seconds for all workers of a run to report "consuming"
 
 TOTAL_REQUESTS = 10000 
 WORKER_COUNTS = [1, 2, 3]
@@ -65,7 +73,7 @@ def rabbitmq_producer_job_direct(num_tasks, task_queue_name, sample_texts):
         for i in range(num_tasks):
             text_content = random.choice(sample_texts) + f" task_{i}_pid{os.getpid()}"
             channel_prod.basic_publish(
-                exchange='', routing_key=task_queue_name, body=text_content,
+                exchange='', routing_key=task_queue_name, body=encode_task(text_content),
                 properties=pika.BasicProperties(delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE)
             )
         print(f"  Producer: Sent {num_tasks} tasks to RabbitMQ queue '{task_queue_name}'.")
@@ -76,51 +84,59 @@ def rabbitmq_producer_job_direct(num_tasks, task_queue_name, sample_texts):
             connection_prod.close()
 
 
-def run_worker_process_rb(worker_script_path, python_exec, title_prefix="Worker"):
+def run_worker_process_rb(worker_script_path, python_exec, readiness, title_prefix="Worker"):
     # (Worker starter same as Redis test)
     print(f"  Starting {title_prefix} using: {python_exec} {worker_script_path}")
     # proc = subprocess.Popen([python_exec, worker_script_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    proc = subprocess.Popen([python_exec, worker_script_path]) # Let worker print to this console
-    time.sleep(2) # RabbitMQ workers need time to connect, declare, start consuming
+    # Let worker print to this console; it signals on the readiness pipe once it is consuming
+    proc = readiness.popen([python_exec, worker_script_path])
     if proc.poll() is not None:
         print(f"  ERROR: {title_prefix} at {worker_script_path} exited prematurely.")
         stdout, stderr = proc.communicate()
         print(f"    Worker STDOUT: {stdout.decode(errors='ignore')}")
         print(f"    Worker STDERR: {stderr.decode(errors='ignore')}")
         return None
-    print(f"  {title_prefix} (PID: {proc.pid}) presumed started.")
+    print(f"  {title_prefix} (PID: {proc.pid}) launched.")
     return proc
 
-def consume_all_results_from_rabbit(num_expected, queue_name, timeout_per_message=0.5, overall_timeout=60):
-    """Consumes up to num_expected messages from a queue or until overall_timeout."""
+def consume_all_results_from_rabbit(num_expected, queue_name, overall_timeout=60):
+    """Consumes up to num_expected messages from a queue or until overall_timeout.
+    Push-based (basic_consume with a prefetch window) instead of basic_get + sleep, so results are
+    delivered as they are published. Returns (results, perf_counter time the last one arrived or None)."""
     results = []
+    last_arrival = None
     conn_results = None
     start_overall_wait = time.time()
     try:
         conn_results = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST))
         ch_results = conn_results.channel()
         ch_results.queue_declare(queue=queue_name, durable=True) # Ensure it exists
+        ch_results.basic_qos(prefetch_count=RESULTS_PREFETCH)
 
-        while len(results) < num_expected:
+        unacked_tag = None
+        # inactivity_timeout only wakes us to check the deadline; it yields (None, None, None)
+        for method_frame, properties, body in ch_results.consume(queue_name, inactivity_timeout=1.0):
+            if method_frame:
+                results.append(body) # Store raw body, or parse JSON if needed
+                last_arrival = time.perf_counter()
+                unacked_tag = method_frame.delivery_tag
+                if len(results) % RESULTS_ACK_EVERY == 0:
+                    ch_results.basic_ack(delivery_tag=unacked_tag, multiple=True)
+                    unacked_tag = None
+            if len(results) >= num_expected:
+                break
             if time.time() - start_overall_wait > overall_timeout:
                 print(f"  Results consumer: Overall timeout ({overall_timeout}s) reached.")
                 break
-            
-            method_frame, properties, body = ch_results.basic_get(queue=queue_name, auto_ack=True)
-            if method_frame:
-                results.append(body) # Store raw body, or parse JSON if needed
-            else:
-                # Queue is empty, wait a bit if we still expect more messages
-                if len(results) < num_expected:
-                    time.sleep(timeout_per_message) 
-                else: # Should not happen if len(results) < num_expected is true
-                    break 
+        if unacked_tag is not None:
+            ch_results.basic_ack(delivery_tag=unacked_tag, multiple=True)
+        ch_results.cancel()
     except Exception as e:
         print(f"  Results consumer error for '{queue_name}': {e}")
     finally:
         if conn_results and conn_results.is_open:
             conn_results.close()
-    return results
+    return results, last_arrival
 
 
 # --- Main Test Execution ---
@@ -142,18 +158,23 @@ if __name__ == "__main__":
         print(f"\n>>> Testing with {num_workers} RabbitMQ worker(s)...")
         clear_rabbitmq_data_robust()
         worker_procs_rabbit = []
+        readiness = ReadinessPipe()
         
         try:
             print(f"  Starting {num_workers} RabbitMQ worker process(es)...")
+            startup_begin = time.perf_counter()
             for i in range(num_workers):
-                proc = run_worker_process_rb(FILTER_WORKER_SCRIPT_RABBIT, PYTHON_EXECUTABLE, f"RabbitWorker{i+1}")
+                proc = run_worker_process_rb(FILTER_WORKER_SCRIPT_RABBIT, PYTHON_EXECUTABLE, readiness, f"RabbitWorker{i+1}")
                 if proc: worker_procs_rabbit.append(proc)
             
             if len(worker_procs_rabbit) != num_workers:
                 raise Exception(f"Failed to start all {num_workers} RabbitMQ workers.")
 
-            print(f"  All {num_workers} workers launched. Waiting for them to stabilize (e.g., 5-7s)...")
-            time.sleep(5 + num_workers * 1.5) 
+            print(f"  All {num_workers} workers launched. Waiting for each to report it is consuming...")
+            ready = readiness.wait(num_workers, WORKER_READY_TIMEOUT, worker_procs_rabbit)
+            if ready < num_workers:
+                raise Exception(f"Only {ready}/{num_workers} RabbitMQ workers became ready within {WORKER_READY_TIMEOUT}s.")
+            print(f"  All {num_workers} workers ready after {time.perf_counter() - startup_begin:.2f}s.")
 
             print(f"  Producer starting to send {TOTAL_REQUESTS} tasks to RabbitMQ queue...")
             test_start_time = time.perf_counter()
@@ -176,14 +197,14 @@ if __name__ == "__main__":
             # Time = 10000 / 150 = ~66s.
             results_collection_timeout = 60 + (TOTAL_REQUESTS / (num_workers * 5 if num_workers > 0 else 1)) # For results collection
             
-            collected_results = consume_all_results_from_rabbit(
+            collected_results, last_arrival = consume_all_results_from_rabbit(
                 TOTAL_REQUESTS, 
                 RESULTS_QUEUE_NAME_RABBIT,
-                timeout_per_message=0.2, # How long to wait if queue is empty but not all results are in
                 overall_timeout=results_collection_timeout
             )
             
-            test_end_time = time.perf_counter()
+            # Stop the clock at the last result, not after the consumer's teardown
+            test_end_time = last_arrival if last_arrival is not None and len(collected_results) >= TOTAL_REQUESTS else time.perf_counter()
             total_test_time_rabbit = test_end_time - test_start_time
             
             num_results_actually_collected = len(collected_results)
@@ -205,6 +226,10 @@ if __name__ == "__main__":
             else:
                 print(f"  All {TOTAL_REQUESTS} tasks processed and results collected.")
                 print(f"  Total test time: {total_test_time_rabbit:.4f} seconds")
+                timings = TaskTimingSummary()
+                for body in collected_results:
+                    timings.add(json.loads(body))
+                timings.print_summary(prefix="  ")
                 if num_workers == 1:
                     T1_rabbit = total_test_time_rabbit
                     overall_results_rabbit.append({"workers": num_workers, "time": T1_rabbit, "speedup": 1.0})
@@ -242,6 +267,7 @@ if __name__ == "__main__":
                         try:
                             if proc.poll() is None: proc.kill() # Last resort
                         except: pass
+            readiness.close()
             print(f"  RabbitMQ workers for N={num_workers} terminated (or were already).")
             time.sleep(1)
 
@@ -1,16 +1,20 @@
 # test_static_scaling_filter_redis.py
 import multiprocessing
-import subprocess
 import time
 import redis
 import json 
 import os
 import signal
 import random
+import sys
 
 # --- Configuration ---
 PYTHON_EXECUTABLE = "/home/milax/Documents/SD/P1/SD-env/bin/python" # SET TO VENV PYTHON e.g., "/path/to/SD-env/bin/python"
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.readiness import ReadinessPipe
+from common.task_envelope import TaskTimingSummary, encode_task
 
 FILTER_WORKER_SCRIPT_REDIS = os.path.join(PROJECT_ROOT, "redis_filter_service", "filter_worker_redis.py")
 
@@ -21,6 +25,7 @@ RESULTS_LIST_NAME_REDIS = 'filtered_texts_results'
 
 TOTAL_REQUESTS = 10000 
 WORKER_COUNTS = [1, 2, 3] # Test with 1, 2, and 3 workers
+WORKER_READY_TIMEOUT = 30 # Seconds for all workers of a run to report "connected"
 
 SAMPLE_TEXTS_FOR_REDIS_FILTER = [
     "Redis scaling test: stupid text example.",
@@ -44,15 +49,14 @@ def redis_producer_job(num_tasks, task_queue_name, sample_texts):
         r_prod = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
         for i in range(num_tasks):
             text_content = random.choice(sample_texts) + f" task_{i}"
-            r_prod.rpush(task_queue_name, text_content)
+            r_prod.rpush(task_queue_name, encode_task(text_content))
  
     except Exception as e:
         print(f"  Producer (Redis) error: {e}")
 
-def run_worker_process(worker_script_path, python_exec, title_prefix="Worker"):
+def run_worker_process(worker_script_path, python_exec, readiness, title_prefix="Worker"):
     print(f"  Starting {title_prefix} ({worker_script_path})...")
-    proc = subprocess.Popen([python_exec, worker_script_path])
-    time.sleep(1) # Give worker a moment to connect to Redis
+    proc = readiness.popen([python_exec, worker_script_path]) # Signals on the pipe once connected to Redis
     if proc.poll() is not None:
         print(f"  ERROR: {title_prefix} at {worker_script_path} exited prematurely.")
         return None
@@ -79,17 +83,23 @@ if __name__ == "__main__":
         print(f"\nTesting with {num_workers} Redis worker(s)...")
         clear_redis_data() # Clear queues before each N-worker test
         worker_procs_redis = []
+        readiness = ReadinessPipe()
         
         try:
             print(f"  Starting {num_workers} Redis worker process(es)...")
+            startup_begin = time.perf_counter()
             for i in range(num_workers):
-                proc = run_worker_process(FILTER_WORKER_SCRIPT_REDIS, PYTHON_EXECUTABLE, f"RedisWorker{i+1}")
+                proc = run_worker_process(FILTER_WORKER_SCRIPT_REDIS, PYTHON_EXECUTABLE, readiness, f"RedisWorker{i+1}")
                 if proc: worker_procs_redis.append(proc)
             
             if len(worker_procs_redis) != num_workers:
                 raise Exception(f"Failed to start all {num_workers} Redis workers.")
 
-            time.sleep(2 + num_workers * 0.5) # More time for workers to be ready
+            # Block until every worker reports it is connected, instead of a fixed sleep
+            ready = readiness.wait(num_workers, WORKER_READY_TIMEOUT, worker_procs_redis)
+            if ready < num_workers:
+                raise Exception(f"Only {ready}/{num_workers} Redis workers became ready within {WORKER_READY_TIMEOUT}s.")
+            print(f"  All {num_workers} workers ready after {time.perf_counter() - startup_begin:.2f}s.")
 
             print(f"  Producer starting to send {TOTAL_REQUESTS} tasks to Redis queue...")
             test_start_time = time.perf_counter()
@@ -99,21 +109,24 @@ if __name__ == "__main__":
             
             print(f"  Producer finished sending tasks. Now waiting for all results...")
 
-            # Monitor results list in Redis
+            # Drain the results list with BLPOP: Redis wakes us as each result is pushed, so the end
+            # time is when the last result arrived rather than the next tick of a polling loop
             r_monitor = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0)
-            results_collected_count = 0
+            collected_results = []
             # Adjust max_wait_time based on expected processing speed. Redis is fast.
             max_wait_time_redis = 60 + (TOTAL_REQUESTS * 0.5 / num_workers if num_workers >0 else TOTAL_REQUESTS * 0.5)
             wait_start_redis = time.time()
+            test_end_time = None
 
-            while results_collected_count < TOTAL_REQUESTS and (time.time() - wait_start_redis) < max_wait_time_redis:
-                results_collected_count = r_monitor.llen(RESULTS_LIST_NAME_REDIS)
-                if results_collected_count < TOTAL_REQUESTS:
-                    time.sleep(0.1) # Poll frequently
-                else:
-                    break
-            
-            test_end_time = time.perf_counter()
+            while len(collected_results) < TOTAL_REQUESTS and (time.time() - wait_start_redis) < max_wait_time_redis:
+                popped = r_monitor.blpop([RESULTS_LIST_NAME_REDIS], timeout=1) # Timeout only to re-check the deadline
+                if popped:
+                    collected_results.append(popped[1])
+                    test_end_time = time.perf_counter()
+            results_collected_count = len(collected_results)
+
+            if test_end_time is None or results_collected_count < TOTAL_REQUESTS:
+                test_end_time = time.perf_counter()
             total_test_time_redis = test_end_time - test_start_time
 
             if results_collected_count < TOTAL_REQUESTS:
@@ -122,6 +135,10 @@ if __name__ == "__main__":
             else:
                 print(f"  All {TOTAL_REQUESTS} tasks processed and results stored in Redis.")
                 print(f"  Total test time: {total_test_time_redis:.4f} seconds")
+                timings = TaskTimingSummary()
+                for raw_item in collected_results:
+                    timings.add(json.loads(raw_item))
+                timings.print_summary(prefix="  ")
                 if num_workers == 1:
                     T1_redis = total_test_time_redis
                     overall_results_redis.append({"workers": num_workers, "time": T1_redis, "speedup": 1.0})
@@ -145,6 +162,7 @@ if __name__ == "__main__":
                     proc.terminate() 
                     proc.wait(timeout=5)
                 except: pass # Ignore errors during cleanup
+            readiness.close()
             print(f"  Redis workers for N={num_workers} terminated.")
             time.sleep(1)
 
@@ -2,6 +2,15 @@
 
 import xmlrpc.client
 import time
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.task_envelope import TaskTimingSummary, format_timings
+
+RESULT_TIMEOUT = 5 # Seconds to wait for each submitted task
 
 def main():
     server_url = "http://127.0.0.1:8001/RPC2"
@@ -20,16 +29,17 @@ def main():
     ]
 
     print("\n--- Submitting Texts for Filtering ---")
+    task_ids = []
     for i, text in enumerate(texts_to_filter):
         try:
             print(f"Submitting: '{text}'")
-            response = filter_proxy.submit_text_for_filtering(text)
-            print(f"  Server response: {response}")
-            time.sleep(0.2) # Give server a little time to queue/process
+            task_id = filter_proxy.submit_text(text) # Returns the task id to wait on
+            task_ids.append(task_id)
+            print(f"  Queued as task {task_id}")
         except Exception as e:
             print(f"  Error submitting text {i+1}: {e}")
             
-    print("\nWaiting a bit for processing to occur...")
+    print("\nWaiting for the submitted tasks...")
     # Check pending tasks
     try:
         pending_count = filter_proxy.get_pending_task_count()
@@ -37,7 +47,15 @@ def main():
     except Exception as e:
         print(f"Error getting pending task count: {e}")
 
-    time.sleep(3) # Wait for the worker thread to process some tasks
+    for task_id in task_ids: # Wait for our own tasks instead of a fixed sleep
+        try:
+            result = filter_proxy.wait_for_result(task_id, RESULT_TIMEOUT)
+            if result is None:
+                print(f"Task {task_id} not done after {RESULT_TIMEOUT}s.")
+            elif result.get("error"):
+                print(f"Task {task_id} failed: {result['error']}")
+        except Exception as e:
+            print(f"Error waiting for task {task_id}: {e}")
 
     try:
         pending_count_after = filter_proxy.get_pending_task_count()
@@ -51,15 +69,28 @@ def main():
         results = filter_proxy.get_filtered_results()
         if results:
             print("Filtered Results:")
+            timings = TaskTimingSummary()
             for item in results:
+                timings.add(item)
+                print(f"  Task ID  : {item.get('task_id') or 'N/A'}")
                 print(f"  Original : '{item['original']}'")
                 print(f"  Filtered : '{item['filtered']}'")
                 print(f"  Timestamp: {time.ctime(item['timestamp'])}")
+                print(f"  Timings  : {format_timings(item)}")
                 print("-" * 20)
+            timings.print_summary()
         else:
             print("No filtered results available yet, or an error occurred.")
     except Exception as e:
         print(f"Error retrieving results: {e}")
 
+    try:
+        cache = filter_proxy.get_cache_stats()
+        if cache.get("enabled"):
+            print(f"Result cache: {cache['hits']} hits / {cache['misses']} misses ({cache['hit_rate'] * 100:.1f}%), "
+                  f"{cache['saved_seconds'] * 1000:.2f}ms of filtering saved")
+    except Exception as e:
+        print(f"Error getting cache stats: {e}")
+
 if __name__ == "__main__":
     main()
@@ -1,17 +1,69 @@
 # filter_server_xmlrpc.py
 
 from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import socketserver
 import threading
+import signal
 import queue #
 import time
 import re 
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.profiling import WorkerProfiler
+from common.result_cache import FilterResultCache, dictionary_version
+from common.task_envelope import new_task, result_record
+
+# Concurrent mode (FILTER_SERVER_WORKERS=N > 0): the HTTP front end serves each request in its
+# own thread, and texts are filtered by N worker processes (the regex split holds the GIL, so
+# threads would not add throughput) with up to N * POOL_TASKS_PER_WORKER tasks handed to them at
+# once. 0 keeps the single-threaded server with one filter thread. If a pool process dies, the
+# tasks it had are answered with an error record and a new pool is started (spawned: by then the
+# server has threads, which fork would copy in whatever state they are in).
+FILTER_SERVER_WORKERS = int(os.environ.get("FILTER_SERVER_WORKERS", "0"))
+POOL_TASKS_PER_WORKER = 2 # Keeps every process busy while its next task is pickled over
 
 # Restrict to a particular path.
 class RequestHandler(SimpleXMLRPCRequestHandler):
     rpc_paths = ('/RPC2',)
 
+class ThreadedXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True # Open client connections don't hold up shutdown
+
+def filter_text(original_text, known_insults):
+    """Replaces known insults (lowercased set) with 'CENSORED'. Module-level so pool processes can run it."""
+    if not known_insults:
+        return original_text
+
+    # Split text into words, check, and rebuild.
+    words = re.split(r'(\W+)', original_text) # Split by non-word characters, keeping delimiters
+    censored_words = []
+    for word in words:
+        if word.lower() in known_insults:
+            censored_words.append("CENSORED")
+        else:
+            censored_words.append(word)
+    return "".join(censored_words)
+
+_pool_insults = None # Set in each pool process, so the insult set isn't pickled with every task
+
+def _init_pool_process(known_insults):
+    global _pool_insults
+    _pool_insults = known_insults
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C reaches the whole group: the server shuts the pool down
+
+def _filter_in_pool(original_text):
+    return filter_text(original_text, _pool_insults)
+
 class FilterService:
-    def __init__(self, known_insults_list=None):
+    def __init__(self, known_insults_list=None, workers=0):
         # List of insults to filter. Case-insensitive matching.
         if known_insults_list is None:
             self.known_insults = {
@@ -20,53 +72,158 @@ class FilterService:
             } # Store as a set for efficient lookup, lowercased
         else:
             self.known_insults = {insult.lower() for insult in known_insults_list}
+        self._dictionary_version = dictionary_version(self.known_insults)
+        self._cache = FilterResultCache.from_env() # FILTER_CACHE_MB=0 disables it
 
-        self._task_queue = queue.Queue() # Internal queue for texts to be filtered
+        self._task_queue = queue.Queue() # Internal queue for tasks (id + enqueue time + text) to be filtered
         self._filtered_texts = []      # List to store results
+        self._results_by_id = {}       # task_id -> result, for wait_for_result()
         self._lock = threading.Lock()  # To protect _filtered_texts
+        self._results_changed = threading.Condition(self._lock) # Wakes wait_for_result() callers
+
+        # Pool processes are forked before any thread of ours exists
+        self._pool = None
+        self._workers = workers
+        if workers > 0:
+            self._pool = self._new_pool()
+            self._pool_lock = threading.Lock() # One replacement per broken pool
+            self._pool_slots = threading.BoundedSemaphore(workers * POOL_TASKS_PER_WORKER)
+            self._pool.submit(_filter_in_pool, "").result() # The first submit starts all the processes
+
+        metrics.set_labels(component="filter_server_xmlrpc")
+        self._received = metrics.counter("filter_tasks_received_total", "Texts submitted for filtering.")
+        self._processed = metrics.counter("filter_tasks_processed_total", "Texts filtered.")
+        self._errors = metrics.counter("filter_task_errors_total", "Tasks that failed while filtering.")
+        self._pool_restarts = metrics.counter("filter_pool_restarts_total", "Process pools replaced after a filter process died.")
+        self._service_time = metrics.histogram("filter_service_seconds", "Time to filter one text; the sum is the busy time.")
+        metrics.gauge("filter_queue_depth", "Tasks waiting in the internal queue.", function=self._task_queue.qsize)
         
+        # FILTER_PROFILE=1 or SIGUSR1: per-phase timings of the worker thread + stack samples, dumped on shutdown
+        self.profiler = WorkerProfiler.from_env(f"filter_server_xmlrpc_{os.getpid()}", prefix="FilterService:")
+
         self._worker_active = True
         self.worker_thread = threading.Thread(target=self._process_filter_tasks, daemon=True)
         self.worker_thread.start()
-        print("FilterService initialized, worker thread started.")
+        if self._pool:
+            print(f"FilterService initialized, dispatching to {workers} filter processes.")
+        else:
+            print("FilterService initialized, worker thread started.")
 
     def _filter_text(self, original_text):
         """Filters known insults from the text, replacing them with 'CENSORED'."""
-       
-        # Build a regex pattern like: \b(stupid|idiot|dummy)\b
-        # The \b ensures we match whole words.
-        # re.IGNORECASE handles case-insensitivity.
-        if not self.known_insults:
-            return original_text
-
-        # Split text into words, check, and rebuild.
-        words = re.split(r'(\W+)', original_text) # Split by non-word characters, keeping delimiters
-        censored_words = []
-        for word in words:
-            if word.lower() in self.known_insults:
-                censored_words.append("CENSORED")
-            else:
-                censored_words.append(word)
-        return "".join(censored_words)
+        return filter_text(original_text, self.known_insults)
+
+    def _cached_result(self, task):
+        """Stores the task's result straight away if the cache has it; True on a hit."""
+        if self._cache is None:
+            return False
+        filtered_text = self._cache.get(task["text"], task["dictionary_version"])
+        if filtered_text is None:
+            return False
+        task["dequeued_at"] = time.time()
+        self._store_result(result_record(task, filtered_text, cached=True))
+        self._processed.inc()
+        return True
+
+    def _cache_put(self, task, filtered_text):
+        if self._cache is not None:
+            self._cache.put(task["text"], task["dictionary_version"], filtered_text, time.time() - task["dequeued_at"])
+
+    def _enqueue(self, text_content):
+        """New task for the text: answered from the cache, or queued for the filter. Returns (task, cached)."""
+        task = new_task(text_content)
+        task["dictionary_version"] = self._dictionary_version # The insults it will be filtered with
+        self._received.inc()
+        if self._cached_result(task):
+            return task, True
+        self._task_queue.put(task)
+        return task, False
+
+    def _store_result(self, record):
+        with self._lock:
+            self._filtered_texts.append(record)
+            if record.get("task_id"):
+                self._results_by_id[record["task_id"]] = record
+            self._results_changed.notify_all()
+
+    def _fail_task(self, task, error):
+        """Answers a queued task with an error record, so wait_for_result() and join() return."""
+        self._errors.inc()
+        print(f"Filter worker: Error processing task {task['task_id']}: {error}")
+        self._store_result(result_record(task, None, error=f"{type(error).__name__}: {error}"))
+        self._task_queue.task_done()
+
+    def _new_pool(self, mp_context=None):
+        return ProcessPoolExecutor(max_workers=self._workers, mp_context=mp_context, initializer=_init_pool_process,
+                                   initargs=(frozenset(self.known_insults),))
+
+    def _submit_to_pool(self, text):
+        """pool.submit(), replacing the pool once if a process of it died (BrokenProcessPool)."""
+        pool = self._pool
+        try:
+            return pool.submit(_filter_in_pool, text)
+        except BrokenProcessPool:
+            with self._pool_lock:
+                if self._pool is pool: # Not replaced meanwhile by another caller
+                    print("Filter pool: A filter process died; starting a new pool.")
+                    self._pool = self._new_pool(multiprocessing.get_context("spawn"))
+                    self._pool_restarts.inc()
+            pool.shutdown(wait=False)
+            return self._pool.submit(_filter_in_pool, text)
+
+    def _dispatch_to_pool(self, task):
+        """Hands one task to the process pool; blocks while all slots are taken."""
+        self._pool_slots.acquire()
+        try:
+            future = self._submit_to_pool(task["text"])
+        except Exception as e:
+            self._pool_slots.release()
+            self._fail_task(task, e)
+            return
+        future.add_done_callback(lambda f: self._pool_task_done(task, f))
+
+    def _pool_task_done(self, task, future):
+        try:
+            filtered_text = future.result()
+        except Exception as e: # Including BrokenProcessPool for the tasks a dead process had
+            self._pool_slots.release()
+            self._fail_task(task, e)
+            return
+        try:
+            self._service_time.observe(time.time() - task["dequeued_at"])
+            self._cache_put(task, filtered_text)
+            self._store_result(result_record(task, filtered_text))
+            self._processed.inc()
+        finally:
+            self._pool_slots.release()
+            self._task_queue.task_done()
 
 
     def _process_filter_tasks(self):
         """Worker thread function to process texts from the internal queue."""
         print("Filter worker: Starting to process tasks from queue.")
         while self._worker_active or not self._task_queue.empty():
+            task = None
             try:
                 # Get a task from the queue, with a timeout to allow checking _worker_active
-                original_text = self._task_queue.get(timeout=1) 
-                
-                print(f"Filter worker: Processing text: '{original_text[:50]}...'")
-                filtered_text = self._filter_text(original_text)
+                with self.profiler.phase("queue get (wait)"):
+                    task = self._task_queue.get(timeout=1) 
+                task["dequeued_at"] = time.time()
+                original_text = task["text"]
+                if self._pool:
+                    with self.profiler.phase("dispatch to pool"):
+                        self._dispatch_to_pool(task)
+                    continue
+
+                print(f"Filter worker: Processing task {task['task_id']}: '{original_text[:50]}...'")
+                with self._service_time.time(), self.profiler.phase("filter"):
+                    filtered_text = self._filter_text(original_text)
+                self._cache_put(task, filtered_text)
                 
-                with self._lock:
-                    self._filtered_texts.append({
-                        "original": original_text,
-                        "filtered": filtered_text,
-                        "timestamp": time.time()
-                    })
+                with self.profiler.phase("store result"):
+                    self._store_result(result_record(task, filtered_text))
+                self._processed.inc()
+                self.profiler.task_done()
                 print(f"Filter worker: Finished filtering. Result: '{filtered_text[:50]}...'")
                 self._task_queue.task_done() # Signal that the task is done
 
@@ -78,7 +235,13 @@ class FilterService:
                     # Worker is stopping and queue is empty
                     break 
             except Exception as e:
-                print(f"Filter worker: Error processing task: {e}")
+                if task is not None:
+                    self._fail_task(task, e)
+                else:
+                    self._errors.inc()
+                    print(f"Filter worker: Error processing task: {e}")
+        if self._pool:
+            self._pool.shutdown(wait=True) # Lets the tasks already handed out finish and be stored
         print("Filter worker: Stopped.")
 
     # --- XMLRPC Exposed Methods ---
@@ -90,9 +253,47 @@ class FilterService:
         if not isinstance(text_content, str):
             return "Error: Text content must be a string."
         
-        self._task_queue.put(text_content)
-        print(f"FilterService: Received text for filtering: '{text_content[:50]}...'. Added to queue.")
-        return f"Text submitted successfully. Queue size: {self._task_queue.qsize()}"
+        task, cached = self._enqueue(text_content)
+        if cached:
+            print(f"FilterService: Received text for filtering: '{text_content[:50]}...'. Answered from cache as task {task['task_id']}.")
+        else:
+            print(f"FilterService: Received text for filtering: '{text_content[:50]}...'. Added to queue as task {task['task_id']}.")
+        return f"Text submitted successfully. Queue size: {self._task_queue.qsize()}. Task ID: {task['task_id']}"
+
+    def submit_text(self, text_content):
+        """Like submit_text_for_filtering, but returns just the task id, for wait_for_result()."""
+        if not isinstance(text_content, str):
+            raise ValueError("Text content must be a string.")
+        task, _ = self._enqueue(text_content)
+        return task["task_id"]
+
+    def filter_text_sync(self, text_content):
+        """Filters the text during the call and returns {"task_id", "filtered", "cached"}: the cache
+        first, else in the pool (concurrent mode) or inline. Not added to get_filtered_results()."""
+        if not isinstance(text_content, str):
+            raise ValueError("Text content must be a string.")
+        task = new_task(text_content)
+        task["dictionary_version"] = self._dictionary_version
+        self._received.inc()
+        filtered_text = self._cache.get(text_content, task["dictionary_version"]) if self._cache else None
+        cached = filtered_text is not None
+        if not cached:
+            task["dequeued_at"] = time.time()
+            with self._service_time.time():
+                if self._pool:
+                    filtered_text = self._submit_to_pool(text_content).result()
+                else:
+                    filtered_text = self._filter_text(text_content)
+            self._cache_put(task, filtered_text)
+        self._processed.inc()
+        return {"task_id": task["task_id"], "filtered": filtered_text, "cached": cached}
+
+    def wait_for_result(self, task_id, timeout=None):
+        """Blocks until the task's result is stored (or `timeout` seconds pass) and returns it,
+        or None on timeout. Clients wait for their own task instead of scanning get_filtered_results()."""
+        with self._results_changed:
+            self._results_changed.wait_for(lambda: task_id in self._results_by_id, timeout)
+            return self._results_by_id.get(task_id)
 
     def get_filtered_results(self):
         """
@@ -107,20 +308,34 @@ class FilterService:
         """Returns the number of tasks currently in the processing queue."""
         return self._task_queue.qsize()
 
+    def get_cache_stats(self):
+        """Result cache hit rate and the filtering time it saved ({"enabled": False} if off)."""
+        if self._cache is None:
+            return {"enabled": False}
+        return dict(self._cache.stats(), enabled=True)
+
+    def get_metrics(self):
+        """Counters, gauges and histograms of this server (same data as the METRICS_PORT endpoint)."""
+        return metrics.snapshot()
+
     def shutdown_worker(self): # For graceful shutdown
         print("FilterService: Signaling worker thread to shutdown...")
         self._worker_active = False
         # The worker will complete current item and then exit if queue becomes empty
  
 # --- Main Server Setup ---
-def run_filter_server(host="127.0.0.1", port=8001, known_insults=None):
+def run_filter_server(host="127.0.0.1", port=8001, known_insults=None, workers=FILTER_SERVER_WORKERS):
+    # The service (and its process pool) first: pool processes are forked before the server's threads exist
+    filter_service_instance = FilterService(known_insults_list=known_insults, workers=workers)
+
     server_address = (host, port)
-    server = SimpleXMLRPCServer(server_address, requestHandler=RequestHandler, allow_none=True)
+    server_class = ThreadedXMLRPCServer if workers > 0 else SimpleXMLRPCServer
+    server = server_class(server_address, requestHandler=RequestHandler, allow_none=True)
     server.register_introspection_functions()
 
-    filter_service_instance = FilterService(known_insults_list=known_insults)
     server.register_instance(filter_service_instance)
     print(f"XMLRPC Filter Service listening on {host}:{port}/RPC2...")
+    metrics.start_http_server_from_env(prefix="Filter Server:")
 
     try:
         server.serve_forever()
@@ -132,8 +347,9 @@ def run_filter_server(host="127.0.0.1", port=8001, known_insults=None):
         # Wait for worker thread to finish
         if filter_service_instance.worker_thread.is_alive():
             print("Filter Server: Waiting for worker thread to complete...")
-            filter_service_instance.worker_thread.join(timeout=2.0) 
+            filter_service_instance.worker_thread.join(timeout=10.0 if workers > 0 else 2.0) # The pool drains its in-flight tasks
         server.server_close()
+        filter_service_instance.profiler.stop_and_dump()
         print("Filter Server: Shutdown complete.")
 
 if __name__ == "__main__":
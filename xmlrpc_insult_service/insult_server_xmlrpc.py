@@ -3,10 +3,18 @@
 from xmlrpc.server import SimpleXMLRPCServer
 from xmlrpc.server import SimpleXMLRPCRequestHandler
 import threading
-import time
 import random
+import os
+import sys
 from xmlrpc.client import ServerProxy 
 
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common import metrics
+from common.broadcast_payload import encode_broadcast
+from common.broadcast_scheduler import BroadcastScheduler
+
 # Restrict to a particular path.
 class RequestHandler(SimpleXMLRPCRequestHandler):
     rpc_paths = ('/RPC2',)
@@ -14,8 +22,19 @@ class RequestHandler(SimpleXMLRPCRequestHandler):
 class InsultService:
     def __init__(self):
         self._insults = set()  # Set to store unique insults
+        self._insults_list = [] # Same insults, for O(1) random picks at high broadcast rates
         self._subscribers = set() # Set to store unique subscriber URLs
         self._lock = threading.Lock() # To protect shared resources (insults, subscribers)
+        self._scheduler = BroadcastScheduler.from_env() # Rate/batch from BROADCAST_* env vars, 5s default
+
+        metrics.set_labels(component="insult_server_xmlrpc")
+        self._add_requests = metrics.counter("insult_add_requests_total", "add_insult calls.")
+        self._insults_added = metrics.counter("insults_added_total", "New (non-duplicate) insults stored.")
+        self._broadcasts = metrics.counter("broadcasts_published_total", "Broadcast messages sent (one per batch).")
+        self._notifications = metrics.counter("broadcast_notifications_total", "Subscriber notifications attempted.")
+        self._notification_errors = metrics.counter("broadcast_notification_errors_total", "Subscriber notifications that failed.")
+        metrics.gauge("insults_stored", "Insults in the set.", function=lambda: len(self._insults_list))
+        metrics.gauge("subscribers_registered", "Registered subscribers.", function=lambda: len(self._subscribers))
         
         # Start the broadcaster thread
         self.broadcaster_thread = threading.Thread(target=self._broadcast_insults, daemon=True)
@@ -27,6 +46,7 @@ class InsultService:
         Adds an insult to the list if it's not already present.
         Returns a message indicating success or if the insult already existed.
         """
+        self._add_requests.inc()
         with self._lock:
             if not isinstance(insult_string, str):
                 return "Error: Insult must be a string."
@@ -34,6 +54,8 @@ class InsultService:
                 print(f"Attempted to add existing insult: '{insult_string}'")
                 return f"Insult '{insult_string}' already exists."
             self._insults.add(insult_string)
+            self._insults_list.append(insult_string)
+            self._insults_added.inc()
             print(f"Added insult: '{insult_string}'")
             return f"Insult '{insult_string}' added successfully."
 
@@ -77,37 +99,53 @@ class InsultService:
                 print(f"Subscriber '{subscriber_url}' not found for unregistration.")
                 return f"Subscriber '{subscriber_url}' not found."
 
+    def get_metrics(self):
+        """Counters and gauges of this server (same data as the METRICS_PORT endpoint)."""
+        return metrics.snapshot()
+
     def _broadcast_insults(self):
         """
         Periodically sends a random insult to all registered subscribers.
         This method runs in a separate thread.
         """
-        print("Broadcaster started. Will broadcast every 5 seconds.")
+        scheduler = self._scheduler
+        verbose = scheduler.verbose
+        print(f"Broadcaster started. Will broadcast {scheduler.describe()}.")
         while True:
-            time.sleep(5) # Wait for 5 seconds
+            slots = scheduler.wait_for_slots() # Drift-free pacing, may grant several slots when behind
             
-            insult_to_send = None
+            batches = []
             subscribers_to_notify = []
 
             with self._lock:
-                if self._insults and self._subscribers:
-                    insult_to_send = random.choice(list(self._insults))
+                if self._insults_list and self._subscribers:
+                    batches = [random.choices(self._insults_list, k=scheduler.batch_size) for _ in range(slots)]
                     subscribers_to_notify = list(self._subscribers) # Create a copy for iteration
             
-            if insult_to_send and subscribers_to_notify:
-                print(f"Broadcasting insult: '{insult_to_send}' to {len(subscribers_to_notify)} subscribers.")
-                for sub_url in subscribers_to_notify:
-                    try:
-                        # Each subscriber is an XMLRPC server, connect to it
-                        subscriber_proxy = ServerProxy(sub_url)
-                        # Assume subscriber has a method 'receive_insult_notification'
-                        subscriber_proxy.receive_insult_notification(insult_to_send)
-                        print(f"  Successfully notified {sub_url}")
-                    except Exception as e:
-                        print(f"  Error notifying subscriber {sub_url}: {e}")
-            elif not self._insults:
+            if batches:
+                for batch in batches:
+                    if verbose:
+                        print(f"Broadcasting insult: '{batch[0] if len(batch) == 1 else batch}' to {len(subscribers_to_notify)} subscribers.")
+                    payload = encode_broadcast(batch)
+                    self._broadcasts.inc()
+                    for sub_url in subscribers_to_notify:
+                        self._notifications.inc()
+                        try:
+                            # Each subscriber is an XMLRPC server, connect to it
+                            subscriber_proxy = ServerProxy(sub_url)
+                            # Assume subscriber has a method 'receive_insult_notification'
+                            subscriber_proxy.receive_insult_notification(payload)
+                            if verbose:
+                                print(f"  Successfully notified {sub_url}")
+                        except Exception as e:
+                            self._notification_errors.inc()
+                            print(f"  Error notifying subscriber {sub_url}: {e}")
+                summary = scheduler.periodic_summary()
+                if summary:
+                    print(f"Broadcaster: {summary} to {len(subscribers_to_notify)} subscribers.")
+            elif verbose and not self._insults: # Quiet otherwise, not to flood the console at high rates
                 print("Broadcaster: No insults to broadcast.")
-            elif not self._subscribers:
+            elif verbose and not self._subscribers:
                 print("Broadcaster: No subscribers to notify.")
 
 
@@ -121,6 +159,7 @@ def run_server(host="localhost", port=8000):
 
     server.register_instance(InsultService())
     print(f"XMLRPC Insult Server listening on {actual_host}:{port}/RPC2...")
+    metrics.start_http_server_from_env(prefix="XMLRPC Insult Server:")
 
     try:
         server.serve_forever()
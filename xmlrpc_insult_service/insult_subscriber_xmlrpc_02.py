@@ -5,13 +5,22 @@ from xmlrpc.server import SimpleXMLRPCRequestHandler
 import xmlrpc.client
 import threading 
 import time # For sleep
+import os
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT) # For the shared 'common' helpers
+from common.broadcast_payload import decode_broadcast
 
 class SubscriberRequestHandler(SimpleXMLRPCRequestHandler):
     rpc_paths = ('/RPC2',)
 
 class InsultNotificationHandler:
     def receive_insult_notification(self, insult_string):
-        print(f"\n[SUBSCRIBER] Received insult notification: '{insult_string}'")
+        insults, _ = decode_broadcast(insult_string) # One insult or a batch
+        for insult in insults:
+            print(f"\n[SUBSCRIBER] Received insult notification: '{insult}'")
         return "Notification received."
 
 def run_subscriber_server(host="127.0.0.1", port=9002): # Bind subscriber server to 127.0.0.1